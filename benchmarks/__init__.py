@@ -0,0 +1,4 @@
+"""
+Benchmarks for the pick'em bot. Each module runs against local stand-ins for
+DynamoDB and SportRadar, e.g. `python -m benchmarks.open_picks`.
+"""
@@ -0,0 +1,107 @@
+"""
+Plays a game day against the local SportRadar stand-in, running live
+settlement every tick, and reports the boxscore requests each run makes,
+how many came back unchanged, and the picks settled as their games close.
+
+    python -m benchmarks.live_settlement [--players N] [--ticks N]
+
+Every game has kicked off. Scores change every few ticks and the games
+close one window at a time, early games first.
+"""
+
+from __future__ import print_function
+
+import argparse
+from datetime import datetime, timedelta
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+week_num = 5
+
+
+def boxscore(game, tick, ticks):
+    """
+    The boxscore of GAME, from the canned schedule, at TICK of TICKS.
+    """
+    index = int(game['id'].rsplit('-', 1)[1])
+    # Three windows: 9 early games, 6 late games and the night game
+    window = 0 if index < 9 else 1 if index < 15 else 2
+    closes = (window + 1) * ticks // 3 - 1
+    drives = min(tick, closes) // 3
+
+    return {
+        'id': game['id'],
+        'status': 'closed' if tick >= closes else 'inprogress',
+        'summary': {
+            'home': {'points': 7 * drives + index % 3},
+            'away': {'points': 7 * drives},
+        },
+    }
+
+
+def load_picks(thecommish, league, players):
+    """
+    Write this week's picks for PLAYERS in LEAGUE, spread over every team.
+    """
+    teams = sorted(thecommish.teams)
+    kickoffs = thecommish.get_kickoff_index(week_num)
+    pick_table = thecommish.dynamo.Table(thecommish.picks_table_name)
+    with pick_table.batch_writer() as batch:
+        for player in range(players):
+            team = teams[player % len(teams)]
+            batch.put_item(Item=standins.pick_item(
+                thecommish, league, 'U{:05d}'.format(player), week_num,
+                userName='player{:}'.format(player),
+                selectedTeam=team,
+                sportRadarGameID=kickoffs[team]['game'],
+                openWeek=week_num,
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--ticks', type=int, default=12)
+    args = parser.parse_args()
+
+    with standins.mock_backends(), standins.SportRadarStub() as sportradar:
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        thecommish.sportradar.get_client().base_url = sportradar.url
+        thecommish.get_current_week = lambda custom_date=None: week_num
+        kickoff = datetime.utcnow() - timedelta(hours=1)
+        games = standins.make_schedule(week_num, kickoff, closed=False)
+        thecommish.fetch_schedule = lambda week: games
+
+        league = thecommish.league_key(standins.team_id, standins.channel_id)
+        load_picks(thecommish, league, args.players)
+
+        print('{:>5} {:>9} {:>10} {:>8} {:>8}'.format(
+            'tick', 'requests', 'unchanged', 'closed', 'settled'))
+        total = {'requests': 0, 'settled': 0}
+        for tick in range(args.ticks + 1):
+            for game in games:
+                sportradar.games[game['id']] = boxscore(
+                    game, tick, args.ticks
+                )
+
+            before = sportradar.requests
+            report = thecommish.live_results_handler({}, None)
+            requests = sportradar.requests - before
+            total['requests'] += requests
+            total['settled'] += report['settled']
+
+            print('{:>5} {:>9} {:>10} {:>8} {:>8}'.format(
+                tick, requests, report['unchanged'], report['closed'],
+                report['settled']))
+
+        open_picks = list(thecommish.get_open_picks(week_num))
+        print('{:} boxscore requests, {:} picks settled, {:} left open'.format(
+            total['requests'], total['settled'], len(open_picks)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Compares the messages the receptionist hands to the worker: their size, and
+the time to encode one for publishing and to decode it in the worker, for
+the version 1 format (as published before, double encoded for SNS, and as
+published now) and version 2, with a short command and with one long enough
+to be compressed.
+
+    python -m benchmarks.messages [--number N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import time
+import timeit
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+
+def slack_params(text):
+    """
+    A slash command request with the command TEXT, as parsed by `parse_qs`,
+    with every field Slack sends.
+    """
+    fields = {
+        'token': 'gIkuvaNzQIHg97ATvDxqgjtO',
+        'team_id': standins.team_id,
+        'team_domain': 'pickem-bench',
+        'enterprise_id': 'E0001',
+        'enterprise_name': 'Pickem Bench',
+        'channel_id': standins.channel_id,
+        'channel_name': 'pickem',
+        'user_id': 'U2147483697',
+        'user_name': 'bench',
+        'command': '/pickem',
+        'text': text,
+        'response_url': (
+            'https://hooks.slack.com/commands/1234/5678/'
+            'a1b2c3d4e5f6a7b8c9d0e1f2'
+        ),
+        'trigger_id': '13345224609.738474920.8088930838d88f008e0',
+        'api_app_id': 'A123456',
+    }
+    return dict((field, [value]) for field, value in fields.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    import receptionist
+
+    received = time.time()
+    formats = [
+        ('v1, before',
+         lambda params: json.dumps({'default': json.dumps(params)}),
+         lambda message: receptionist.decode_message(
+             json.loads(message)['default']
+         )),
+        ('v1', json.dumps, receptionist.decode_message),
+        ('v2',
+         lambda params: receptionist.encode_message(params, received),
+         receptionist.decode_message),
+    ]
+    commands = [
+        ('short', 'pick pats'),
+        ('long', 'pick ' + ' '.join(['patriots'] * 80)),
+    ]
+
+    print('{:<8} {:<12} {:>7} {:>12} {:>12}'.format(
+        'command', 'format', 'bytes', 'encode us', 'decode us'))
+    for command, text in commands:
+        params = slack_params(text)
+        for name, encode, decode in formats:
+            message = encode(params)
+            assert decode(message)['text'] == text
+
+            encode_time = timeit.timeit(
+                lambda: encode(params), number=args.number
+            )
+            decode_time = timeit.timeit(
+                lambda: decode(message), number=args.number
+            )
+            print('{:<8} {:<12} {:>7} {:>12.1f} {:>12.1f}'.format(
+                command, name, len(message),
+                1e6 * encode_time / args.number,
+                1e6 * decode_time / args.number))
+
+
+if __name__ == '__main__':
+    main()
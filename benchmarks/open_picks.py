@@ -0,0 +1,66 @@
+"""
+Shows that settling a week reads only that week's open picks through the
+sparse `openWeek-index`, while a filtered scan reads the whole history.
+
+    python -m benchmarks.open_picks
+"""
+
+from __future__ import print_function
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+
+def load_history(thecommish, players, seasons, open_week):
+    """
+    Write SEASONS worth of settled picks for PLAYERS, plus one open pick per
+    player in OPEN_WEEK.
+    """
+    league = thecommish.league_key(standins.team_id, standins.channel_id)
+    pick_table = thecommish.dynamo.Table(thecommish.picks_table_name)
+    with pick_table.batch_writer() as batch:
+        for player in range(players):
+            for week in range(1, seasons * 17 + 1):
+                item = standins.pick_item(
+                    thecommish, league, 'U{:05d}'.format(player), week,
+                    userName='player{:}'.format(player),
+                    selectedTeam='patriots',
+                    sportRadarGameID='game-{:}'.format(week),
+                )
+                if week == open_week:
+                    item['openWeek'] = week
+                else:
+                    item['teamWon'] = week % 2
+                batch.put_item(Item=item)
+
+
+def main():
+    with standins.mock_backends():
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        counter = standins.CallCounter(thecommish.dynamo.meta.client)
+
+        players = 20
+        print('{:>8} {:>10} {:>14} {:>14}'.format(
+            'seasons', 'open', 'index reads', 'scan reads'))
+        for seasons in (1, 2, 4):
+            open_week = seasons * 17
+            load_history(thecommish, players, seasons, open_week)
+
+            counter.reset()
+            by_index = list(thecommish.get_open_picks(open_week))
+            index_reads = counter.scanned
+
+            counter.reset()
+            by_scan = list(thecommish.get_open_picks())
+            scan_reads = counter.scanned
+
+            assert len(by_index) == len(by_scan) == players
+            print('{:>8} {:>10} {:>14} {:>14}'.format(
+                seasons, len(by_index), index_reads, scan_reads))
+
+
+if __name__ == '__main__':
+    main()
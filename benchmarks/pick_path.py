@@ -0,0 +1,138 @@
+"""
+Shows the critical path of a pick with a fixed delay added to every
+DynamoDB call and to the SportRadar fetch, so the number of round trips in a
+row is what the timings measure.
+
+The original pick flow read the current pick, the user's record and the
+schedule one after another before writing. The current flow reads the
+(cached) schedule and the user's summary at the same time before a single
+transactional write, and when that write is refused re-checks both of its
+conditions at the same time.
+
+    python -m benchmarks.pick_path
+"""
+
+from __future__ import print_function
+
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+dynamo_delay = 0.02
+sportradar_delay = 0.1
+runs = 5
+
+
+def add_delays(thecommish):
+    """
+    Delay every DynamoDB call, and every schedule fetch, made by THECOMMISH.
+    """
+    def delay_call(**kwargs):
+        time.sleep(dynamo_delay)
+
+    thecommish.dynamo.meta.client.meta.events.register(
+        'before-call.dynamodb', delay_call
+    )
+
+    def fetch_schedule(week_num):
+        time.sleep(sportradar_delay)
+        return standins.make_schedule(
+            week_num, datetime.utcnow() + timedelta(days=1), closed=False
+        )
+
+    thecommish.fetch_schedule = fetch_schedule
+
+
+def original_flow(thecommish, league, user_id, week_num, team):
+    """
+    The reads and write made by a pick before picks were transactional.
+    """
+    thecommish.get_current_pick(league, user_id, week_num)
+    thecommish.get_user_record(league, user_id, week_num)
+    thecommish.get_schedule(week_num)
+    thecommish.get_table(thecommish.picks_table_name).put_item(
+        Item=standins.pick_item(
+            thecommish, league, user_id, week_num, selectedTeam=team
+        )
+    )
+
+
+def timed(call, *args):
+    """
+    Median seconds taken by `runs` calls to CALL with ARGS.
+    """
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        call(*args)
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    with standins.mock_backends():
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        # Every read is measured, none answered from the item cache
+        thecommish.item_cache.max_items = 0
+        add_delays(thecommish)
+
+        league = thecommish.league_key(standins.team_id, standins.channel_id)
+        week_num = 3
+        now = time.time()
+        team = thecommish.get_team('patriots')
+
+        def cold_original():
+            thecommish._schedule_cache.clear()
+            original_flow(thecommish, league, 'U00001', week_num, team)
+
+        def pick(user_id):
+            message = thecommish.pick_message(
+                league, user_id, 'player', week_num, team
+            )
+            assert message['response_text'].startswith(':ok_hand:')
+
+        def cold_pick():
+            thecommish._schedule_cache.clear()
+            pick('U00002')
+
+        def warm_pick():
+            pick('U00003')
+
+        kickoffs = thecommish.get_kickoff_index(week_num)
+
+        def serial_recheck():
+            thecommish._pick_condition(
+                league, 'U00003', week_num, kickoffs, now
+            )
+            thecommish.read_summary(league, 'U00003', consistent=True)
+
+        def concurrent_recheck():
+            thecommish.run_concurrently({
+                'pick': lambda: thecommish._pick_condition(
+                    league, 'U00003', week_num, kickoffs, now
+                ),
+                'summary': lambda: thecommish.read_summary(
+                    league, 'U00003', consistent=True
+                ),
+            })
+
+        print('DynamoDB call {:.0f} ms, SportRadar fetch {:.0f} ms'.format(
+            dynamo_delay * 1000, sportradar_delay * 1000))
+        print('{:<36} {:>10}'.format('path', 'ms'))
+        for name, call in [
+            ('original pick, cold schedule', cold_original),
+            ('pick, cold schedule', cold_pick),
+            ('pick, cached schedule', warm_pick),
+            ('refused pick re-check, serial', serial_recheck),
+            ('refused pick re-check, concurrent', concurrent_recheck),
+        ]:
+            print('{:<36} {:>10.1f}'.format(name, timed(call) * 1000))
+
+
+if __name__ == '__main__':
+    main()
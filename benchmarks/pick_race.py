@@ -0,0 +1,144 @@
+"""
+Races concurrent picks by the same user through `submit_pick` on the moto
+tables and checks that exactly one of them is written each time:
+
+    repeat team: the same team picked for several weeks at once, where
+        every pick but one must be refused with TeamAlreadyPicked,
+    after kickoff: several teams picked for the same week at once, each at
+        its game's kickoff, where the first pick written locks the week and
+        every other must be refused with PickLocked.
+
+Afterwards the standings summaries must still match the raw picks
+(`rebuild_standings(dry_run=True)` finds no mismatches).
+
+    python -m benchmarks.pick_race [--rounds N] [--pickers N]
+"""
+
+from __future__ import print_function
+
+import argparse
+from datetime import datetime, timedelta
+import threading
+import time
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+week_num = 5
+# Each DynamoDB call waits this long first, so the pickers overlap
+dynamo_delay = 0.01
+
+
+def race(calls):
+    """
+    Run each of CALLS at the same time in its own thread. Returns what each
+    returned, or the name of the exception it raised.
+    """
+    start = threading.Event()
+    outcomes = [None] * len(calls)
+
+    def target(i):
+        start.wait()
+        try:
+            calls[i]()
+            outcomes[i] = 'written'
+        except Exception as e:
+            outcomes[i] = type(e).__name__
+
+    threads = [
+        threading.Thread(target=target, args=(i,)) for i in range(len(calls))
+    ]
+    for thread in threads:
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join()
+
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--pickers', type=int, default=4)
+    args = parser.parse_args()
+
+    with standins.mock_backends():
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        thecommish.dynamo.meta.client.meta.events.register(
+            'before-call.dynamodb', lambda **kwargs: time.sleep(dynamo_delay)
+        )
+        thecommish.fetch_schedule = lambda week: standins.make_schedule(
+            week, datetime.utcnow() + timedelta(days=1), closed=False
+        )
+
+        league = thecommish.league_key(standins.team_id, standins.channel_id)
+        weeks = range(week_num, week_num + args.pickers)
+        kickoffs = dict(
+            (week, thecommish.get_kickoff_index(week)) for week in weeks
+        )
+        teams = sorted(kickoffs[week_num])
+
+        def repeat_team(user_id, team):
+            return [
+                lambda week=week: thecommish.submit_pick(
+                    league, user_id, week, team, 'player', kickoffs[week]
+                )
+                for week in weeks
+            ]
+
+        def after_kickoff(user_id, picks):
+            # Every game kicks off as it is picked
+            now = int(time.time())
+            started = dict(
+                (team, dict(game, kickoff=now))
+                for team, game in kickoffs[week_num].items()
+            )
+            return [
+                lambda team=team: thecommish.submit_pick(
+                    league, user_id, week_num, team, 'player', started
+                )
+                for team in picks
+            ]
+
+        print('{:<14} {:>7} {:>8} {:>9} {:>8}'.format(
+            'race', 'rounds', 'written', 'refused', 'seconds'))
+        for name, refusal, calls in [
+            ('repeat team', 'TeamAlreadyPicked',
+             lambda i, user_id: repeat_team(user_id, teams[i % len(teams)])),
+            ('after kickoff', 'PickLocked',
+             lambda i, user_id: after_kickoff(
+                 user_id, teams[i:i + args.pickers]
+             )),
+        ]:
+            written = 0
+            refused = 0
+            start = time.time()
+            for i in range(args.rounds):
+                user_id = 'U{:}{:05d}'.format(name[0].upper(), i)
+                outcomes = race(calls(i, user_id))
+                assert outcomes.count('written') == 1, outcomes
+                assert outcomes.count(refusal) == len(outcomes) - 1, outcomes
+                written += outcomes.count('written')
+                refused += outcomes.count(refusal)
+
+                summary = thecommish.read_summary(
+                    league, user_id, consistent=True
+                )
+                picked = thecommish.history_picks(summary.pickHistory)
+                assert len(picked) == 1, picked
+            seconds = time.time() - start
+
+            print('{:<14} {:>7} {:>8} {:>9} {:>8.2f}'.format(
+                name, args.rounds, written, refused, seconds))
+
+        mismatches = thecommish.rebuild_standings(dry_run=True)
+        assert not mismatches, mismatches
+        print('Summaries match the raw picks')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Times the weekly reminder for a large league against the local Slack stub,
+with a fixed delay on every Slack request, sending one message at a time and
+then `reminder_pool_size` at a time. The last run has the stub rate limit
+some requests, to show the backoff.
+
+    python -m benchmarks.reminders [--players N] [--delay SECONDS]
+"""
+
+from __future__ import print_function
+
+import argparse
+from datetime import datetime, timedelta
+import time
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+week_num = 5
+
+
+def load_league(thecommish, league, players):
+    """
+    Write four settled weeks of picks for PLAYERS in LEAGUE, and this week's
+    picks for every other player, then build their standings.
+    """
+    teams = sorted(thecommish.teams)
+    pick_table = thecommish.dynamo.Table(thecommish.picks_table_name)
+    with pick_table.batch_writer() as batch:
+        for player in range(players):
+            user_id = 'U{:05d}'.format(player)
+            for week in range(1, week_num + 1):
+                if week == week_num and player % 2:
+                    continue
+                item = standins.pick_item(
+                    thecommish, league, user_id, week,
+                    userName='player{:}'.format(player),
+                    selectedTeam=teams[(player + week) % len(teams)],
+                )
+                if week < week_num:
+                    item['teamWon'] = (player + week) % 2
+                batch.put_item(Item=item)
+
+    thecommish.rebuild_standings()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--players', type=int, default=300)
+    parser.add_argument('--delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    event = {'team_id': standins.team_id, 'channel_id': standins.channel_id}
+
+    with standins.mock_backends():
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        league = thecommish.league_key(standins.team_id, standins.channel_id)
+        load_league(thecommish, league, args.players)
+
+        thecommish.get_current_week = lambda custom_date=None: week_num
+        thecommish.fetch_schedule = lambda week: standins.make_schedule(
+            week, datetime.utcnow() + timedelta(days=1), closed=False
+        )
+        thecommish.slack_bot_token = 'bench-bot-token'
+        pool_size = thecommish.reminder_pool_size
+
+        print('Slack request {:.0f} ms, {:} players'.format(
+            args.delay * 1000, args.players))
+        print('{:<28} {:>8} {:>8} {:>8} {:>10}'.format(
+            'run', 'sent', 'failed', '429s', 'seconds'))
+        for name, size, limit_every in [
+            ('one at a time', 1, 0),
+            ('{:} at a time'.format(pool_size), pool_size, 0),
+            ('{:} at a time, rate limited'.format(pool_size), pool_size, 50),
+        ]:
+            with standins.SlackStub(
+                delay=args.delay, limit_every=limit_every, retry_after=0.2
+            ) as slack:
+                thecommish.webhook_url = slack.url + 'webhook'
+                thecommish.slack_api_url = slack.url
+                thecommish.reminder_pool_size = size
+
+                start = time.time()
+                report = thecommish.send_reminder_handler(event, None)
+                seconds = time.time() - start
+
+                assert report['sent'] == len(slack.received)
+                print('{:<28} {:>8} {:>8} {:>8} {:>10.2f}'.format(
+                    name, report['sent'], report['failed'], slack.limited,
+                    seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Times the full-table standings rebuild check (`compute_standings`) with the
+picks table read as 1, 2, 4 and 8 parallel scan segments.
+
+    python -m benchmarks.scans [--players N] [--page N] [--latency SECONDS]
+
+moto reads the whole table for every page of a scan, which swamps what is
+being measured, so the picks table is a `PagedTable` here: pages of PAGE
+items, each taking LATENCY seconds, as if DynamoDB's 1 MB pages were coming
+over the network.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import threading
+import time
+import zlib
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+weeks = 8
+
+
+class PagedTable(object):
+    """
+    Stands in for a DynamoDB table holding ITEMS in `scan`, which answers in
+    pages of PAGE items after LATENCY seconds. Segments are split by a hash
+    of each item's KEY attribute. Counts the `pages` read.
+    """
+
+    def __init__(self, items, key, page, latency):
+        self.items = items
+        self.key = key
+        self.page = page
+        self.latency = latency
+        self.pages = 0
+        self.lock = threading.Lock()
+
+    def scan(self, Segment=0, TotalSegments=1, ExclusiveStartKey=None,
+             **kwargs):
+        time.sleep(self.latency)
+        with self.lock:
+            self.pages += 1
+
+        items = [
+            item for item in self.items
+            if zlib.crc32(json.dumps(item[self.key]).encode('utf-8'))
+            % TotalSegments == Segment
+        ]
+        start = 0 if ExclusiveStartKey is None else ExclusiveStartKey['at']
+        end = start + self.page
+
+        response = {'Items': [dict(item) for item in items[start:end]]}
+        if end < len(items):
+            response['LastEvaluatedKey'] = {'at': end}
+        return response
+
+
+def make_picks(thecommish, players):
+    """
+    Return WEEKS settled picks for each of PLAYERS players, in four leagues.
+    """
+    teams = sorted(thecommish.teams)
+    picks = []
+    for player in range(players):
+        league = thecommish.league_key(
+            standins.team_id, 'C{:06d}'.format(player % 4)
+        )
+        for week in range(1, weeks + 1):
+            picks.append(standins.pick_item(
+                thecommish, league, 'U{:05d}'.format(player), week,
+                userName='player{:}'.format(player),
+                selectedTeam=teams[(player + week) % len(teams)],
+                teamWon=(player + week) % 2,
+            ))
+
+    return picks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--page', type=int, default=250)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    with standins.mock_backends():
+        import thecommish
+
+        table = PagedTable(
+            make_picks(thecommish, args.players), 'playerId', args.page,
+            args.latency
+        )
+        thecommish.get_table = lambda table_name: table
+
+        print('{:} picks, {:} a page, {:.0f} ms a page'.format(
+            len(table.items), args.page, args.latency * 1000))
+        print('{:>9} {:>7} {:>9} {:>10}'.format(
+            'segments', 'pages', 'players', 'seconds'))
+        expected = None
+        for segments in [1, 2, 4, 8]:
+            thecommish.scan_segments = segments
+            table.pages = 0
+
+            start = time.time()
+            standings = thecommish.compute_standings()
+            seconds = time.time() - start
+
+            if expected is None:
+                expected = standings
+            assert standings == expected
+            print('{:>9} {:>7} {:>9} {:>10.2f}'.format(
+                segments, table.pages, len(standings), seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Times the season odds simulation (`odds.season_odds`) for leagues of 50,
+200, 500 and 1000 players with 1, 4, 8 and 16 weeks of the season left to
+play, and reports how many players were simulated after dropping those who
+can't finish first.
+
+Then times the whole `odds` subcommand (`odds_message`) for a league in
+moto, reading the season from a snapshot file written by
+`warm_schedule_snapshot`, and once more with the snapshot missing, which
+must fail fast rather than fetch the season from SportRadar.
+
+    python -m benchmarks.season_odds [--simulations N] [--seed N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import standins
+
+standins.setup_environment()
+snapshot_dir = tempfile.mkdtemp()
+os.environ['scheduleSnapshotFile'] = os.path.join(snapshot_dir, 'snapshot')
+
+teams = 32
+season_weeks = 17
+# The league and week the whole subcommand is timed for
+league_players = 200
+league_week = 9
+
+
+def make_season(random, players, weeks_left):
+    """
+    Return `season_odds` arguments for PLAYERS players with WEEKS_LEFT weeks
+    of the season to play, drawn from RANDOM (a NumPy RandomState): random
+    pairings each week, settled games before that, and players who picked a
+    random unused team each settled week, winning half the time.
+    """
+    week_num = season_weeks - weeks_left + 1
+
+    def week_games(played):
+        order = random.permutation(teams)
+        return [
+            (order[i], order[i + teams // 2],
+             random.randint(2) if played else None, not played)
+            for i in range(teams // 2)
+        ]
+
+    past = [
+        (home, away, result)
+        for week in range(1, week_num)
+        for home, away, result, pickable in week_games(True)
+    ]
+    remaining = [week_games(False) for week in range(weeks_left)]
+
+    wins = []
+    used = []
+    for player in range(players):
+        picked = random.permutation(teams)[:week_num - 1]
+        wins.append(int(random.binomial(week_num - 1, 0.5)))
+        used.append(sum(1 << int(team) for team in picked))
+    # Half the league has already picked this week
+    first_picks = [
+        int(random.randint(teams)) if random.rand() < 0.5 else -1
+        for player in range(players)
+    ]
+    first_picks = [
+        team if team < 0 or not used[player] & (1 << team) else -1
+        for player, team in enumerate(first_picks)
+    ]
+
+    return wins, used, first_picks, past, remaining
+
+
+def time_simulations(simulations, seed):
+    """
+    Print the time `season_odds` takes for SIMULATIONS seasons in each
+    league size and number of weeks left, seeded from SEED.
+    """
+    import numpy as np
+
+    import odds
+
+    print('{:,} simulations, picks drawn every {:,}'.format(
+        simulations, odds.plan_seasons))
+    print('{:>8} {:>6} {:>10} {:>11} {:>9}'.format(
+        'players', 'weeks', 'contenders', 'simulations', 'seconds'))
+    for players in [50, 200, 500, 1000]:
+        for weeks_left in [1, 4, 8, 16]:
+            random = np.random.RandomState(seed)
+            wins, used, first_picks, past, remaining = make_season(
+                random, players, weeks_left
+            )
+            contenders = np.asarray(wins) + weeks_left >= max(wins)
+
+            start = time.time()
+            chances, count = odds.season_odds(
+                wins, used, first_picks, past, remaining, teams,
+                count=simulations, seed=seed
+            )
+            seconds = time.time() - start
+
+            assert abs(chances.sum() - 1) < 1e-6 and count == simulations
+            print('{:>8} {:>6} {:>10} {:>11,} {:>9.2f}'.format(
+                players, weeks_left, contenders.sum(), count, seconds))
+
+
+def load_league(thecommish, league, random):
+    """
+    Write standings for `league_players` players in LEAGUE who each picked a
+    random unused team in every week before `league_week`, and this week for
+    half of them, winning half the time.
+    """
+    table = thecommish.dynamo.Table(thecommish.standings_table_name)
+    with table.batch_writer() as batch:
+        for player in range(league_players):
+            picked = random.permutation(len(thecommish.team_order))
+            weeks = league_week - 1 + (player % 2)
+            rows = [
+                thecommish.RecordRow(
+                    week, thecommish.team_order[picked[week - 1]],
+                    int(random.randint(2)) if week < league_week else None
+                )
+                for week in range(1, weeks + 1)
+            ]
+            item = thecommish.standings_key(league, 'U{:08d}'.format(player))
+            item.update({
+                'userName': 'player{:}'.format(player),
+                'wins': sum(row.teamWon or 0 for row in rows),
+                'lastWeek': league_week - 1,
+                'summaryVersion': 1,
+            })
+            item.update(thecommish.summarize_picks(rows))
+            batch.put_item(Item=item)
+
+
+def time_subcommand(seed):
+    """
+    Print the time `odds_message` takes for a league drawn from SEED, with
+    the season snapshot read cold and warm, and missing.
+    """
+    import numpy as np
+
+    with standins.mock_backends():
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        league = thecommish.league_key(standins.team_id, standins.channel_id)
+        load_league(thecommish, league, np.random.RandomState(seed))
+
+        fetches = []
+        # This week's games kick off tomorrow, the weeks before it are over
+        tomorrow = datetime.utcnow() + timedelta(days=1)
+
+        def fetch_schedule(week_num):
+            fetches.append(week_num)
+            return standins.make_schedule(
+                week_num, tomorrow + timedelta(weeks=week_num - league_week),
+                closed=week_num < league_week
+            )
+
+        thecommish.fetch_schedule = fetch_schedule
+        report = thecommish.warm_schedule_snapshot()
+        print('\nsnapshot of {:} weeks, {:,} bytes'.format(
+            len(report['changed']), report['bytes']))
+
+        print('{:>10} {:>9} {:>8}'.format('snapshot', 'fetches', 'seconds'))
+        for name in ['cold', 'warm', 'missing']:
+            if name == 'missing':
+                os.remove(thecommish.schedule_snapshot_file)
+            if name != 'warm':
+                thecommish._schedule_cache.clear()
+                thecommish._schedule_snapshot.clear()
+            del fetches[:]
+
+            start = time.time()
+            message = thecommish.odds_message(league, league_week)
+            seconds = time.time() - start
+
+            if name == 'missing':
+                assert "isn't loaded" in message['response_text']
+            else:
+                assert message['response_text'].startswith('Chances')
+            print('{:>10} {:>9} {:>8.2f}'.format(name, len(fetches), seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--simulations', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=2017)
+    args = parser.parse_args()
+
+    try:
+        time_simulations(args.simulations, args.seed)
+        time_subcommand(args.seed)
+    finally:
+        shutil.rmtree(snapshot_dir)
+
+
+if __name__ == '__main__':
+    main()
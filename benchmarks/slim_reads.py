@@ -0,0 +1,188 @@
+"""
+Shows the response bytes saved by reading only the attributes each
+subcommand uses, and the read units those reads consume.
+
+Every read is made twice: as the bot makes it, and with its projection
+stripped so whole items come back. DynamoDB charges reads by the size of the
+whole item, whatever is projected, so read units only drop when a read
+moves to a smaller item or index; projections save response bytes and the
+time spent decoding them.
+
+    python -m benchmarks.slim_reads
+"""
+
+from __future__ import print_function
+
+from decimal import Decimal
+import math
+import time
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+players = 50
+weeks = 8
+
+
+class ReadMeter(object):
+    """
+    Hooks the DynamoDB CLIENT to optionally strip projections from reads and
+    to add up the read units consumed by reads with stripped projections,
+    from the sizes of the whole items they return.
+    """
+
+    def __init__(self, client):
+        self.strip = False
+        self.units = 0.0
+        client.meta.events.register(
+            'before-parameter-build.dynamodb', self._before_build
+        )
+        client.meta.events.register('after-call.dynamodb', self._after_call)
+
+    def _before_build(self, params, **kwargs):
+        if not self.strip or 'ProjectionExpression' not in params:
+            return
+        del params['ProjectionExpression']
+        names = dict(
+            (k, v) for k, v in params['ExpressionAttributeNames'].items()
+            if not k.startswith('#p')
+        )
+        if names:
+            params['ExpressionAttributeNames'] = names
+        else:
+            del params['ExpressionAttributeNames']
+
+    def _after_call(self, parsed, model, **kwargs):
+        if not self.strip:
+            return
+        items = parsed.get('Items', [])
+        if 'Item' in parsed:
+            items = [parsed['Item']]
+        # Each call reads at least one 4 KB unit, at half price for the
+        # eventually consistent reads measured here
+        size = sum(item_size(item) for item in items)
+        self.units += 0.5 * max(1, math.ceil(size / 4096.0))
+
+
+def value_size(value):
+    """
+    Approximate size of VALUE as DynamoDB counts it, in bytes.
+    """
+    if isinstance(value, dict):
+        return 3 + item_size(value)
+    if isinstance(value, (list, set, tuple)):
+        return 3 + sum(1 + value_size(v) for v in value)
+    if isinstance(value, (bool, type(None))):
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(value).replace('-', '').replace('.', ''))
+        return 1 + (digits + 1) // 2
+    return len(value.encode('utf-8') if hasattr(value, 'encode') else value)
+
+
+def item_size(item):
+    """
+    Approximate size of the DynamoDB ITEM, in bytes.
+    """
+    return sum(len(k) + value_size(v) for k, v in item.items())
+
+
+def load_season(thecommish, league):
+    """
+    Write `weeks` settled weeks of picks for `players` in LEAGUE, one open
+    week after them, and the matching standings.
+    """
+    teams = sorted(thecommish.teams)
+    pick_table = thecommish.dynamo.Table(thecommish.picks_table_name)
+    standings_table = thecommish.dynamo.Table(thecommish.standings_table_name)
+    now = time.time()
+    with pick_table.batch_writer() as batch:
+        for player in range(players):
+            for week in range(1, weeks + 2):
+                item = standins.pick_item(
+                    thecommish, league, 'U{:08d}'.format(player), week,
+                    userName='player{:}'.format(player),
+                    selectedTeam=teams[(player + week) % len(teams)],
+                    selectionTime='2017-09-{:02d} 12:34:56.789012'.format(
+                        week),
+                    sportRadarGameID=(
+                        '0141a0a5-13e5-4b28-b19f-{:012d}'.format(week)),
+                    lockTime=int(now) + week * 7 * 24 * 3600,
+                )
+                if week > weeks:
+                    item['openWeek'] = week
+                else:
+                    item['teamWon'] = (player + week) % 2
+                batch.put_item(Item=item)
+
+    with standings_table.batch_writer() as batch:
+        for player in range(players):
+            item = thecommish.standings_key(league, 'U{:08d}'.format(player))
+            item.update({
+                'userName': 'player{:}'.format(player),
+                'wins': weeks // 2,
+                'losses': weeks - weeks // 2,
+                'lastWeek': weeks,
+                'summaryVersion': 1,
+            })
+            item.update(thecommish.summarize_picks(
+                thecommish.RecordRow(
+                    week, teams[(player + week) % len(teams)],
+                    (player + week) % 2 if week <= weeks else None
+                )
+                for week in range(1, weeks + 2)
+            ))
+            batch.put_item(Item=item)
+
+
+def main():
+    with standins.mock_backends():
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        # Every read is measured, none answered from the item cache
+        thecommish.item_cache.max_items = 0
+        league = thecommish.league_key(standins.team_id, standins.channel_id)
+        load_season(thecommish, league)
+        client = thecommish.dynamo.meta.client
+        counter = standins.CallCounter(client)
+        meter = ReadMeter(client)
+
+        week_num = weeks + 1
+        reads = [
+            ('standings', lambda: thecommish.get_standings(league)),
+            ('record (picks)', lambda: thecommish.get_user_record(
+                league, 'U00000001', week_num)),
+            ('record (summary)', lambda: thecommish.read_summary(
+                league, 'U00000001')),
+            ('who', lambda: thecommish.get_who_picked(league, week_num)),
+            ('pick (current)', lambda: thecommish.get_current_pick(
+                league, 'U00000001', week_num)),
+            ('results', lambda: list(thecommish.get_open_picks(week_num))),
+            ('rebuild', lambda: thecommish.compute_standings()),
+        ]
+
+        print('{:<16} {:>12} {:>12} {:>8} {:>10}'.format(
+            'read', 'full bytes', 'slim bytes', 'saved', 'read units'))
+        for name, read in reads:
+            meter.strip = True
+            counter.reset()
+            meter.units = 0.0
+            full = read()
+            full_bytes = counter.received
+            units = meter.units
+
+            meter.strip = False
+            counter.reset()
+            slim = read()
+            slim_bytes = counter.received
+
+            assert full == slim, name
+            print('{:<16} {:>12} {:>12} {:>7.0f}% {:>10.1f}'.format(
+                name, full_bytes, slim_bytes,
+                100.0 * (full_bytes - slim_bytes) / full_bytes, units))
+
+
+if __name__ == '__main__':
+    main()
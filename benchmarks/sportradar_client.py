@@ -0,0 +1,117 @@
+"""
+Exercises the SportRadar client against the local SportRadar stand-in and
+reports the requests each scenario makes and how long it takes:
+concurrent fetches of the same schedule, a run of boxscores under the rate
+limit, a 429 and a 503 retried, and an outage that opens the circuit.
+
+    python -m benchmarks.sportradar_client [--callers N] [--rate N]
+"""
+
+from __future__ import print_function
+
+import argparse
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+import time
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+week_num = 5
+
+
+def run(name, stub, function):
+    """
+    Run FUNCTION and print the requests STUB received and the time taken,
+    under NAME. Returns what FUNCTION returned.
+    """
+    before = stub.requests
+    start = time.time()
+    result = function()
+    seconds = time.time() - start
+    print('{:<32} {:>9} {:>10.2f}  {:}'.format(
+        name, stub.requests - before, seconds, result))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--callers', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=5)
+    args = parser.parse_args()
+
+    import sportradar
+
+    # Keep the waits short, the scenarios only need their order
+    sportradar.backoff = 0.05
+    sportradar.breaker_cooldown = 0.5
+
+    games = standins.make_schedule(week_num, datetime.utcnow(), closed=False)
+    schedule_path = 'nfl-ot2/games/2017/REG/{:}/schedule.json'.format(
+        week_num
+    )
+
+    with standins.SportRadarStub(delay=0.2, retry_after=0.1) as stub:
+        stub.schedules[week_num] = games
+        for game in games:
+            stub.games[game['id']] = {'id': game['id'], 'status': 'closed'}
+        client = sportradar.Client(stub.url, 'bench', rate=args.rate, burst=2)
+        pool = ThreadPool(args.callers)
+
+        print('{:<32} {:>9} {:>10}  {:}'.format(
+            'scenario', 'requests', 'seconds', 'result'))
+
+        def same_schedule():
+            results = pool.map(
+                lambda caller: client.get(schedule_path),
+                range(args.callers)
+            )
+            return '{:} callers, {:} distinct answers'.format(
+                len(results), len(set(id(r[0]) for r in results)))
+        run('same schedule, concurrently', stub, same_schedule)
+
+        def boxscores():
+            pool.map(
+                lambda game: client.get(
+                    'nfl-ot2/games/{:}/boxscore.json'.format(game['id'])
+                ),
+                games
+            )
+            return '{:} games at {:} a second'.format(len(games), args.rate)
+        run('boxscores, rate limited', stub, boxscores)
+
+        def retried():
+            stub.failures.extend([429, 503])
+            document, etag = client.get(schedule_path)
+            return '{:} games'.format(len(document['week']['games']))
+        run('429 then 503, retried', stub, retried)
+
+        def outage():
+            stub.failures.extend([500] * 100)
+            answers = [client.get(schedule_path) for _ in range(3)]
+            return 'circuit {:}, {:} answers from the last good copy'.format(
+                'open' if client.breaker.is_open else 'closed', len(answers))
+        run('outage', stub, outage)
+
+        def outage_no_copy():
+            try:
+                client.get('nfl-ot2/games/2017/REG/6/schedule.json')
+            except sportradar.Unavailable as e:
+                return 'Unavailable: {:}'.format(e)
+        run('outage, nothing to fall back on', stub, outage_no_copy)
+
+        def recovered():
+            del stub.failures[:]
+            time.sleep(sportradar.breaker_cooldown)
+            client.get(schedule_path)
+            return 'circuit {:}'.format(
+                'open' if client.breaker.is_open else 'closed')
+        run('after the cooldown', stub, recovered)
+
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,604 @@
+"""
+Local stand-ins for the AWS services used by the bot, built on moto.
+
+Benchmarks must call `setup_environment` before importing `thecommish`,
+which reads its configuration from the environment at import time, and run
+inside `mock_backends()`. moto (and with it boto3) is only imported by
+`mock_backends`, so a benchmark can time a cold import before it.
+"""
+
+from __future__ import print_function
+
+import contextlib
+import os
+import time
+
+
+def moto_mocks():
+    """
+    Return moto's mocks for the services the bot uses.
+    """
+    try:
+        from moto import mock_aws
+        return [mock_aws]
+    except ImportError:
+        from moto import mock_sns
+        try:
+            # Before moto 3, mock_dynamodb is the long retired DynamoDB API
+            from moto import mock_dynamodb2 as mock_dynamodb
+        except ImportError:
+            from moto import mock_dynamodb
+        return [mock_dynamodb, mock_sns]
+
+
+def setup_environment():
+    """
+    Set the environment variables the bot reads at import time to dummy
+    values, and point boto3 at a fake region with fake credentials.
+    """
+    defaults = {
+        'slackAppToken': 'bench-token',
+        'sportRadarToken': 'bench-sr-token',
+        # The SportRadar stand-in has no per-second limit to stay under
+        'sportRadarRate': '1000',
+        'slackWebHookURL': 'http://localhost/webhook',
+        'snsARN': 'arn:aws:sns:us-east-1:123456789012:pickem',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def segment_scans():
+    """
+    Make moto's DynamoDB scans honour `Segment` and `TotalSegments`, which
+    moto before 3 ignores, so every segment of a parallel scan would return
+    the whole table. Each page is cut down to the items whose partition key
+    hashes to the segment. Later versions of moto are left alone.
+    """
+    try:
+        from moto.dynamodb2.responses import DynamoHandler
+    except ImportError:
+        return
+    if getattr(DynamoHandler.scan, 'segmented', False):
+        return
+
+    import json
+    import zlib
+
+    scan = DynamoHandler.scan
+
+    def segmented_scan(self):
+        result = scan(self)
+        segments = self.body.get('TotalSegments')
+        if not segments or not isinstance(result, str):
+            return result
+
+        table = self.dynamodb_backend.get_table(self.body['TableName'])
+        response = json.loads(result)
+        response['Items'] = [
+            item for item in response['Items']
+            if zlib.crc32(json.dumps(
+                item.get(table.hash_key_attr), sort_keys=True
+            ).encode('utf-8')) % segments == self.body['Segment']
+        ]
+        response['Count'] = len(response['Items'])
+        return json.dumps(response)
+
+    segmented_scan.segmented = True
+    DynamoHandler.scan = segmented_scan
+
+
+def atomic_requests():
+    """
+    Make moto apply one DynamoDB request at a time, as DynamoDB applies each
+    request atomically. moto's backends aren't safe to use from several
+    threads: a transaction copies every table to roll back to, which fails if
+    another thread writes meanwhile.
+    """
+    try:
+        from moto.dynamodb2.responses import DynamoHandler
+    except ImportError:
+        from moto.dynamodb.responses import DynamoHandler
+    if getattr(DynamoHandler.call_action, 'atomic', False):
+        return
+
+    import threading
+
+    lock = threading.Lock()
+    call_action = DynamoHandler.call_action
+
+    def atomic_call_action(self):
+        with lock:
+            return call_action(self)
+
+    atomic_call_action.atomic = True
+    DynamoHandler.call_action = atomic_call_action
+
+
+def item_backups():
+    """
+    Make moto's DynamoDB transactions back up only the items they write,
+    rather than every table, which moto before 3 copies whole for every
+    transaction, so a transaction took time in proportion to the table.
+    Relies on `atomic_requests`. Later versions of moto are left alone.
+    """
+    try:
+        from moto.dynamodb2 import models
+    except ImportError:
+        return
+    backend = models.DynamoDBBackend
+    if getattr(backend.transact_write_items, 'item_backups', False):
+        return
+
+    import copy
+
+    class NoTableCopy(object):
+        # Stands in for the `copy` module during a transaction
+        @staticmethod
+        def deepcopy(tables):
+            return tables
+
+    transact_write_items = backend.transact_write_items
+
+    def locate(self, operation):
+        name = operation['TableName']
+        table = self.get_table(name)
+        keys = operation.get('Key')
+        if keys is None:
+            keys = dict(
+                (attr, operation['Item'][attr])
+                for attr in (table.hash_key_attr, table.range_key_attr)
+                if attr is not None
+            )
+        return (name, keys) + tuple(self.get_keys_value(table, keys))
+
+    def restore(self, name, keys, hash_key, range_key, item):
+        items = self.get_table(name).items
+        if range_key is None:
+            if item is None:
+                items.pop(hash_key, None)
+            else:
+                items[hash_key] = item
+        elif item is None:
+            items.get(hash_key, {}).pop(range_key, None)
+        else:
+            items[hash_key][range_key] = item
+
+    def backed_up_transact_write_items(self, transact_items):
+        backups = []
+        for operation in transact_items:
+            for kind in ('Put', 'Update', 'Delete'):
+                if kind in operation:
+                    location = locate(self, operation[kind])
+                    backups.append(location + (copy.deepcopy(
+                        self.get_item(location[0], location[1])
+                    ),))
+
+        models.copy = NoTableCopy
+        try:
+            return transact_write_items(self, transact_items)
+        except Exception:
+            for backup in reversed(backups):
+                restore(self, *backup)
+            raise
+        finally:
+            models.copy = copy
+
+    backed_up_transact_write_items.item_backups = True
+    backend.transact_write_items = backed_up_transact_write_items
+
+
+@contextlib.contextmanager
+def mock_backends():
+    """
+    Context manager that routes all boto3 calls to moto's in-memory backends.
+    """
+    segment_scans()
+    atomic_requests()
+    item_backups()
+    mocks = [mock() for mock in moto_mocks()]
+    for mock in mocks:
+        mock.start()
+    try:
+        yield
+    finally:
+        for mock in reversed(mocks):
+            mock.stop()
+
+
+def mock_existing_clients():
+    """
+    Route the AWS clients `connections` created before moto was imported
+    through moto's mocks too. moto only hooks the clients created after it
+    is imported.
+    """
+    from moto.core.models import botocore_stubber
+
+    import connections
+
+    clients = [
+        client for client in (
+            connections._sns_client, connections._sqs_client,
+            connections._dynamo and connections._dynamo.meta.client
+        )
+        if client is not None
+    ]
+    for client in clients:
+        client.meta.events.register('before-send', botocore_stubber)
+
+
+# The Slack workspace and channel benchmark requests come from
+team_id = 'T0BENCH'
+channel_id = 'C0BENCH'
+
+
+def create_tables(dynamo):
+    """
+    Create the bot's tables, with the same keys and indexes as production, on
+    the (mocked) DYNAMO resource. The legacy single league tables are created
+    too, for migrations.
+    """
+    throughput = {'ReadCapacityUnits': 5, 'WriteCapacityUnits': 5}
+
+    dynamo.create_table(
+        TableName='pickem-league-picks',
+        KeySchema=[
+            {'AttributeName': 'playerId', 'KeyType': 'HASH'},
+            {'AttributeName': 'weekNumber', 'KeyType': 'RANGE'},
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'playerId', 'AttributeType': 'S'},
+            {'AttributeName': 'weekNumber', 'AttributeType': 'N'},
+            {'AttributeName': 'leagueWeek', 'AttributeType': 'S'},
+            {'AttributeName': 'openWeek', 'AttributeType': 'N'},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': 'leagueWeek-index',
+                'KeySchema': [
+                    {'AttributeName': 'leagueWeek', 'KeyType': 'HASH'},
+                ],
+                'Projection': {'ProjectionType': 'ALL'},
+                'ProvisionedThroughput': throughput,
+            },
+            {
+                'IndexName': 'openWeek-index',
+                'KeySchema': [
+                    {'AttributeName': 'openWeek', 'KeyType': 'HASH'},
+                ],
+                'Projection': {'ProjectionType': 'ALL'},
+                'ProvisionedThroughput': throughput,
+            },
+        ],
+        ProvisionedThroughput=throughput,
+    )
+
+    dynamo.create_table(
+        TableName='pickem-league-standings',
+        KeySchema=[
+            {'AttributeName': 'leagueId', 'KeyType': 'HASH'},
+            {'AttributeName': 'userId', 'KeyType': 'RANGE'},
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'leagueId', 'AttributeType': 'S'},
+            {'AttributeName': 'userId', 'AttributeType': 'S'},
+        ],
+        ProvisionedThroughput=throughput,
+    )
+
+    dynamo.create_table(
+        TableName='pickem-live-games',
+        KeySchema=[{'AttributeName': 'gameId', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'gameId', 'AttributeType': 'S'},
+        ],
+        ProvisionedThroughput=throughput,
+    )
+
+    dynamo.create_table(
+        TableName='pickem-picks',
+        KeySchema=[
+            {'AttributeName': 'userId', 'KeyType': 'HASH'},
+            {'AttributeName': 'weekNumber', 'KeyType': 'RANGE'},
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'userId', 'AttributeType': 'S'},
+            {'AttributeName': 'weekNumber', 'AttributeType': 'N'},
+        ],
+        ProvisionedThroughput=throughput,
+    )
+
+    dynamo.create_table(
+        TableName='pickem-standings',
+        KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'userId', 'AttributeType': 'S'},
+        ],
+        ProvisionedThroughput=throughput,
+    )
+
+
+def pick_item(thecommish, league, user_id, week_num, **attributes):
+    """
+    Return a pick item for USER_ID in LEAGUE and WEEK_NUM with the given
+    ATTRIBUTES, keyed the way THECOMMISH writes them.
+    """
+    item = thecommish.pick_key(league, user_id, week_num)
+    item.update(
+        leagueId=league,
+        leagueWeek=thecommish.league_week(league, week_num),
+        userId=user_id,
+        **attributes
+    )
+    return item
+
+
+class CallCounter(object):
+    """
+    Counts the calls made by a boto3 CLIENT, the items those calls read and
+    the response bytes received, by hooking the client's event system. moto
+    reports the whole table as scanned for index queries, so queries count
+    the items they return, which is what DynamoDB reads for a query without a
+    filter.
+    """
+
+    def __init__(self, client):
+        self.calls = {}
+        self.scanned = 0
+        self.received = 0
+        client.meta.events.register('after-call.dynamodb', self._after_call)
+
+    def _after_call(self, http_response, parsed, model, **kwargs):
+        self.calls[model.name] = self.calls.get(model.name, 0) + 1
+        self.received += len(http_response.content)
+        if model.name == 'Query':
+            self.scanned += parsed.get('Count', 0)
+        else:
+            self.scanned += parsed.get('ScannedCount', 0)
+        if model.name == 'GetItem' and 'Item' in parsed:
+            self.scanned += 1
+
+    def reset(self):
+        self.calls = {}
+        self.scanned = 0
+        self.received = 0
+
+
+def create_topic():
+    """
+    Create the SNS topic the receptionist publishes to, and point `snsARN`
+    at it.
+    """
+    import boto3
+
+    topic = boto3.client('sns').create_topic(Name='pickem')
+    os.environ['snsARN'] = topic['TopicArn']
+
+
+_team_names = [
+    ('Arizona', 'Cardinals'), ('Atlanta', 'Falcons'), ('Baltimore', 'Ravens'),
+    ('Buffalo', 'Bills'), ('Carolina', 'Panthers'), ('Chicago', 'Bears'),
+    ('Cincinnati', 'Bengals'), ('Cleveland', 'Browns'), ('Dallas', 'Cowboys'),
+    ('Denver', 'Broncos'), ('Detroit', 'Lions'), ('Green Bay', 'Packers'),
+    ('Houston', 'Texans'), ('Indianapolis', 'Colts'),
+    ('Jacksonville', 'Jaguars'), ('Kansas City', 'Chiefs'),
+    ('Miami', 'Dolphins'), ('Minnesota', 'Vikings'),
+    ('New England', 'Patriots'), ('New Orleans', 'Saints'),
+    ('Oakland', 'Raiders'), ('Philadelphia', 'Eagles'),
+    ('Pittsburgh', 'Steelers'), ('San Francisco', '49ers'),
+    ('Seattle', 'Seahawks'), ('Tampa Bay', 'Buccaneers'),
+    ('Tennessee', 'Titans'), ('Washington', 'Redskins'),
+    ('Los Angeles', 'Chargers'), ('Los Angeles', 'Rams'),
+    ('New York', 'Giants'), ('New York', 'Jets'),
+]
+
+
+def make_schedule(week_num, kickoff=None, closed=True):
+    """
+    Return a canned SportRadar schedule (the `games` list) for WEEK_NUM with
+    all 32 teams playing. Games kick off at KICKOFF, a datetime, or in 2017's
+    week WEEK_NUM if not given. Closed games get deterministic scores.
+    """
+    from datetime import datetime, timedelta
+
+    if kickoff is None:
+        kickoff = datetime(2017, 9, 10, 17) + timedelta(weeks=week_num - 1)
+
+    games = []
+    rotation = (week_num - 1) % (len(_team_names) - 1)
+    order = [_team_names[0]] + (
+        _team_names[1:][rotation:] + _team_names[1:][:rotation]
+    )
+    for i in range(len(order) // 2):
+        home = order[i]
+        away = order[-1 - i]
+        game = {
+            'id': 'game-{:}-{:}'.format(week_num, i),
+            'status': 'closed' if closed else 'scheduled',
+            'scheduled': kickoff.strftime('%Y-%m-%dT%H:%M:%S+00:00'),
+            'home': {'name': ' '.join(home)},
+            'away': {'name': ' '.join(away)},
+        }
+        if closed:
+            game['scoring'] = {
+                'home_points': 17 + (week_num + i) % 3 * 7,
+                'away_points': 20,
+            }
+        games.append(game)
+
+    return games
+
+
+class SlackStub(object):
+    """
+    Local HTTP server standing in for Slack's `response_url`, webhooks and
+    Web API methods (any path ending in a method name, such as
+    `chat.postMessage`). Every accepted JSON body is appended to `received`.
+    Each request takes DELAY seconds. With LIMIT_EVERY set, every
+    LIMIT_EVERY-th request is refused with a 429 and a Retry-After of
+    RETRY_AFTER seconds; `limited` counts them.
+    """
+
+    def __init__(self, delay=0.0, limit_every=0, retry_after=1):
+        import threading
+
+        try:
+            from http.server import BaseHTTPRequestHandler, HTTPServer
+            from socketserver import ThreadingMixIn
+        except ImportError:
+            from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+            from SocketServer import ThreadingMixIn
+
+        received = self.received = []
+        stub = self
+        self.limited = 0
+        self.requests = 0
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                time.sleep(delay)
+
+                with lock:
+                    stub.requests += 1
+                    refuse = limit_every and stub.requests % limit_every == 0
+                    if refuse:
+                        stub.limited += 1
+                if refuse:
+                    self.send_response(429)
+                    self.send_header('Retry-After', str(retry_after))
+                    self.end_headers()
+                    return
+
+                received.append(body)
+                self.send_response(200)
+                self.end_headers()
+                if '.' in self.path.rsplit('/', 1)[-1]:
+                    self.wfile.write(b'{"ok": true}')
+                else:
+                    self.wfile.write(b'ok')
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{:}/'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SportRadarStub(object):
+    """
+    Local HTTP server standing in for SportRadar's weekly schedules and game
+    boxscores. Set a week's games in `schedules`, keyed by week number, and a
+    game's boxscore in `games`, keyed by game ID. Responses carry an ETag of
+    the body and requests with a matching If-None-Match get a 304. Each
+    request takes DELAY seconds. Status codes appended to `failures` are
+    answered, in order, instead of the next requests (429s with a
+    Retry-After of RETRY_AFTER seconds). Counts `requests`, `not_modified`
+    and `failed` responses.
+    """
+
+    def __init__(self, delay=0.0, retry_after=1):
+        import hashlib
+        import json
+        import threading
+
+        try:
+            from http.server import BaseHTTPRequestHandler, HTTPServer
+            from socketserver import ThreadingMixIn
+        except ImportError:
+            from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+            from SocketServer import ThreadingMixIn
+
+        games = self.games = {}
+        schedules = self.schedules = {}
+        failures = self.failures = []
+        stub = self
+        self.requests = 0
+        self.not_modified = 0
+        self.failed = 0
+        lock = threading.Lock()
+
+        def document(path):
+            parts = path.split('?')[0].split('/')
+            if parts[-1] == 'schedule.json':
+                week = int(parts[-2])
+                if week in schedules:
+                    return {'week': {'games': schedules[week]}}
+            elif parts[-2] in games:
+                return games[parts[-2]]
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(delay)
+                with lock:
+                    stub.requests += 1
+                    failure = failures.pop(0) if failures else None
+                    if failure is not None:
+                        stub.failed += 1
+                if failure is not None:
+                    self.send_response(failure)
+                    if failure == 429:
+                        self.send_header('Retry-After', str(retry_after))
+                    self.end_headers()
+                    return
+
+                found = document(self.path)
+                if found is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+
+                body = json.dumps(found, sort_keys=True)
+                body = body.encode('utf-8')
+                etag = '"{:}"'.format(hashlib.sha1(body).hexdigest())
+                if self.headers.get('If-None-Match') == etag:
+                    with lock:
+                        stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{:}/'.format(self.server.server_port)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,186 @@
+"""
+Measures cold start cost for each handler: the time to import its module in
+a fresh interpreter, how many modules that import loads, and the latency of
+its first and second invocations.
+
+    python -m benchmarks.startup [--runs N]
+
+Each measurement runs in its own subprocess so that nothing is imported
+ahead of time: the handler's module is imported before moto, so its import
+pays for boto3 if it needs it. The stand-ins (moto, a local Slack stub,
+canned schedules) are set up after the import and before the first
+invocation, with the bot pinned to `week_num` of the season and a few
+players with open picks from the week before, so the scheduled handlers
+have work to do.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+from benchmarks import standins
+
+# The week of the season the handlers run in
+week_num = 3
+players = 5
+
+# Handler name -> (module, function)
+handlers = {
+    'receptionist': ('receptionist', 'receptionist_handler'),
+    'worker': ('thecommish', 'worker_handler'),
+    'results': ('thecommish', 'results_update_handler'),
+    'reminder': ('thecommish', 'send_reminder_handler'),
+}
+
+
+def make_event(name, response_url, trigger_id):
+    """
+    Return a representative event for the handler NAME, for the command with
+    Slack's TRIGGER_ID.
+    """
+    params = {
+        'token': 'bench-token',
+        'user_name': 'bench',
+        'user_id': 'U00001',
+        'command': '/pickem',
+        'team_id': standins.team_id,
+        'channel_id': standins.channel_id,
+        'channel_name': 'pickem',
+        'text': 'who',
+        'response_url': response_url,
+        'trigger_id': trigger_id,
+    }
+
+    if name == 'receptionist':
+        return {'body': urlencode(params)}
+    elif name == 'worker':
+        message = dict((k, [v]) for k, v in params.items())
+        return {'Records': [{'Sns': {'Message': json.dumps(message)}}]}
+    elif name == 'reminder':
+        return {'team_id': standins.team_id, 'channel_id': standins.channel_id}
+    else:
+        return {}
+
+
+def load_league(thecommish):
+    """
+    Write a pick for each of `players` players in the benchmark league in
+    the week before `week_num`, still open, and their standings.
+    """
+    league = thecommish.league_key(standins.team_id, standins.channel_id)
+    kickoffs = thecommish.build_kickoff_index(
+        standins.make_schedule(week_num - 1)
+    )
+    teams = sorted(kickoffs)
+    table = thecommish.dynamo.Table(thecommish.picks_table_name)
+    with table.batch_writer() as batch:
+        for player in range(players):
+            batch.put_item(Item=standins.pick_item(
+                thecommish, league, 'U{:05d}'.format(player), week_num - 1,
+                userName='player{:}'.format(player),
+                selectedTeam=teams[player],
+                sportRadarGameID=kickoffs[teams[player]]['game'],
+                openWeek=week_num - 1
+            ))
+
+    thecommish.rebuild_standings()
+
+
+def run_child(name):
+    """
+    Measure handler NAME in this (fresh) interpreter and print the timings
+    as JSON.
+    """
+    import importlib
+
+    standins.setup_environment()
+    module_name, function_name = handlers[name]
+
+    loaded = len(sys.modules)
+    start = time.time()
+    module = importlib.import_module(module_name)
+    imported = time.time()
+    modules = len(sys.modules) - loaded
+
+    with standins.mock_backends(), standins.SlackStub() as slack:
+        import boto3
+
+        standins.mock_existing_clients()
+        standins.create_topic()
+        standins.create_tables(boto3.resource('dynamodb'))
+        events = [make_event(name, slack.url, str(i)) for i in range(2)]
+
+        if hasattr(module, 'get_current_week'):
+            module.get_current_week = lambda custom_date=None: week_num
+            module.fetch_schedule = standins.make_schedule
+            module.webhook_url = slack.url + 'webhook'
+            load_league(module)
+
+        handler = getattr(module, function_name)
+        before = time.time()
+        handler(events[0], None)
+        first = time.time()
+        handler(events[1], None)
+        second = time.time()
+
+    print(json.dumps({
+        'import': imported - start,
+        'first': first - before,
+        'second': second - first,
+        'modules': modules,
+    }))
+
+
+def measure(name, runs):
+    """
+    Run RUNS fresh interpreters for handler NAME and return their timings.
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.check_output([
+            sys.executable, '-m', 'benchmarks.startup', '--child', name
+        ])
+        results.append(json.loads(output.decode('utf-8').splitlines()[-1]))
+
+    return results
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', choices=sorted(handlers))
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    print('{:<14} {:>12} {:>12} {:>12} {:>9}'.format(
+        'handler', 'import ms', 'first ms', 'warm ms', 'modules'))
+    for name in sorted(handlers):
+        results = measure(name, args.runs)
+        print('{:<14} {:>12.1f} {:>12.1f} {:>12.1f} {:>9}'.format(
+            name,
+            1000 * median([r['import'] for r in results]),
+            1000 * median([r['first'] for r in results]),
+            1000 * median([r['second'] for r in results]),
+            median([r['modules'] for r in results]),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,392 @@
+"""
+Runs the bot's hot paths against the local stand-ins (moto, canned
+schedules and a local Slack stub) and reports latency percentiles, memory
+allocated and the calls each makes to DynamoDB, SportRadar and Slack.
+Memory is the peak traced by tracemalloc or, on Python 2 which doesn't have
+it, the number of objects the garbage collector tracks that a call leaves
+allocated.
+
+    python -m benchmarks.suite [--players N] [--leagues N] [--seasons N]
+                               [--weeks N] [--runs N] [--save FILE]
+                               [--compare FILE]
+
+Save a baseline with `--save` and check a later commit against it with
+`--compare`, which exits with status 1 if a case got slower than
+`--tolerance` percent at the median, or makes more backend calls.
+
+The current season is `--weeks` weeks old: earlier weeks are settled, last
+week's picks are open and half the players have picked this week. Earlier
+seasons are stored at negative week numbers, so they don't collide with the
+current season but still weigh on every scan. Each of the `--leagues`
+leagues has `--players` players; the cases play in the first one.
+"""
+
+from __future__ import print_function
+
+import argparse
+from datetime import datetime, timedelta
+import gc
+import itertools
+import json
+import subprocess
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+# Slack's trigger IDs, one per command
+triggers = itertools.count()
+
+
+def percentile(values, fraction):
+    """
+    The nearest-rank FRACTION percentile of VALUES.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def league_channel(league):
+    """
+    The Slack channel ID of the benchmark league number LEAGUE.
+    """
+    if league == 0:
+        return standins.channel_id
+    return 'C{:06d}'.format(league)
+
+
+def worker_event(user_id, text, response_url):
+    """
+    An SNS event for the worker with the slash command TEXT from USER_ID in
+    the first league. Like Slack, every command gets its own `trigger_id`.
+    """
+    params = {
+        'token': ['bench-token'],
+        'user_name': [user_id.lower()],
+        'user_id': [user_id],
+        'command': ['/pickem'],
+        'team_id': [standins.team_id],
+        'channel_id': [league_channel(0)],
+        'channel_name': ['pickem'],
+        'text': [text],
+        'response_url': [response_url],
+        'trigger_id': [str(next(triggers))],
+    }
+    return {'Records': [{'Sns': {'Message': json.dumps(params)}}]}
+
+
+def load_leagues(thecommish, leagues, players, seasons, weeks):
+    """
+    Write the picks described in the module docstring, rebuild the standings
+    from them, and return the open picks so they can be reopened between
+    settlement runs.
+    """
+    teams = sorted(thecommish.teams)
+    pick_table = thecommish.dynamo.Table(thecommish.picks_table_name)
+
+    open_picks = []
+    with pick_table.batch_writer() as batch:
+        for player, league_num in itertools.product(
+            range(players), range(leagues)
+        ):
+            league = thecommish.league_key(
+                standins.team_id, league_channel(league_num)
+            )
+            user_id = 'U{:05d}'.format(player)
+            for season in range(seasons):
+                last_week = weeks if season == seasons - 1 else 17
+                for week in range(1, last_week + 1):
+                    if week == weeks and player % 2:
+                        continue
+                    week_num = week - 100 * (seasons - 1 - season)
+                    game = standins.make_schedule(week)[
+                        (player + week) % 16]
+                    item = standins.pick_item(
+                        thecommish, league, user_id, week_num,
+                        userName=user_id.lower(),
+                        selectedTeam=teams[(player + week) % len(teams)],
+                        selectionTime='2017-09-10 12:00:00.000000',
+                        sportRadarGameID=game['id'],
+                        lockTime=int(time.time()) + 3600,
+                    )
+                    if week_num >= weeks - 1:
+                        item['openWeek'] = week_num
+                        if week_num == weeks - 1:
+                            open_picks.append(item)
+                    else:
+                        item['teamWon'] = (player + week) % 2
+                    batch.put_item(Item=item)
+
+    thecommish.rebuild_standings()
+
+    return open_picks
+
+
+class Meters(object):
+    """
+    Counts the calls made to each backend.
+    """
+
+    def __init__(self, thecommish, slack):
+        self.dynamo = standins.CallCounter(thecommish.dynamo.meta.client)
+        self.slack = slack
+        self.sportradar = 0
+
+        fetch_schedule = thecommish.fetch_schedule
+
+        def counted_fetch(week_num):
+            self.sportradar += 1
+            return fetch_schedule(week_num)
+
+        thecommish.fetch_schedule = counted_fetch
+
+    def snapshot(self):
+        return {
+            'dynamodb': sum(self.dynamo.calls.values()),
+            'sportradar': self.sportradar,
+            'slack': len(self.slack.received),
+        }
+
+
+def run_case(meters, setup, call, runs):
+    """
+    Time RUNS calls of CALL, each after an untimed call of SETUP, then make
+    one more call to measure its memory: the peak under tracemalloc or,
+    without it, the growth in objects tracked by the garbage collector, which
+    is kept from collecting during the call. An untimed call first warms the
+    caches a warm container would have. Returns the case's results.
+    """
+    setup(runs + 1)
+    call(runs + 1)
+
+    times = []
+    counts = {}
+    for i in range(runs):
+        setup(i)
+        before = meters.snapshot()
+        start = time.time()
+        call(i)
+        times.append(1000 * (time.time() - start))
+        for backend, count in meters.snapshot().items():
+            counts[backend] = counts.get(backend, 0) + count - before[backend]
+
+    peak_kb = None
+    objects = None
+    setup(runs)
+    if tracemalloc is not None:
+        tracemalloc.start()
+        call(runs)
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+    else:
+        gc.collect()
+        gc.disable()
+        try:
+            before = len(gc.get_objects())
+            call(runs)
+            objects = len(gc.get_objects()) - before
+        finally:
+            gc.enable()
+
+    result = {
+        'p50_ms': percentile(times, 0.5),
+        'p90_ms': percentile(times, 0.9),
+        'p99_ms': percentile(times, 0.99),
+        'max_ms': max(times),
+        'peak_kb': peak_kb,
+        'objects': objects,
+    }
+    for backend in counts:
+        result[backend] = float(counts[backend]) / runs
+    return result
+
+
+def memory(result):
+    """
+    The memory measured for a case's RESULT, as peak KB or objects.
+    """
+    if result['peak_kb'] is not None:
+        return '{:.0f} KB'.format(result['peak_kb'])
+    if result.get('objects') is not None:
+        return '{:} obj'.format(result['objects'])
+    return 'n/a'
+
+
+def cases(thecommish, open_picks, slack, players, weeks):
+    """
+    Return the (name, setup, call) cases to run.
+    """
+    from benchmarks.team_lookup import corpus
+
+    pick_table = thecommish.dynamo.Table(thecommish.picks_table_name)
+    league = thecommish.league_key(standins.team_id, league_channel(0))
+
+    def nothing(i):
+        pass
+
+    def worker(text, fresh_user=False):
+        def call(i):
+            user_id = 'U{:05d}'.format(i % players)
+            if fresh_user:
+                user_id = 'N{:05d}'.format(i)
+            thecommish.worker_handler(
+                worker_event(user_id, text, slack.url), None
+            )
+        return call
+
+    def reopen(i):
+        with pick_table.batch_writer() as batch:
+            for item in open_picks:
+                batch.put_item(Item=item)
+
+    def settle(i):
+        thecommish.results_update_handler({}, None)
+
+    def standings(i):
+        thecommish.get_standings(league)
+
+    def lookups(i):
+        thecommish._team_cache.clear()
+        for entry, expected in corpus:
+            try:
+                thecommish.get_team(entry)
+            except (thecommish.UnknownTeam, thecommish.NoTeamGiven):
+                pass
+
+    return [
+        ('worker pick', nothing, worker('pick patriots', fresh_user=True)),
+        ('worker who', nothing, worker('who')),
+        ('worker standings', nothing, worker('standings')),
+        ('worker record', nothing, worker('record')),
+        ('results update', reopen, settle),
+        ('get_standings', nothing, standings),
+        ('get_team corpus', nothing, lookups),
+    ]
+
+
+def commit_id():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD']
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('utf-8').strip()
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print how RESULTS moved from the BASELINE results. Returns True if any
+    case regressed.
+    """
+    regressed = False
+    print('\nCompared with {:} ({:}):'.format(
+        baseline.get('commit'), json.dumps(baseline['config'])))
+    for name, result in sorted(results.items()):
+        base = baseline['cases'].get(name)
+        if base is None:
+            print('{:<18} new'.format(name))
+            continue
+
+        change = 100.0 * (result['p50_ms'] - base['p50_ms']) / base['p50_ms']
+        more_calls = [
+            backend for backend in ('dynamodb', 'sportradar', 'slack')
+            if result[backend] > base[backend]
+        ]
+        flags = []
+        if change > tolerance:
+            flags.append('slower')
+        if more_calls:
+            flags.append('more {:} calls'.format('/'.join(more_calls)))
+        regressed = regressed or bool(flags)
+
+        print('{:<18} p50 {:>8.2f} -> {:>8.2f} ms ({:+.0f}%) {:}'.format(
+            name, base['p50_ms'], result['p50_ms'], change,
+            'REGRESSION: ' + ', '.join(flags) if flags else ''))
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--players', type=int, default=50)
+    parser.add_argument('--leagues', type=int, default=1)
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--weeks', type=int, default=8)
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--save', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE')
+    parser.add_argument('--tolerance', type=float, default=20.0)
+    args = parser.parse_args()
+
+    config = {
+        'players': args.players, 'leagues': args.leagues,
+        'seasons': args.seasons, 'weeks': args.weeks, 'runs': args.runs,
+    }
+
+    with standins.mock_backends(), standins.SlackStub() as slack:
+        import thecommish
+
+        standins.create_tables(thecommish.dynamo)
+        open_picks = load_leagues(
+            thecommish, args.leagues, args.players, args.seasons, args.weeks
+        )
+
+        thecommish.get_current_week = lambda custom_date=None: args.weeks
+        # Past weeks are final, this week kicks off tomorrow
+        def fetch_schedule(week_num):
+            if week_num < args.weeks:
+                return standins.make_schedule(week_num)
+            return standins.make_schedule(
+                week_num, datetime.utcnow() + timedelta(days=1), closed=False
+            )
+
+        thecommish.fetch_schedule = fetch_schedule
+        meters = Meters(thecommish, slack)
+
+        results = {}
+        print('{:<18} {:>8} {:>8} {:>8} {:>8} {:>9} {:>7} {:>7} {:>7}'.format(
+            'case', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'memory',
+            'dynamo', 'sr', 'slack'))
+        for name, setup, call in cases(
+            thecommish, open_picks, slack, args.players, args.weeks
+        ):
+            result = results[name] = run_case(meters, setup, call, args.runs)
+            print(
+                '{:<18} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} {:>9} '
+                '{:>7.1f} {:>7.1f} {:>7.1f}'.format(
+                    name, result['p50_ms'], result['p90_ms'],
+                    result['p99_ms'], result['max_ms'],
+                    memory(result),
+                    result['dynamodb'], result['sportradar'], result['slack']
+                )
+            )
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'commit': commit_id(),
+                'python': sys.version.split()[0],
+                'config': config,
+                'cases': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['config'] != config:
+            print('\nWarning: baseline was run with {:}'.format(
+                json.dumps(baseline['config'])))
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Per-lookup cost and accuracy of `get_team` over a corpus of the kinds of team
+names players actually type, compared with the original chained-replace
+implementation.
+
+    python -m benchmarks.team_lookup [--repeat N]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from benchmarks import standins
+
+standins.setup_environment()
+
+import thecommish  # noqa: E402
+
+# (user entry, expected team or None if it should not be recognized)
+corpus = [
+    ('pats', 'patriots'), ('Patriots', 'patriots'),
+    ('New England', 'patriots'), ('NE', 'patriots'),
+    ('new england patriots', 'patriots'), ('the pats', 'patriots'),
+    ('Green Bay', 'packers'), ('GB', 'packers'), ('packers', 'packers'),
+    ('Kansas City Chiefs', 'chiefs'), ('KC', 'chiefs'), ('chiefs', 'chiefs'),
+    ('Kansas', 'chiefs'), ('kansas city', 'chiefs'),
+    ('San Francisco', '49ers'), ('SF', '49ers'), ('niners', '49ers'),
+    ('49ers', '49ers'), ('Tampa Bay', 'buccaneers'), ('bucs', 'buccaneers'),
+    ('New Orleans', 'saints'), ('nola', 'saints'), ('N.O.', 'saints'),
+    ('Los Angeles Rams', 'rams'), ('LAR', 'rams'), ('LA Chargers', 'chargers'),
+    ('New York Giants', 'giants'), ('NYJ', 'jets'), ('jets', 'jets'),
+    ('philly', 'eagles'), ('Philadelphia Eagles', 'eagles'),
+    ('indy', 'colts'), ('cinci', 'bengals'), ('jags', 'jaguars'),
+    ('cards', 'cardinals'), ('skins', 'redskins'), ('pitt', 'steelers'),
+    ('Seattle', 'seahawks'), ('seahawks', 'seahawks'), ('Vikings', 'vikings'),
+    ('dallas', 'cowboys'), ('Cowboys', 'cowboys'), ('browns', 'browns'),
+    ('  raiders  ', 'raiders'), ('Denver Broncos', 'broncos'),
+    # Typos
+    ('patriotss', 'patriots'), ('steelrs', 'steelers'),
+    ('seahakws', 'seahawks'), ('vikigns', 'vikings'),
+    ('cowbosy', 'cowboys'), ('bengels', 'bengals'), ('falcon', 'falcons'),
+    ('jaguers', 'jaguars'), ('philadelpia', 'eagles'),
+    ('minnesotta', 'vikings'), ('pittsburg', 'steelers'),
+    # Words that contain a location prefix
+    ('sandiego chargers', 'chargers'), ('newyork jets', 'jets'),
+    ('bayou saints', 'saints'),
+    # Not teams
+    ('cubs', None), ('lakers', None), ('xyz', None), ('banana', None),
+]
+
+
+def legacy_get_team(user_entry):
+    """
+    `get_team` as it was before the alias index, for comparison.
+    """
+    if len(user_entry) == 0:
+        raise thecommish.NoTeamGiven()
+
+    tmp = user_entry.strip().split()
+
+    team_choice = (
+        " ".join(tmp)
+        .lower()
+        .replace('.', '')
+        .replace('new', '')
+        .replace('bay', '')
+        .replace('los', '')
+        .replace('city', '')
+        .replace('san', '')
+    )
+    tokens = team_choice.split()
+
+    team = None
+
+    for token in tokens:
+        if token in thecommish.teams:
+            team = token
+        elif token in thecommish.team_aliases:
+            team = thecommish.team_aliases[token]
+        elif token in thecommish.locs_to_teams:
+            team = thecommish.locs_to_teams[token]
+        elif token in thecommish.loc_aliases:
+            team = thecommish.locs_to_teams[thecommish.loc_aliases[token]]
+        elif token in thecommish.scoreboard_to_team:
+            team = thecommish.scoreboard_to_team[token]
+        if team is not None:
+            break
+
+    if team is None:
+        raise thecommish.UnknownTeam()
+
+    return team
+
+
+def lookup(get_team, entry):
+    try:
+        return get_team(entry)
+    except thecommish.UnknownTeam:
+        return None
+
+
+def accuracy(get_team):
+    misses = [
+        (entry, expected, lookup(get_team, entry))
+        for entry, expected in corpus
+        if lookup(get_team, entry) != expected
+    ]
+    return 1.0 - float(len(misses)) / len(corpus), misses
+
+
+def per_lookup_us(get_team, repeat, clear_cache=False):
+    def run():
+        for entry, _ in corpus:
+            if clear_cache:
+                thecommish._team_cache.clear()
+            lookup(get_team, entry)
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return 1e6 * best / len(corpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print('{:<24} {:>10} {:>14}'.format(
+        'implementation', 'accuracy', 'us/lookup'))
+    for name, get_team, clear_cache in [
+        ('legacy', legacy_get_team, False),
+        ('indexed (cold cache)', thecommish.get_team, True),
+        ('indexed (warm cache)', thecommish.get_team, False),
+    ]:
+        score, misses = accuracy(get_team)
+        print('{:<24} {:>9.1%} {:>14.2f}'.format(
+            name, score, per_lookup_us(get_team, args.repeat, clear_cache)
+        ))
+        for entry, expected, got in misses:
+            print('    {!r}: expected {}, got {}'.format(entry, expected, got))
+
+
+if __name__ == '__main__':
+    main()
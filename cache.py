@@ -0,0 +1,124 @@
+'''
+Read-through item cache
+
+Items a warm container reads again and again (a player's pick, record and
+summary, and who has picked this week) are kept in a bounded LRU cache
+between invocations. Entries expire after a TTL, since writes from other
+containers never reach it; writes made in this container replace or drop
+the entries they change.
+'''
+
+from collections import OrderedDict
+import threading
+import time
+
+import metrics
+
+
+class ItemCache(object):
+    """
+    Thread-safe LRU cache of at most MAX_ITEMS entries, each kept for TTL
+    seconds. A MAX_ITEMS of 0 turns the cache off. `stats` counts the
+    `hits`, `misses` (including `expired` entries, found past their TTL),
+    `evictions` of the least recently used entries to make room, and
+    `invalidations`; each is also added to the metric `NAME_<stat>`.
+    """
+
+    def __init__(self, max_items, ttl, name='item_cache'):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.name = name
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by every write, so loads that raced one aren't cached
+        self.generation = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'invalidations': 0
+        }
+
+    def get(self, key, load, consistent=False):
+        """
+        Return the value cached for KEY, or call LOAD for it and cache what
+        it returns. With CONSISTENT, the cache isn't read (LOAD should read
+        strongly consistently), but the loaded value still replaces what it
+        holds.
+        """
+        if self.max_items <= 0:
+            return load()
+
+        now = time.time()
+        with self.lock:
+            generation = self.generation
+            if not consistent:
+                entry = self.entries.pop(key, None)
+                if entry is not None and now < entry[1]:
+                    # Back to the most recently used end
+                    self.entries[key] = entry
+                    self._count('hits')
+                    return entry[0]
+                if entry is not None:
+                    self._count('expired')
+                self._count('misses')
+
+        value = load()
+
+        with self.lock:
+            if self.generation == generation:
+                self._store(key, value, now)
+
+        return value
+
+    def put(self, key, value):
+        """
+        Cache VALUE, just written, for KEY.
+        """
+        if self.max_items <= 0:
+            return
+
+        with self.lock:
+            self.generation += 1
+            self._store(key, value, time.time())
+
+    def invalidate(self, *keys):
+        """
+        Drop the entries for KEYS.
+        """
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                if self.entries.pop(key, None) is not None:
+                    self._count('invalidations')
+
+    def clear(self):
+        """
+        Drop every entry.
+        """
+        with self.lock:
+            self.generation += 1
+            self.stats['invalidations'] += len(self.entries)
+            self.entries.clear()
+
+    def hit_rate(self):
+        """
+        Return the fraction of lookups answered from the cache, or None if
+        there haven't been any.
+        """
+        lookups = self.stats['hits'] + self.stats['misses']
+        if not lookups:
+            return None
+        return self.stats['hits'] / float(lookups)
+
+    def _store(self, key, value, now):
+        self.entries.pop(key, None)
+        self.entries[key] = (value, now + self.ttl)
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
+            self._count('evictions')
+
+    def _count(self, stat):
+        self.stats[stat] += 1
+        metrics.add('{:}_{:}'.format(self.name, stat), 1)
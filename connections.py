@@ -0,0 +1,137 @@
+'''
+Connections shared between warm invocations
+
+Nothing heavy is imported until a connection is first asked for, so the
+receptionist can use this module without paying for boto3 or requests at
+import time.
+'''
+
+import metrics
+
+# Connection settings. Connections are kept open between warm invocations.
+http_pool_size = 25  # Enough for every settlement thread to poll a game
+http_timeout = (3.05, 10)  # Connect and read timeouts, in seconds
+http_retries = 3
+http_backoff = 0.3
+aws_pool_size = 25  # Enough for every settlement thread to hold a connection
+
+_http_session = None
+_sns_client = None
+_sqs_client = None
+_dynamo = None
+_tables = {}
+
+
+def new_http_session(retry_statuses=True):
+    """
+    Return a new keep-alive `requests.Session`. Idempotent requests are
+    retried with exponential backoff on connection errors and, if
+    RETRY_STATUSES is set, on 429s and 5xx responses; POSTs are only retried
+    if the connection could not be made, so Slack never sees a reply twice.
+    Pass `http_timeout` with every request, sessions have no default timeout.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    try:
+        from urllib3.util.retry import Retry
+    except ImportError:
+        from requests.packages.urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=http_retries,
+        backoff_factor=http_backoff,
+        status_forcelist=(
+            (429, 500, 502, 503, 504) if retry_statuses else ()
+        )
+    )
+    adapter = HTTPAdapter(
+        pool_connections=http_pool_size,
+        pool_maxsize=http_pool_size,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    metrics.instrument_session(session)
+
+    return session
+
+
+def get_http_session():
+    """
+    Return the shared session (see `new_http_session`) used for calls to
+    Slack. SportRadar calls go through the client in `sportradar`.
+    """
+    global _http_session
+
+    if _http_session is None:
+        _http_session = new_http_session()
+
+    return _http_session
+
+
+def get_sns_client():
+    """
+    Return the shared SNS client.
+    """
+    global _sns_client
+
+    if _sns_client is None:
+        import boto3
+
+        _sns_client = boto3.client('sns')
+        metrics.instrument_client(_sns_client)
+
+    return _sns_client
+
+
+def get_sqs_client():
+    """
+    Return the shared SQS client.
+    """
+    global _sqs_client
+
+    if _sqs_client is None:
+        import boto3
+
+        _sqs_client = boto3.client('sqs')
+        metrics.instrument_client(_sqs_client)
+
+    return _sqs_client
+
+
+def get_dynamo():
+    """
+    Return the shared DynamoDB resource.
+    """
+    global _dynamo
+
+    if _dynamo is None:
+        import boto3
+        from botocore.config import Config
+
+        _dynamo = boto3.resource(
+            'dynamodb',
+            config=Config(
+                max_pool_connections=aws_pool_size,
+                connect_timeout=3,
+                read_timeout=10,
+                retries={'max_attempts': http_retries}
+            )
+        )
+        metrics.instrument_client(_dynamo.meta.client)
+
+    return _dynamo
+
+
+def get_table(table_name):
+    """
+    Return the shared handle for the DynamoDB table TABLE_NAME.
+    """
+    table = _tables.get(table_name)
+    if table is None:
+        table = get_dynamo().Table(table_name)
+        _tables[table_name] = table
+
+    return table
@@ -0,0 +1,225 @@
+'''
+Per-invocation timing and capacity metrics
+
+Each decorated handler invocation collects the wall time of its stages, the
+calls made to AWS and over HTTP, and the DynamoDB capacity those calls
+consumed, then writes them as one log line in CloudWatch's embedded metric
+format, tagged with the handler and subcommand. Set `pickemMetrics` to turn
+it on; when it is off, the decorators return their functions untouched and
+nothing is hooked.
+'''
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+enabled = os.environ.get('pickemMetrics', '').lower() in ('1', 'true', 'on')
+namespace = os.environ.get('metricsNamespace', 'Pickem')
+
+# DynamoDB operations that can report the capacity they consumed, and whether
+# that capacity is for reads
+capacity_operations = {
+    'GetItem': True,
+    'BatchGetItem': True,
+    'Query': True,
+    'Scan': True,
+    'TransactGetItems': True,
+    'PutItem': False,
+    'UpdateItem': False,
+    'DeleteItem': False,
+    'BatchWriteItem': False,
+    'TransactWriteItems': False,
+}
+
+_lock = threading.Lock()
+_current = None
+
+
+class Invocation(object):
+    """
+    The metrics collected during one invocation of the handler HANDLER.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.start = time.time()
+        self.tags = {}
+        self.values = {}
+
+
+def add(name, value):
+    """
+    Add VALUE to the metric NAME of the current invocation, if there is one.
+    Metric names ending in `_ms` are times in milliseconds, the rest counts.
+    """
+    invocation = _current
+    if invocation is None:
+        return
+
+    with _lock:
+        invocation.values[name] = invocation.values.get(name, 0) + value
+
+
+def tag(name, value):
+    """
+    Tag the current invocation's metrics with the dimension NAME = VALUE.
+    """
+    invocation = _current
+    if invocation is not None:
+        invocation.tags[name] = value
+
+
+class stage(object):
+    """
+    Context manager that adds the wall time spent in it to the metric
+    `NAME_ms`.
+    """
+
+    def __init__(self, name):
+        self.name = name + '_ms'
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        add(self.name, 1000 * (time.time() - self.start))
+
+
+def timed(name):
+    """
+    Decorator that records the wall time of each call as the stage NAME.
+    """
+    def decorate(function):
+        if not enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def handler(name):
+    """
+    Decorator for the Lambda handler NAME that collects the metrics of each
+    invocation and writes them to the log when it returns.
+    """
+    def decorate(function):
+        if not enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(event, context):
+            global _current
+
+            if _current is not None:
+                # Called from another handler, which reports for both
+                return function(event, context)
+
+            _current = Invocation(name)
+            try:
+                return function(event, context)
+            finally:
+                invocation, _current = _current, None
+                invocation.values['duration_ms'] = (
+                    1000 * (time.time() - invocation.start)
+                )
+                emit(invocation)
+
+        return wrapper
+
+    return decorate
+
+
+def emit(invocation):
+    """
+    Write the metrics of INVOCATION to stdout as an embedded metric format
+    record. It must be a line of its own, so the logging module (which adds
+    a prefix in Lambda) isn't used.
+    """
+    dimensions = dict(invocation.tags, handler=invocation.handler)
+    names = sorted(invocation.values)
+
+    record = {
+        '_aws': {
+            'Timestamp': int(1000 * invocation.start),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [sorted(dimensions)],
+                'Metrics': [
+                    {
+                        'Name': name,
+                        'Unit': (
+                            'Milliseconds' if name.endswith('_ms')
+                            else 'Count'
+                        )
+                    }
+                    for name in names
+                ]
+            }]
+        }
+    }
+    record.update(dimensions)
+    record.update(invocation.values)
+
+    sys.stdout.write(json.dumps(record, sort_keys=True) + '\n')
+    sys.stdout.flush()
+
+
+def instrument_client(client):
+    """
+    Count the calls made by the boto3 CLIENT as `<service>_calls`. DynamoDB
+    calls also ask for the capacity they consume, which is added up as
+    `dynamodb_rcu` and `dynamodb_wcu`.
+    """
+    if not enabled:
+        return
+
+    service = client.meta.service_model.service_name
+
+    def before_call(params, model, **kwargs):
+        if model.name in capacity_operations:
+            params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+    def after_call(parsed, model, **kwargs):
+        add(service + '_calls', 1)
+
+        consumed = parsed.get('ConsumedCapacity')
+        if consumed is None:
+            return
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        units = sum(c.get('CapacityUnits', 0) for c in consumed)
+        if capacity_operations.get(model.name):
+            add('dynamodb_rcu', units)
+        else:
+            add('dynamodb_wcu', units)
+
+    if service == 'dynamodb':
+        client.meta.events.register(
+            'provide-client-params.dynamodb', before_call
+        )
+    client.meta.events.register('after-call.' + service, after_call)
+
+
+def instrument_session(session):
+    """
+    Count the responses received by the requests SESSION as `http_calls`,
+    and the time spent waiting for them as `http_ms`.
+    """
+    if not enabled:
+        return
+
+    def count_response(response, *args, **kwargs):
+        add('http_calls', 1)
+        add('http_ms', 1000 * response.elapsed.total_seconds())
+
+    session.hooks['response'].append(count_response)
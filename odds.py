@@ -0,0 +1,300 @@
+'''
+Monte Carlo odds of finishing the season first
+
+The rest of the season is played out many times at once with NumPy. Each
+game's winner is drawn from the two teams' smoothed records to date, with
+an edge for the home side. Each player's picks for the rest of the season
+are drawn at random from their unused teams, with favourites the most
+likely, so players who have used the same teams don't always pick alike.
+The picks are drawn afresh for every `plan_seasons` simulated seasons, which
+lets a week's picks be looked up for all those seasons at once. A player's
+chance of finishing first is the share of simulated seasons in which they
+end with the most wins, ties shared.
+
+NumPy is only imported when odds are asked for, so nothing else pays for it.
+'''
+
+import os
+
+simulations = int(os.environ.get('oddsSimulations', '100000'))
+# Each draw of the players' picks is played out in this many seasons
+plan_seasons = 200
+# The players' picks are drawn for about this many players and seasons at
+# once, which bounds the memory used
+plan_batch = 100000
+# A team's record counts this many games at .500 on top of its real games,
+# so early season records don't decide everything
+prior_games = 4
+# The share of games the home side wins between otherwise equal teams
+home_advantage = 0.57
+# Players pick a team in proportion to its odds of winning to this power,
+# so a 70% favourite is picked about 13 times as often as a 55% one
+pick_sharpness = 4
+# Times a pick of a team already drawn is redrawn before the pick is drawn
+# from the player's remaining teams
+pick_redraws = 4
+# The number of parts each player's pick probabilities are split into to
+# find draws in them quickly
+pick_buckets = 64
+
+
+def team_strengths(results, teams):
+    """
+    Return the smoothed share of games won by each of the TEAMS teams (by
+    position) in the finished games RESULTS, each a (home, away, result)
+    tuple with a result of 1 if the home side won, 0 if the away side won
+    and 0.5 for a tie.
+    """
+    import numpy as np
+
+    won = np.zeros(teams)
+    played = np.zeros(teams)
+    for home, away, result in results:
+        won[home] += result
+        won[away] += 1 - result
+        played[home] += 1
+        played[away] += 1
+
+    return (won + prior_games / 2.0) / (played + prior_games)
+
+
+def home_probability(strengths, home, away):
+    """
+    Return the chance that the home side wins, for arrays of HOME and AWAY
+    team positions, from their STRENGTHS. The two strengths are compared as
+    odds (log5) and the home side's odds scaled by `home_advantage`.
+    """
+    home_odds = strengths[home] / (1 - strengths[home])
+    away_odds = strengths[away] / (1 - strengths[away])
+    odds = home_odds / away_odds * home_advantage / (1 - home_advantage)
+
+    return odds / (1 + odds)
+
+
+def pick_weights(available, chances):
+    """
+    Return how likely each player is to pick each team in a week, as
+    unnormalized weights by player and team, for players with the AVAILABLE
+    teams (a boolean array by player and team) and the week's CHANCES of
+    each team winning (-1 for teams that can't be picked).
+    """
+    import numpy as np
+
+    clipped = np.clip(chances, 1e-6, 1 - 1e-6)
+    odds = clipped / (1 - clipped)
+    return np.where(
+        available & (chances >= 0)[None, :], odds ** pick_sharpness, 0.0
+    )
+
+
+def pick_table(weights):
+    """
+    Return the table `draw_picks` draws a week's picks from with the week's
+    WEIGHTS (see `pick_weights`): each player's cumulative pick
+    probabilities, and a guide table of where each `pick_buckets`th of the
+    probabilities starts in them, so a draw is found in a step or two rather
+    than by a binary search.
+    """
+    import numpy as np
+
+    players, teams = weights.shape
+    totals = weights.sum(axis=1)
+    cumulative = weights.cumsum(axis=1) / np.where(totals > 0, totals, 1)[
+        :, None
+    ]
+    # Every draw falls in the player's row
+    cumulative[:, -1] = 2
+
+    starts = np.arange(pick_buckets) / float(pick_buckets)
+    guide = np.array([
+        np.searchsorted(row, starts, side='right') for row in cumulative
+    ]) + (np.arange(players) * teams)[:, None]
+
+    return cumulative.ravel(), guide.ravel()
+
+
+def draw_picks(random, table, rows, teams):
+    """
+    Draw a pick from TABLE (see `pick_table`) for each player in ROWS, an
+    array of player places, as team positions.
+    """
+    import numpy as np
+
+    cumulative, guide = table
+    draws = random.random_sample(rows.shape)
+    found = guide[
+        rows * pick_buckets + (draws * pick_buckets).astype(np.intp)
+    ]
+    behind = np.flatnonzero(cumulative[found] <= draws)
+    while len(behind):
+        found[behind] += 1
+        behind = behind[cumulative[found[behind]] <= draws[behind]]
+
+    return found - rows * teams
+
+
+def draw_plans(random, weeks, first, fixed, teams, count):
+    """
+    Draw COUNT sets of the players' picks for the remaining WEEKS (each with
+    its `weights` and their `pick_table`), as an array of team positions by
+    set, week and player, where TEAMS (the number of teams) stands for no
+    pick. A pick is
+    drawn from the week's weights less the teams already drawn in the set:
+    from the table, redrawing teams already drawn up to `pick_redraws`
+    times, and then for the few picks left from the remaining weights.
+    Players flagged in FIXED have their FIRST pick in the first week
+    instead.
+    """
+    import numpy as np
+
+    players = len(first)
+    everyone = np.tile(np.arange(players), count)
+    plans = np.empty((count, len(weeks), players), dtype=np.intp)
+    drawn = np.zeros((count, players), dtype=np.int64)
+    for w, week in enumerate(weeks):
+        picks = draw_picks(random, week['table'], everyone, teams).reshape(
+            count, players
+        )
+
+        sets, rows = np.nonzero((drawn >> picks) & 1)
+        for attempt in range(pick_redraws):
+            if len(rows) == 0:
+                break
+            redrawn = draw_picks(random, week['table'], rows, teams)
+            picks[sets, rows] = redrawn
+            again = (drawn[sets, rows] >> redrawn) & 1 == 1
+            sets, rows = sets[again], rows[again]
+
+        if len(rows):
+            unused = (
+                (drawn[sets, rows][:, None] >> np.arange(teams)) & 1
+            ) == 0
+            cumulative = np.where(
+                unused, week['weights'][rows], 0.0
+            ).cumsum(axis=1)
+            draws = random.random_sample(len(rows)) * cumulative[:, -1]
+            picks[sets, rows] = np.where(
+                cumulative[:, -1] > 0,
+                (cumulative <= draws[:, None]).sum(axis=1), teams
+            )
+
+        picks[:, ~week['weights'].any(axis=1)] = teams
+        if w == 0:
+            picks[:, fixed] = first[fixed]
+        plans[:, w] = picks
+        drawn |= np.where(
+            picks < teams, 1 << np.minimum(picks, teams - 1), 0
+        )
+
+    return plans
+
+
+def season_odds(wins, used, first_picks, past, remaining, teams,
+                count=None, seed=None):
+    """
+    Return each player's chance of finishing the season first, as an array,
+    and the number of seasons simulated.
+
+        WINS: The players' wins so far,
+        USED: Their used teams, as bitmasks of team positions,
+        FIRST_PICKS: Their picks for the first remaining week: a team
+            already picked, `teams` if the pick was settled (and counted in
+            WINS), or -1 if they haven't picked yet,
+        PAST: The finished games of earlier weeks, as (home, away, result)
+            tuples (see `team_strengths`),
+        REMAINING: The games of each remaining week, each a list of (home,
+            away, result, pickable) tuples, with a result of None for games
+            not yet played, and pickable set for games not yet kicked off,
+        TEAMS: The number of teams.
+
+    COUNT seasons are simulated (`simulations` by default); the random
+    generator is seeded from SEED if given. Players who can't catch the
+    leader even by winning every remaining week aren't simulated.
+    """
+    import numpy as np
+
+    wins = np.asarray(wins, dtype=np.int64)
+    odds = np.zeros(len(wins))
+    if len(wins) == 0:
+        return odds, 0
+
+    strengths = team_strengths(
+        list(past) + [
+            (home, away, result)
+            for games in remaining
+            for home, away, result, pickable in games
+            if result is not None
+        ],
+        teams
+    )
+
+    contenders = np.flatnonzero(wins + len(remaining) >= wins.max())
+    first = np.asarray(first_picks, dtype=np.int64)[contenders]
+    fixed = first >= 0
+    available = (
+        (np.asarray(used, dtype=np.int64)[contenders][:, None] >>
+         np.arange(teams)[None, :]) & 1
+    ) == 0
+    # This week's picks may not be among the used teams yet
+    chosen = np.flatnonzero(fixed & (first < teams))
+    available[chosen, first[chosen]] = False
+
+    weeks = []
+    for games in remaining:
+        home = np.array([g[0] for g in games], dtype=np.intp)
+        away = np.array([g[1] for g in games], dtype=np.intp)
+        played = np.array([g[2] is not None for g in games], dtype=bool)
+        pickable = np.array([g[3] for g in games], dtype=bool)
+        result = np.array(
+            [0.0 if g[2] is None else g[2] for g in games]
+        )
+
+        home_wins = np.where(
+            played, result == 1, home_probability(strengths, home, away)
+        )
+        chances = np.full(teams, -1.0)
+        chances[home[pickable]] = home_wins[pickable]
+        chances[away[pickable]] = 1 - home_wins[pickable]
+        weeks.append({
+            'home': home,
+            'away': away,
+            'home_wins': home_wins.astype(float),
+            # Ties are losses for both sides
+            'decided': ~played | (result != 0.5),
+            'weights': pick_weights(available, chances)
+        })
+        weeks[-1]['table'] = pick_table(weeks[-1]['weights'])
+
+    if count is None:
+        count = simulations
+    players = len(contenders)
+    random = np.random.RandomState(seed)
+    firsts = np.zeros(players)
+    batch = plan_seasons * max(1, plan_batch // players)
+    for start in range(0, count, plan_seasons):
+        if not start % batch:
+            blocks = min(batch, count - start) + plan_seasons - 1
+            plans = iter(draw_plans(
+                random, weeks, first, fixed, teams, blocks // plan_seasons
+            ))
+        plan = next(plans)
+        n = min(plan_seasons, count - start)
+        # Seasons run along the rows, so each pick's wins are copied as a
+        # contiguous block. Win counts fit in a byte.
+        totals = np.repeat(
+            wins[contenders].astype(np.uint8)[:, None], n, axis=1
+        )
+        for w, week in enumerate(weeks):
+            won = np.zeros((teams + 1, n), dtype=np.uint8)
+            home_won = random.random_sample((len(week['home']), n)) < (
+                week['home_wins'][:, None]
+            )
+            won[week['home']] = home_won
+            won[week['away']] = ~home_won & week['decided'][:, None]
+            np.add(totals, won.take(plan[w], axis=0), out=totals)
+
+        leaders = totals == totals.max(axis=0)
+        firsts += (leaders / leaders.sum(axis=0).astype(float)).sum(axis=1)
+
+    odds[contenders] = firsts / count
+    return odds, count
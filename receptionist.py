@@ -0,0 +1,322 @@
+'''
+Pick em slack command receptionist
+
+This is the entry point Slack talks to directly, and it has to answer within
+three seconds, so it only loads what it needs to check the token, parse the
+subcommand and hand the request to the worker over SNS (or SQS). Keep heavy
+imports (boto3, requests, the team tables) out of this module.
+'''
+
+import base64
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+
+from urlparse import parse_qs
+
+from connections import (
+    get_http_session, get_sns_client, get_sqs_client, http_timeout
+)
+import metrics
+
+"""
+Resources
+"""
+
+help_text = "Use this command to manage your pick'em selections."
+help_attachment_text = (
+    "Use `/pickem [subcommand]` with one of the following:\n"
+    "Either `pick` to check your pick for the week, `pick [team]` " +
+    "to make a new pick, `record` to check your record, " +
+    "`who` to see who has picked this week, `standings` to check " +
+    "standings, or `odds` to see everyone's chances of finishing first, " +
+    "e.g. `/pickem pick pats`."
+)
+
+# The subcommands the bot knows. Anything else is tagged `invalid` in metrics,
+# so what users type can't add metric series.
+subcommands = set(['help', 'pick', 'record', 'standings', 'who', 'odds'])
+
+slack_token = os.environ['slackAppToken']
+sns_arn = os.environ['snsARN']
+# With `workerQueueURL` set, requests go to the worker over that SQS queue
+# instead, so a burst reaches it in batches
+worker_queue_url = os.environ.get('workerQueueURL')
+
+# Version of the messages handed to the worker. Version 1 is the whole
+# request, double encoded for SNS; version 2 (see `encode_message`) is what
+# the worker needs and the time the request arrived. Keep publishing version
+# 1 until every worker reads version 2.
+message_version = int(os.environ.get('workerMessageVersion', '2'))
+# Version 2 fields, and their keys in the message
+message_fields = {
+    'team_id': 'm',
+    'channel_id': 'c',
+    'user_id': 'u',
+    'user_name': 'n',
+    'text': 't',
+    'response_url': 'r',
+}
+# Messages longer than this many bytes are compressed
+message_compress_size = 512
+
+# Read-only subcommands are answered inline if that takes less than this many
+# seconds after the request arrives; otherwise they go to the worker. Slack
+# gives up after three seconds.
+inline_budget = float(os.environ.get('inlineBudgetSeconds', '1.5'))
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Imports the worker module in the background after a cold start
+_worker_loader = None
+
+"""
+Helper functions
+"""
+
+def parse_subcommand(command_text):
+    """
+    Parse the subcommand from the given COMMAND_TEXT, which is everything that
+    follows `/pickem`.  The subcommand is the option passed to the command, e.g.
+    'pick' in the case of `/pickem pick`.
+    """
+    return command_text.strip().split()[0].lower()
+
+
+def subcommand_tag(subcommand):
+    """
+    Return the metrics tag for SUBCOMMAND: itself if it is one of
+    `subcommands`, otherwise 'invalid'.
+    """
+    return subcommand if subcommand in subcommands else 'invalid'
+
+
+def parse_options(command_text):
+    """
+    Parse options passed into the command, e.g. returns 'cards' from the
+    command `/pickem pick cards`, where `pickem` is the command, `pick` is the
+    subcommand, and cards is the option passed to the subcommand.
+    """
+    sc = parse_subcommand(command_text)
+    return command_text.replace(sc, '').strip()
+
+
+def encode_message(params, received):
+    """
+    Return the version 2 message handing the request PARAMS (as parsed by
+    `parse_qs`), which arrived at RECEIVED (seconds since the epoch), to the
+    worker. It is a compact JSON object with the version under `v`, the time
+    under `at` and the `message_fields`. Messages longer than
+    `message_compress_size` are zlib compressed, base64 encoded (SNS only
+    carries text) and prefixed with `z`.
+    """
+    message = {'v': 2, 'at': round(received, 3)}
+    for field, key in message_fields.items():
+        message[key] = params[field][0]
+
+    encoded = json.dumps(message, separators=(',', ':'))
+    if len(encoded) > message_compress_size:
+        encoded = 'z' + base64.b64encode(
+            zlib.compress(encoded.encode('utf-8'))
+        ).decode('ascii')
+
+    return encoded
+
+
+def decode_message(message):
+    """
+    Return the request carried by the worker MESSAGE, of either version, as a
+    dictionary of single values by request field. Version 2 requests have
+    the time they arrived under `received`; version 1 requests have every
+    field Slack sent, including the `token`.
+    """
+    if message.startswith('z'):
+        message = zlib.decompress(base64.b64decode(message[1:]))
+        message = message.decode('utf-8')
+    decoded = json.loads(message)
+
+    if decoded.get('v') == 2:
+        request = dict(
+            (field, decoded[key]) for field, key in message_fields.items()
+        )
+        request['received'] = decoded['at']
+        return request
+
+    return dict((field, values[0]) for field, values in decoded.items())
+
+
+@metrics.timed('respond')
+def respond(response_text, attachment_text=None,
+            in_channel=False, response_url=None, is_error=False):
+
+    body = {
+        'response_type': 'in_channel' if in_channel else 'ephemeral',
+        'text': response_text
+    }
+
+    if attachment_text:
+        body['attachments'] = [{'text': attachment_text, 'mrkdwn_in': ['text']}]
+
+    if response_url is not None:
+        get_http_session().post(
+            response_url, json=body,
+            headers={'Content-Type': 'application/json'},
+            timeout=http_timeout
+        )
+    else:
+        to_return = {
+            'statusCode': '400' if is_error else '200',
+            'body': response_text if is_error else json.dumps(body)
+        }
+
+        if not is_error:
+            to_return['headers'] = {
+                'Content-Type': 'application/json',
+            }
+
+        return to_return
+
+
+def worker_module_loaded(deadline):
+    """
+    Return True if the worker module is loaded, so requests can be answered
+    inline. If it is still being loaded in the background (see
+    `load_worker_module`), the load is given until DEADLINE (seconds since
+    the epoch) to finish: on Python 2 it holds the import lock, which the
+    handoff to the worker would wait on anyway. A failed import leaves no
+    module behind and isn't retried, so every request then goes to the
+    worker.
+    """
+    if _worker_loader is not None:
+        _worker_loader.join(max(0.0, deadline - time.time()))
+        if _worker_loader.is_alive():
+            return False
+
+    return 'thecommish' in sys.modules
+
+
+def load_worker_module():
+    """
+    Start importing the worker module in the background, once, so later
+    requests in this container can be answered inline. Only called after a
+    request has been handed off: on Python 2 importing it holds the import
+    lock, and nothing on the way to the worker can wait on that.
+    """
+    global _worker_loader
+
+    if _worker_loader is not None:
+        return
+
+    def target():
+        try:
+            import thecommish  # noqa: F401
+        except Exception:
+            logger.exception("Loading the worker module failed")
+
+    _worker_loader = threading.Thread(target=target)
+    _worker_loader.daemon = True
+    _worker_loader.start()
+
+
+def answer_inline(subcommand, command_text, params, deadline):
+    """
+    Try to build the reply to a read-only SUBCOMMAND for the user and league
+    of the request PARAMS before DEADLINE (seconds since the epoch). Returns
+    the `respond` arguments, or None if the subcommand can't be answered
+    inline or the deadline passed. Only call this once
+    `worker_module_loaded`.
+    """
+    result = {}
+
+    def target():
+        try:
+            import thecommish
+
+            league = thecommish.league_key(
+                params['team_id'][0], params['channel_id'][0]
+            )
+            result['message'] = thecommish.inline_message(
+                subcommand, parse_options(command_text), league,
+                params['user_id'][0]
+            )
+        except Exception:
+            logger.exception("Inline answer for %s failed", subcommand)
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    thread.join(max(0.0, deadline - time.time()))
+
+    if thread.is_alive():
+        return None
+    return result.get('message')
+
+
+@metrics.handler('receptionist')
+def receptionist_handler(event, context):
+
+    received = time.time()
+
+    params = parse_qs(event['body'])
+    token = params['token'][0]
+    if token != slack_token:
+        logger.error("Request token (%s) does not match expected", token)
+        return respond('Invalid request token', is_error=True)
+
+    command_text = params['text'][0]
+
+    subcommand = parse_subcommand(command_text)
+    metrics.tag('subcommand', subcommand_tag(subcommand))
+
+    if subcommand == 'help':
+        """Return a help message."""
+        return respond(help_text, help_attachment_text)
+
+    elif (subcommand == 'standings' or subcommand == 'record' or
+          subcommand == 'pick' or subcommand == 'who' or
+          subcommand == 'odds'):
+
+        # Odds run a simulation, which is always the worker's job. Other
+        # subcommands are answered inline once the worker module is loaded;
+        # on a cold start they go straight to the worker.
+        message = None
+        loaded = worker_module_loaded(received + inline_budget)
+        if loaded and subcommand != 'odds':
+            with metrics.stage('inline'):
+                message = answer_inline(
+                    subcommand, command_text, params,
+                    received + inline_budget
+                )
+        if message is not None:
+            logger.info("Answered %s inline in %.3fs", subcommand,
+                        time.time() - received)
+            return respond(**message)
+
+        logger.info("Handing %s to the worker after %.3fs", subcommand,
+                    time.time() - received)
+        if message_version >= 2:
+            message = encode_message(params, received)
+        else:
+            message = json.dumps(params)
+
+        if worker_queue_url is not None:
+            get_sqs_client().send_message(
+                QueueUrl=worker_queue_url, MessageBody=message
+            )
+        else:
+            get_sns_client().publish(TopicArn=sns_arn, Message=message)
+
+        if not loaded:
+            load_worker_module()
+
+        return respond("One sec...")
+
+    else:
+        return respond(
+            ":persevere: Invalid command! " + help_text, help_attachment_text
+        )
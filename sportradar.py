@@ -0,0 +1,302 @@
+'''
+SportRadar API client
+
+Every SportRadar call in a container goes through one client, which
+- spaces requests out with a token bucket, so a busy minute of picks stays
+  under the API key's requests-per-second limit,
+- has concurrent callers for the same document share one request,
+- retries 429s and 5xx responses with exponential backoff, honouring
+  Retry-After, and
+- stops calling for a while after repeated failures (a circuit breaker),
+  answering from the last good copy of each document in the meantime.
+
+The API is found at `sportRadarURL`, so the client can be pointed at a local
+stand-in.
+'''
+
+import logging
+import os
+import threading
+import time
+
+import metrics
+from connections import http_timeout, new_http_session
+
+base_url = os.environ.get('sportRadarURL', 'https://api.sportradar.us/')
+api_key = os.environ['sportRadarToken']
+
+# Requests per second, and how many can go at once after a quiet spell
+rate_limit = float(os.environ.get('sportRadarRate', '1'))
+rate_burst = 2
+# Attempts per request. The wait between them doubles from `backoff` seconds,
+# up to `max_backoff`, which also caps the wait a Retry-After can ask for.
+max_attempts = 4
+backoff = 0.5
+max_backoff = 8.0
+# Failed requests in a row that open the circuit, and seconds it stays open
+breaker_threshold = 5
+breaker_cooldown = 30.0
+
+logger = logging.getLogger()
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class Unavailable(Exception):
+    """
+    SportRadar couldn't be reached for the document at PATH (because of
+    REASON), and there is no last good copy of it to answer with.
+    """
+
+    def __init__(self, path, reason):
+        Exception.__init__(
+            self, "SportRadar unavailable for {:} ({:})".format(path, reason)
+        )
+        self.path = path
+        self.reason = reason
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket that lets RATE requests a second through on
+    average, and up to BURST at once.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting for one if the bucket is empty. Returns the
+        seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(
+                    self.burst,
+                    self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker(object):
+    """
+    Opens after THRESHOLD failures in a row and stays open for COOLDOWN
+    seconds. After that a single trial request is let through, which closes
+    the circuit if it succeeds and opens it again if it fails.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened is not None
+
+    def allow(self):
+        """
+        Return whether a request may be made now.
+        """
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.trial or time.time() - self.opened < self.cooldown:
+                return False
+            self.trial = True
+            return True
+
+    def succeeded(self):
+        with self.lock:
+            if self.opened is not None:
+                logger.info("SportRadar circuit closed")
+            self.failures = 0
+            self.opened = None
+            self.trial = False
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or (
+                self.opened is None and self.failures >= self.threshold
+            ):
+                logger.warning(
+                    "SportRadar circuit open for %s seconds after %s "
+                    "failures", self.cooldown, self.failures
+                )
+                metrics.add('sportradar_circuit_opened', 1)
+                self.opened = time.time()
+            self.trial = False
+
+
+class Client(object):
+    """
+    Client for the SportRadar API at BASE_URL, using the key API_KEY. See the
+    module docstring for what it does on top of plain requests.
+    """
+
+    def __init__(self, base_url, api_key, rate=None, burst=None):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.bucket = TokenBucket(
+            rate_limit if rate is None else rate,
+            rate_burst if burst is None else burst
+        )
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        # Retries are done here, where they take tokens from the bucket
+        self.session = new_http_session(retry_statuses=False)
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.last_good = {}
+
+    def get(self, path, etag=None):
+        """
+        GET the JSON document at PATH (relative to the base URL),
+        conditional on its ETAG if given. Returns the document and its ETag,
+        or (None, ETAG) if it hasn't changed.
+
+        Concurrent calls for the same PATH and ETAG share one request. If
+        SportRadar can't answer, the last good copy of the document is
+        returned instead, or Unavailable is raised if there isn't one.
+        Other client errors (a 404 for an unknown game, say) are raised as
+        `requests.HTTPError`.
+        """
+        key = (path, etag)
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event()}
+                self.in_flight[key] = call
+
+        if not leader:
+            metrics.add('sportradar_coalesced', 1)
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = self._get(path, etag)
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call['done'].set()
+
+        return call['result']
+
+    def _get(self, path, etag):
+        """
+        Make the request for `get`, with retries and the circuit breaker.
+        """
+        url = self.base_url + path
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+
+        reason = None
+        for attempt in range(max_attempts):
+            if not self.breaker.allow():
+                reason = 'circuit open'
+                break
+
+            self.bucket.acquire()
+            retry_after = None
+            try:
+                response = self.session.get(
+                    url, params={'api_key': self.api_key}, headers=headers,
+                    timeout=http_timeout
+                )
+            except Exception as e:
+                reason = e
+            else:
+                status = response.status_code
+                if status == 304:
+                    self.breaker.succeeded()
+                    return None, etag
+                if status < 400:
+                    result = (response.json(), response.headers.get('ETag'))
+                    self.breaker.succeeded()
+                    self.last_good[path] = result
+                    return result
+                if status != 429 and status < 500:
+                    # SportRadar is up, the request is wrong
+                    self.breaker.succeeded()
+                    response.raise_for_status()
+                reason = status
+                retry_after = response.headers.get('Retry-After')
+
+            self.breaker.failed()
+            if attempt + 1 < max_attempts:
+                metrics.add('sportradar_retries', 1)
+                time.sleep(retry_delay(attempt, retry_after))
+
+        last_good = self.last_good.get(path)
+        if last_good is None:
+            raise Unavailable(path, reason)
+
+        logger.warning(
+            "SportRadar unavailable for %s (%s), answering with the last "
+            "good copy", path, reason
+        )
+        metrics.add('sportradar_fallbacks', 1)
+        return last_good
+
+
+"""
+Helper functions
+"""
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Return the seconds to wait after the failed ATTEMPT (counting from 0),
+    the RETRY_AFTER header of the response if it had a usable one.
+    """
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = backoff * 2 ** attempt
+
+    return min(max(delay, 0), max_backoff)
+
+
+def get_client():
+    """
+    Return the client shared by this container.
+    """
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = Client(base_url, api_key)
+
+    return _client
+
+
+def get(path, etag=None):
+    """
+    GET the document at PATH with the shared client. See `Client.get`.
+    """
+    return get_client().get(path, etag)
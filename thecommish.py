@@ -2,30 +2,45 @@
 Pick em slack commands
 '''
 
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import Binary
+import calendar
+from collections import namedtuple, OrderedDict
+import hashlib
 import json
 import logging
 import os
-import requests
+import threading
+import time
 from datetime import datetime
 import math
+from multiprocessing.pool import ThreadPool
+import zlib
 
+try:
+    from queue import Full, Queue
+except ImportError:
+    from Queue import Full, Queue
 from urlparse import parse_qs
 
+from cache import ItemCache
+import metrics
+import odds
+import sportradar
+from connections import (
+    aws_pool_size, get_dynamo, get_http_session, get_table, http_timeout
+)
+from receptionist import (
+    decode_message, help_attachment_text, help_text, parse_options,
+    parse_subcommand, respond, slack_token, subcommand_tag
+)
+# Deployments that still point at thecommish.receptionist_handler keep working
+from receptionist import receptionist_handler  # noqa: F401
+
 """
 Resources
 """
 
-help_text = "Use this command to manage your pick'em selections."
-help_attachment_text = (
-    "Use `/pickem [subcommand]` with one of the following:\n"
-    "Either `pick` to check your pick for the week, `pick [team]` " +
-    "to make a new pick, `record` to check your record, " +
-    "`who` to see who has picked this week, or `standings` to check " +
-    "standings, e.g. `/pickem pick pats`."
-)
-
 # Mapping of normalized team locations to normalized team nicknames
 locs_to_teams = {
     'arizona': 'cardinals',
@@ -100,6 +115,22 @@ for k in locs_to_teams:
         teams.extend(locs_to_teams[k])
 teams = set(teams)
 
+# Fixed order of the teams in the used team bitmasks and pick histories of
+# the standings summaries. Stored summaries depend on it, so a new team must
+# be appended, and a renamed team keep its place.
+team_order = [
+    '49ers', 'bears', 'bengals', 'bills', 'broncos', 'browns', 'buccaneers',
+    'cardinals', 'chargers', 'chiefs', 'colts', 'cowboys', 'dolphins',
+    'eagles', 'falcons', 'giants', 'jaguars', 'jets', 'lions', 'packers',
+    'panthers', 'patriots', 'raiders', 'rams', 'ravens', 'redskins', 'saints',
+    'seahawks', 'steelers', 'texans', 'titans', 'vikings'
+]
+team_positions = dict((team, i) for i, team in enumerate(team_order))
+team_digits = '0123456789abcdefghijklmnopqrstuv'
+assert set(team_order) == teams, "team_order must list every team once"
+assert len(team_order) == len(teams)
+assert len(team_order) <= len(team_digits), "Too many teams for team_digits"
+
 # Mapping from some common location nicknames to normalized locations
 loc_aliases = {
     'ne': 'england',
@@ -119,21 +150,183 @@ team_aliases = {
     'pats': 'patriots',
     'niners': '49ers',
     'skins': 'redskins',
-    'bucs': 'buccaneers'
+    'bucs': 'buccaneers',
+    'cats': 'panthers',
+    'bolts': 'chargers'
 }
 
+# Words that only appear as the first half of two word locations (e.g. "new"
+# in "new england"), which are ignored when looking up a team
+loc_prefixes = set(['new', 'bay', 'los', 'angeles', 'city', 'san', 'the'])
+
+# Compile every alias into one index from normalized token to team. Where two
+# mappings share a token, the earlier one below wins.
+team_index = {}
+for k in scoreboard_to_team:
+    team_index[k] = scoreboard_to_team[k]
+for k in loc_aliases:
+    team_index[k] = locs_to_teams[loc_aliases[k]]
+for k in locs_to_teams:
+    team_index[k] = locs_to_teams[k]
+for k in team_aliases:
+    team_index[k] = team_aliases[k]
+for k in teams:
+    team_index[k] = k
+
+# Tokens that are close enough to an alias may be typos of it. Short tokens
+# and aliases (scoreboard abbreviations, nicknames like "pats") are too easy to
+# hit by accident, e.g. "cats" is one edit from "pats".
+team_fuzzy_min_length = 5
+team_fuzzy_max_distance = 2
+team_fuzzy_aliases = sorted(
+    k for k in team_index if len(k) >= team_fuzzy_min_length
+)
+# Typo matches are slow to find, so the last few are remembered
+team_cache_size = 512
+_team_cache = OrderedDict()
+# Worker records resolve teams from several threads at once
+_team_cache_lock = threading.Lock()
+
 # Various tokens that we will need
-slack_token = os.environ['slackAppToken']
-sr_token = os.environ['sportRadarToken']
 webhook_url = os.environ['slackWebHookURL']
-sns_arn = os.environ['snsARN']
+# Without a bot token, each league's reminders go to the webhook of its
+# channel, given in the reminder's event or here as a JSON object keyed by
+# league. `slackWebHookURL` is only used while no league has one of its own.
+league_webhook_urls = json.loads(
+    os.environ.get('slackLeagueWebHookURLs', '{}')
+)
+# Without a bot token, reminders only go to the channel
+slack_bot_token = os.environ.get('slackBotToken')
+slack_api_url = os.environ.get('slackApiURL', 'https://slack.com/api/')
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-dynamo = boto3.resource('dynamodb')
+dynamo = get_dynamo()
+
+# The season being played, the Tuesday that starts its first week, and its
+# number of regular season weeks (18 since 2021)
+season_year = int(os.environ.get('seasonYear', '2017'))
+week_1_start = datetime.strptime(
+    os.environ.get('seasonStart', '2017-09-05'), '%Y-%m-%d'
+)
+season_weeks = int(os.environ.get('seasonWeeks', '17'))
+
+# Schedule cache settings. Entries live in this container between warm
+# invocations and, if `scheduleCacheTable` is configured, in a DynamoDB table
+# shared by all containers. TTLs are in seconds.
+schedule_cache_table = os.environ.get('scheduleCacheTable')
+schedule_ttl_final = 24 * 3600     # Every game in the week is closed
+schedule_ttl_default = 3600        # No games today
+schedule_ttl_game_day = 5 * 60     # Games kicking off or in progress
+schedule_stale_grace = 15 * 60     # Serve stale entries while refreshing
+
+# The season snapshot written by `schedule_warmer_handler` is kept in the
+# shared schedule table or, if `scheduleSnapshotFile` is set, in that file.
+# Containers re-read it at most every `schedule_snapshot_ttl` seconds.
+schedule_snapshot_file = os.environ.get('scheduleSnapshotFile')
+schedule_snapshot_ttl = 5 * 60
+_schedule_snapshot = {}
+
+# How long standings can be served from this container's last read when
+# answering inline, in seconds
+standings_cache_ttl = 60
+_standings_cache = {}
+
+# Picks, records, summaries and who has picked are cached in this container
+# for `item_cache_ttl` seconds, up to `itemCacheSize` entries (0 turns the
+# cache off). Writes made here update or drop the entries they change; writes
+# from other containers show once entries expire. Reads that check a pick
+# pass `consistent` and skip the cache.
+item_cache_ttl = 30
+item_cache = ItemCache(
+    int(os.environ.get('itemCacheSize', '2048')), item_cache_ttl
+)
+
+# How many times a pick is retried after its conditions are re-checked
+pick_attempts = 3
+
+# Independent reads are run concurrently on a small shared pool, each given
+# this many seconds to finish
+io_pool_size = 4
+io_timeout = 5.0
+_io_pool = None
+
+# Full-table scans are read as this many parallel scan segments at once
+scan_segments = int(os.environ.get('scanSegments', '4'))
+
+# Number of pick results written concurrently during settlement
+settlement_batch_size = aws_pool_size
+
+# Reminders are sent this many at a time. A 429 from Slack pauses every
+# sender for its Retry-After (or the backoff, doubled for each attempt).
+reminder_pool_size = 8
+reminder_attempts = 4
+reminder_backoff = 1.0
+_slack_pause = {'until': 0.0}
+_slack_pause_lock = threading.Lock()
+
+# The worker handles the records of a batch (one from SNS, up to the batch
+# size when triggered from SQS) this many at a time. Redeliveries are skipped
+# by claiming each request's fingerprint for `dedupe_ttl` seconds in this
+# container and, if `dedupeTable` is configured, in a DynamoDB table shared
+# by all containers (with its TTL on `expiresAt`).
+worker_pool_size = 10
+dedupe_table = os.environ.get('dedupeTable')
+dedupe_ttl = 15 * 60
+_claimed_requests = OrderedDict()
+_claimed_lock = threading.Lock()
+
+# Picks and standings are partitioned by league, one per Slack channel, so a
+# league's reads only touch its own items. Picks from before leagues live in
+# the legacy picks table until they are copied with
+# `migrate_to_leagues_handler`. Schedules are the same for every league and
+# stay shared.
+picks_table_name = 'pickem-league-picks'
+standings_table_name = 'pickem-league-standings'
+legacy_picks_table_name = 'pickem-picks'
+
+# Live settlement keeps a high-water mark per game (the furthest status seen,
+# the feed's ETag and whether its picks are settled) in this table
+live_games_table_name = 'pickem-live-games'
+# Game statuses in the order they progress. Any other status (delayed,
+# postponed) ranks with `scheduled`.
+game_statuses = ['scheduled', 'created', 'inprogress', 'halftime',
+                 'complete', 'closed']
+
+# The attributes each read asks DynamoDB for, as the fields of the type its
+# items are returned as. Attributes missing from an item are None.
+PickRow = namedtuple(
+    'PickRow',
+    ['leagueId', 'userId', 'weekNumber', 'userName', 'selectedTeam',
+     'teamWon']
+)
+RecordRow = namedtuple('RecordRow', ['weekNumber', 'selectedTeam', 'teamWon'])
+OpenPick = namedtuple(
+    'OpenPick',
+    ['leagueId', 'userId', 'weekNumber', 'selectedTeam', 'sportRadarGameID']
+)
+PickLock = namedtuple('PickLock', ['selectedTeam', 'lockTime'])
+PickerRow = namedtuple('PickerRow', ['userName'])
+PickerIdRow = namedtuple('PickerIdRow', ['userId'])
+StandingsRow = namedtuple('StandingsRow', ['userName', 'wins'])
+PlayerRow = namedtuple('PlayerRow', ['userId', 'userName', 'usedTeams'])
+ContenderRow = namedtuple(
+    'ContenderRow',
+    ['userName', 'wins', 'usedTeams', 'pickHistory', 'lastWeek']
+)
+Summary = namedtuple(
+    'Summary',
+    ['wins', 'usedTeams', 'pickHistory', 'wonWeeks', 'summaryVersion']
+)
 
-week_1_start = datetime(2017, 9, 5)  # Obviously only works for 2017 season
+_schedule_cache = {}
+_schedule_refreshing = set()
+_schedule_lock = threading.Lock()
+schedule_cache_stats = {
+    'hits': 0, 'shared_hits': 0, 'snapshot_hits': 0, 'stale': 0,
+    'misses': 0, 'errors': 0
+}
 
 """
 Custom exceptions
@@ -146,10 +339,113 @@ class NoTeamGiven(Exception):
 class UnknownTeam(Exception):
     pass
 
+
+class InvalidToken(Exception):
+    pass
+
+
+class PickLocked(Exception):
+    """
+    The user's current pick for the week has kicked off, so it can't be
+    changed. TEAM is the team they picked.
+    """
+    def __init__(self, team):
+        Exception.__init__(self, team)
+        self.team = team
+
+
+class ScheduleUnavailable(Exception):
+    """
+    The schedule of WEEK isn't in the season snapshot, so it would have to
+    be fetched from SportRadar.
+    """
+    def __init__(self, week):
+        Exception.__init__(self, week)
+        self.week = week
+
+
+class ConcurrentCallFailed(Exception):
+    """
+    The call NAME, run by `run_concurrently`, raised an exception or didn't
+    finish in time.
+    """
+    def __init__(self, name, reason):
+        Exception.__init__(
+            self, "Concurrent call {:} failed: {:}".format(name, reason)
+        )
+        self.name = name
+        self.reason = reason
+
+
+class TeamAlreadyPicked(Exception):
+    """
+    The user already picked TEAM in week WEEK.
+    """
+    def __init__(self, team, week):
+        Exception.__init__(self, team, week)
+        self.team = team
+        self.week = week
+
 """
 Helper functions
 """
 
+def run_concurrently(calls, timeout=None):
+    """
+    Run CALLS, a dictionary of name to function taking no arguments, at the
+    same time on the shared I/O pool. Returns a dictionary of name to result
+    once all have finished. Raises ConcurrentCallFailed for the first call
+    (in name order) that raised, or that hadn't finished TIMEOUT seconds
+    (default `io_timeout`) after they were started.
+    """
+    global _io_pool
+
+    if _io_pool is None:
+        _io_pool = ThreadPool(io_pool_size)
+
+    if timeout is None:
+        timeout = io_timeout
+
+    # Finished calls, and a timer at the deadline, release `finished`. Python
+    # 2 polls when waiting with a timeout, which would add up to 50 ms to
+    # every wait, so the waits below have none.
+    finished = threading.Semaphore(0)
+    outcomes = {}
+
+    def run(name, call):
+        try:
+            outcomes[name] = (True, call())
+        except Exception as e:
+            outcomes[name] = (False, e)
+        finished.release()
+
+    deadline = time.time() + timeout
+    timer = threading.Timer(timeout, finished.release)
+    timer.daemon = True
+    timer.start()
+    for name, call in calls.items():
+        _io_pool.apply_async(run, (name, call))
+
+    for _ in calls:
+        finished.acquire()
+        if time.time() >= deadline:
+            break
+    timer.cancel()
+
+    results = {}
+    for name in sorted(calls):
+        if name not in outcomes:
+            raise ConcurrentCallFailed(
+                name, "no result after {:.1f}s".format(timeout)
+            )
+        ok, result = outcomes[name]
+        if not ok:
+            raise ConcurrentCallFailed(name, result)
+        results[name] = result
+
+    return results
+
+
 def get_current_week(custom_date=None):
     """
     Get the number of the current week as an integer.
@@ -171,6 +467,94 @@ def get_current_week(custom_date=None):
     ])
 
 
+def edit_distance(a, b, max_distance):
+    """
+    Return the Levenshtein distance between strings A and B (counting a swap
+    of adjacent characters as one edit), or MAX_DISTANCE + 1 if it is larger
+    than MAX_DISTANCE.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, row = previous, row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(
+                previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost
+            )
+            if (
+                i > 1 and j > 1 and a[i - 1] == b[j - 2] and
+                a[i - 2] == b[j - 1]
+            ):
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > max_distance:
+            return max_distance + 1
+
+    return row[-1]
+
+
+def fuzzy_team(token):
+    """
+    Return the team whose alias is the unique closest match to TOKEN within
+    `team_fuzzy_max_distance` edits, or None if there is no such team.
+    """
+    if len(token) < team_fuzzy_min_length:
+        return None
+
+    # Allow one typo in short words, two in longer ones
+    max_distance = min(team_fuzzy_max_distance, len(token) // 4)
+
+    best_distance = max_distance + 1
+    best_teams = set()
+    for alias in team_fuzzy_aliases:
+        distance = edit_distance(token, alias, max_distance)
+        if distance < best_distance:
+            best_distance = distance
+            best_teams = set([team_index[alias]])
+        elif distance == best_distance:
+            best_teams.add(team_index[alias])
+
+    if best_distance <= max_distance and len(best_teams) == 1:
+        return best_teams.pop()
+    return None
+
+
+def resolve_team(team_choice):
+    """
+    Return the team for the normalized TEAM_CHOICE, or None. The first token
+    that is a known alias wins; failing that, the first token that is a close
+    typo of one. Typo matches are kept in an LRU cache of `team_cache_size`.
+    """
+    tokens = [t for t in team_choice.split() if t not in loc_prefixes]
+
+    for token in tokens:
+        team = team_index.get(token)
+        if team is not None:
+            return team
+
+    with _team_cache_lock:
+        if team_choice in _team_cache:
+            team = _team_cache.pop(team_choice)
+            _team_cache[team_choice] = team
+            return team
+
+    team = None
+    for token in tokens:
+        team = fuzzy_team(token)
+        if team is not None:
+            break
+
+    with _team_cache_lock:
+        _team_cache[team_choice] = team
+        if len(_team_cache) > team_cache_size:
+            _team_cache.popitem(last=False)
+
+    return team
+
+
 def get_team(user_entry):
     """
     Given a USER_ENTRY team name, return a normalized team name if one is
@@ -181,35 +565,7 @@ def get_team(user_entry):
     if len(user_entry) == 0:
         raise NoTeamGiven()
 
-    tmp = user_entry.strip().split()
-
-    team_choice = (
-        " ".join(tmp)
-        .lower()
-        .replace('.', '')
-        .replace('new', '')
-        .replace('bay', '')
-        .replace('los', '')
-        .replace('city', '')
-        .replace('san', '')
-    )
-    tokens = team_choice.split()
-
-    team = None
-
-    for token in tokens:
-        if token in teams:
-            team = token
-        elif token in team_aliases:
-            team = team_aliases[token]
-        elif token in locs_to_teams:
-            team = locs_to_teams[token]
-        elif token in loc_aliases:
-            team = locs_to_teams[loc_aliases[token]]
-        elif token in scoreboard_to_team:
-            team = scoreboard_to_team[token]
-        if team is not None:
-            break
+    team = resolve_team(" ".join(user_entry.lower().replace('.', '').split()))
 
     if team is None:
         raise UnknownTeam()
@@ -217,440 +573,2063 @@ def get_team(user_entry):
     return team
 
 
-def get_user_record(user_id, week_num):
+def league_key(team_id, channel_id):
     """
-    Return the set of picks and results from previous weeks. Returns a list of
-    previous selections, sorted in ascending week number. Each selection is a
-    dictionary with items `weekNumber`, `selectedTeam`, `userId`,
-    and `teamWon` (1 if the selected team won that week).
+    Return the key of the league played in the Slack channel CHANNEL_ID of
+    the workspace TEAM_ID.
     """
-    pick_table = dynamo.Table('pickem-picks')
-    response = pick_table.query(
-        KeyConditionExpression=(
-            Key('userId').eq(user_id) &
-            Key('weekNumber').lt(week_num)
-        )
-    )
-    record = response['Items']
-
-    return sorted(record, key=lambda x: x['weekNumber'])
+    return '{:}:{:}'.format(team_id, channel_id)
 
 
-def get_current_pick(user_id, week_num):
+def pick_key(league, user_id, week_num):
     """
-    Get the pick for the given user USER_ID and week number WEEK_NUM. Returns
-    None if no pick has been made.
+    Return the key of the pick by USER_ID in LEAGUE for WEEK_NUM. Picks are
+    partitioned by player, a user in one league.
     """
-    pick_table = dynamo.Table('pickem-picks')
-    response = pick_table.get_item(
-        Key={'userId': user_id, 'weekNumber': week_num}
-    )
+    return {
+        'playerId': '{:}/{:}'.format(league, user_id),
+        'weekNumber': week_num
+    }
 
-    if 'Item' not in response:
-        return None
-    else:
-        return response['Item']['selectedTeam']
+
+def league_week(league, week_num):
+    """
+    Return the `leagueWeek-index` key for the picks in LEAGUE for WEEK_NUM.
+    """
+    return '{:}/{:}'.format(league, week_num)
 
 
-def get_standings():
+def standings_key(league, user_id):
     """
-    Get the standings (number of wins to date) for all players.
-    Returns a sorted (descending) list of dictionaries with keys
-    'userName' and `wins`.
+    Return the key of the standings of USER_ID in LEAGUE.
     """
-    pick_table = dynamo.Table('pickem-picks')
-    response = pick_table.scan()
-    all_picks = response['Items']
+    return {'leagueId': league, 'userId': user_id}
 
-    standings = {}
-    for row in all_picks:
-        if row['userId'] not in standings:
-            standings[row['userId']] = {
-                'wins': 0,
-                'name': row['userName']
-            }
 
-        if 'teamWon' in row and row['teamWon'] > 0:
-            standings[row['userId']]['wins'] += 1
+@metrics.timed('record_read')
+def get_user_record(league, user_id, week_num, consistent=False):
+    """
+    Return the set of picks and results from previous weeks in LEAGUE.
+    Returns a list of previous selections, sorted in ascending week number.
+    Each selection is a RecordRow with `weekNumber`, `selectedTeam` and
+    `teamWon` (1 if the selected team won that week, None if the pick hasn't
+    been settled).
+
+    The user's whole record is read and kept in `item_cache`, unless
+    CONSISTENT is set, in which case it is read strongly consistently.
+    """
+    def load():
+        player = pick_key(league, user_id, week_num)['playerId']
+        return sorted(
+            query_rows(
+                get_table(picks_table_name), RecordRow,
+                KeyConditionExpression=Key('playerId').eq(player),
+                ConsistentRead=consistent
+            ),
+            key=lambda x: x.weekNumber
+        )
 
-    standings = sorted(
-        [standings[k] for k in standings],
-        key=lambda x: x['wins'], reverse=True
+    record = item_cache.get(
+        ('record', league, user_id), load, consistent=consistent
     )
 
-    return standings
+    return [r for r in record if r.weekNumber < week_num]
 
 
-def get_who_picked(week_num):
+@metrics.timed('pick_read')
+def get_current_pick(league, user_id, week_num, consistent=False):
     """
-    Returns a list of user names that have made picks for the current week.
+    Get the pick for the given user USER_ID in LEAGUE and week number
+    WEEK_NUM, from `item_cache` unless CONSISTENT is set. Returns None if no
+    pick has been made.
     """
-    pick_table = dynamo.Table('pickem-picks')
-    response = pick_table.query(
-        IndexName='weekNumber-index',
-        KeyConditionExpression=Key('weekNumber').eq(week_num)
+    def load():
+        pick = get_row(
+            get_table(picks_table_name), PickLock,
+            pick_key(league, user_id, week_num),
+            ConsistentRead=consistent
+        )
+        return None if pick is None else pick.selectedTeam
+
+    return item_cache.get(
+        ('pick', league, user_id, week_num), load, consistent=consistent
     )
-    all_picks = response['Items']
 
-    this_week = sorted([pick['userName'] for pick in all_picks])
 
-    return this_week
+def scan_pages(table, **kwargs):
+    """
+    Yield each page of items from a scan of TABLE, following
+    `LastEvaluatedKey` so results past the 1 MB page limit are not lost.
+    Keyword arguments are passed through to `scan`.
+    """
+    while True:
+        response = table.scan(**kwargs)
+        yield response['Items']
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
 
-def get_open_picks():
+def parallel_scan_pages(table, segments, **kwargs):
     """
-    Return a list of pick entries where a result has not been recorded.
+    Yield each page of items from a parallel scan of TABLE split into
+    SEGMENTS segments, each read on its own thread, as the pages arrive.
+    At most two pages per segment are held waiting to be consumed. Keyword
+    arguments are passed through to `scan`.
     """
-    pick_table = dynamo.Table('pickem-picks')
-    response = pick_table.scan()
-    all_picks = response['Items']
+    pages = Queue(2 * segments)
+    stop = threading.Event()
+    finished = object()
+
+    def put(value):
+        # Give up once the consumer has gone
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
 
-    return [pick for pick in all_picks if 'teamWon' not in pick]
+    def read_segment(segment):
+        try:
+            for page in scan_pages(
+                table, Segment=segment, TotalSegments=segments, **kwargs
+            ):
+                if not put(page):
+                    return
+        except Exception as e:
+            logger.exception("Scan of segment %s of %s failed", segment,
+                             segments)
+            put(e)
+            return
+        put(finished)
+
+    pool = ThreadPool(segments)
+    try:
+        pool.map_async(read_segment, range(segments))
+        remaining = segments
+        while remaining:
+            page = pages.get()
+            if page is finished:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        # Segments stop at their next page once the consumer has gone
+        stop.set()
+        pool.close()
+        pool.join()
 
 
-def submit_pick(user_id, week_num, team, user_name, sr_game_id):
+def scan_items(table, segments=1, **kwargs):
     """
-    Log a pick to the database for the given
-        USER_ID: Slack user ID,
-        WEEK_NUM: The week number for the pick,
-        TEAM: The normalized team name from `get_team`,
-        USER_NAME: The Slack user name,
-        SR_GAME_ID: The sports radar game identifier
-    """
-    pick_table = dynamo.Table('pickem-picks')
-    pick_table.put_item(
-        Item={
-            'userId': user_id,
-            'weekNumber': week_num,
-            'selectedTeam': team,
-            'userName': user_name,
-            'selectionTime': str(datetime.now()),
-            'sportRadarGameID': sr_game_id
-        }
-    )
+    Yield every item from a scan of TABLE, following `LastEvaluatedKey`.
+    With SEGMENTS above 1 the table is read as a parallel scan (see
+    `parallel_scan_pages`), and items come in no particular order. Keyword
+    arguments are passed through to `scan`.
+    """
+    if segments > 1:
+        pages = parallel_scan_pages(table, segments, **kwargs)
+    else:
+        pages = scan_pages(table, **kwargs)
 
+    for page in pages:
+        for item in page:
+            yield item
 
-def get_schedule(week_num):
+
+def query_items(table, **kwargs):
     """
-    Get the scheduled games for the given WEEK_NUM. Returns a list of
-    games as dicts, each having a key `scheduled` indicating when the game
-    is scheduled to start as a datetime string of format
-    '%Y-%m-%dT%H:%M:%S+00:00', and a 'home' and 'away' team listing,
-    each dicts with a key 'name' that gives the names of the home and away
-    teams.
+    Yield every item from a query of TABLE, following `LastEvaluatedKey`.
+    Keyword arguments are passed through to `query`.
     """
-    ws_url = (
-        'https://api.sportradar.us/' +
-        'nfl-ot2/games/{:}/REG/' +
-        '{:}/schedule.json?api_key={:}'
-    ).format(2017, week_num, sr_token)
-    ws_response = requests.get(ws_url)
-    ws = json.loads(ws_response.text)
+    while True:
+        response = table.query(**kwargs)
+        for item in response['Items']:
+            yield item
 
-    return ws['week']['games']
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
 
-def update_result(row, outcome):
+def projection(fields, **kwargs):
     """
-    For a given pick entry ROW, set the `teamWon` field based on the boolean
-    OUTCOME, which is True if the selected team won. Write results to the
-    database.
+    Return the keyword arguments KWARGS for a read, extended to ask DynamoDB
+    for only the attributes FIELDS. Names are always substituted, so FIELDS
+    can include reserved words and computed names like the used team marks.
     """
+    names = dict(kwargs.get('ExpressionAttributeNames', {}))
+    placeholders = []
+    for i, field in enumerate(fields):
+        placeholder = '#p{:}'.format(i)
+        names[placeholder] = field
+        placeholders.append(placeholder)
+
+    kwargs['ProjectionExpression'] = ', '.join(placeholders)
+    kwargs['ExpressionAttributeNames'] = names
+    return kwargs
 
-    new_row = dict(row)
-    new_row['teamWon'] = 1 if outcome else 0
 
-    pick_table = dynamo.Table('pickem-picks')
-    pick_table.put_item(Item=new_row)
+def as_row(row_type, item):
+    """
+    Return the DynamoDB ITEM as a ROW_TYPE, one of the namedtuples above.
+    """
+    return row_type(*[item.get(field) for field in row_type._fields])
 
 
-def parse_subcommand(command_text):
+def get_row(table, row_type, key, **kwargs):
     """
-    Parse the subcommand from the given COMMAND_TEXT, which is everything that
-    follows `/pickem`.  The subcommand is the option passed to the command, e.g.
-    'pick' in the case of `/pickem pick`.
+    Read the item with KEY from TABLE as a ROW_TYPE, or None if there is no
+    such item. Only the fields of ROW_TYPE are read. Keyword arguments are
+    passed through to `get_item`.
     """
-    return command_text.strip().split()[0].lower()
+    response = table.get_item(
+        Key=key, **projection(row_type._fields, **kwargs)
+    )
+    if 'Item' not in response:
+        return None
+    return as_row(row_type, response['Item'])
 
 
-def parse_options(command_text):
+def scan_rows(table, row_type, segments=1, **kwargs):
     """
-    Parse options passed into the command, e.g. returns 'cards' from the
-    command `/pickem pick cards`, where `pickem` is the command, `pick` is the
-    subcommand, and cards is the option passed to the subcommand.
+    Yield every item from a scan of TABLE, in SEGMENTS segments, as a
+    ROW_TYPE, reading only its fields. Keyword arguments are passed through
+    to `scan_items`.
     """
-    sc = parse_subcommand(command_text)
-    return command_text.replace(sc, '').strip()
+    for item in scan_items(
+        table, segments, **projection(row_type._fields, **kwargs)
+    ):
+        yield as_row(row_type, item)
 
 
-def receptionist_handler(event, context):
+def query_rows(table, row_type, **kwargs):
+    """
+    Yield every item from a query of TABLE as a ROW_TYPE, reading only its
+    fields. Keyword arguments are passed through to `query_items`.
+    """
+    for item in query_items(table, **projection(row_type._fields, **kwargs)):
+        yield as_row(row_type, item)
 
-    # WHY ISN'T THIS WORKING!?
 
-    params = parse_qs(event['body'])
-    token = params['token'][0]
-    if token != slack_token:
-        logger.error("Request token (%s) does not match expected", token)
-        return respond('Invalid request token', is_error=True)
+@metrics.timed('standings_scan')
+def compute_standings(league=None):
+    """
+    Recompute the per-user aggregates of every league, or only of LEAGUE,
+    from the raw picks. Returns a dictionary keyed by (league, user ID) of
+    dictionaries with keys `name`, `wins`, `losses`, `lastWeek` (the last
+    week with a settled pick, or None) and the summary attributes from
+    `summarize_picks`. This reads
+    the whole table, as a parallel scan, so it is only meant for rebuilding
+    and checking the standings table. The aggregates are built as the picks
+    stream in, so only they are held in memory. A single league is read
+    strongly consistently, so picks just copied into it are counted.
+    """
+    pick_table = get_table(picks_table_name)
 
-    command_text = params['text'][0]
+    kwargs = {}
+    if league is not None:
+        kwargs = {
+            'FilterExpression': Attr('leagueId').eq(league),
+            'ConsistentRead': True
+        }
 
-    subcommand = parse_subcommand(command_text)
+    standings = {}
+    latest_week = {}
+    for row in scan_rows(pick_table, PickRow, scan_segments, **kwargs):
+        user_id = (row.leagueId, row.userId)
+        if user_id not in standings:
+            standings[user_id] = {
+                'name': row.userName,
+                'wins': 0,
+                'losses': 0,
+                'lastWeek': None
+            }
+            standings[user_id].update(summarize_picks([]))
+            latest_week[user_id] = row.weekNumber
+        elif row.weekNumber > latest_week[user_id]:
+            # Use the most recent display name
+            standings[user_id]['name'] = row.userName
+            latest_week[user_id] = row.weekNumber
+
+        standings[user_id].update(
+            summarize_picks([row], standings[user_id])
+        )
 
-    if subcommand == 'help':
-        """Return a help message."""
-        return respond(help_text, help_attachment_text)
+        if row.teamWon is not None:
+            if row.teamWon > 0:
+                standings[user_id]['wins'] += 1
+            else:
+                standings[user_id]['losses'] += 1
 
-    elif (subcommand == 'standings' or subcommand == 'record' or
-          subcommand == 'pick' or subcommand == 'who'):
+            last_week = standings[user_id]['lastWeek']
+            if last_week is None or row.weekNumber > last_week:
+                standings[user_id]['lastWeek'] = row.weekNumber
 
-        sns = boto3.client('sns')
-        sns.publish(
-            TopicArn=sns_arn,
-            Message=json.dumps({'default': json.dumps(params)}),
-            MessageStructure='json'
-        )
+    return standings
 
-        return respond("One sec...")
 
-    else:
-        return respond(
-            ":persevere: Invalid command! " + help_text, help_attachment_text
+@metrics.timed('standings_read')
+def get_standings(league, max_age=None):
+    """
+    Get the standings (number of wins to date) for all players in LEAGUE.
+    Returns a sorted (descending) list of dictionaries with keys
+    `name` and `wins`.
+
+    Standings are read from the standings table, which holds one small
+    aggregate item per player, partitioned by league, and is kept up to date
+    by `submit_pick` and `update_result`. If MAX_AGE (in seconds) is given,
+    standings read by this container less than MAX_AGE seconds ago are
+    returned instead.
+    """
+    now = time.time()
+    cached = _standings_cache.get(league)
+    if (
+        max_age is not None and
+        cached is not None and
+        now - cached['time'] < max_age
+    ):
+        return cached['standings']
+
+    standings_table = get_table(standings_table_name)
+
+    standings = [
+        {'name': row.userName, 'wins': int(row.wins or 0)}
+        for row in query_rows(
+            standings_table, StandingsRow,
+            KeyConditionExpression=Key('leagueId').eq(league)
         )
+    ]
+    standings = sorted(standings, key=lambda x: x['wins'], reverse=True)
+
+    _standings_cache[league] = {'standings': standings, 'time': now}
 
+    return standings
 
-def respond(response_text, attachment_text=None,
-            in_channel=False, response_url=None, is_error=False):
 
-    body = {
-        'response_type': 'in_channel' if in_channel else 'ephemeral',
-        'text': response_text
-    }
+def rebuild_standings(dry_run=False, league=None):
+    """
+    Recompute the standings aggregates of every league, or only of LEAGUE,
+    from the raw picks and, unless DRY_RUN is set, overwrite the stored
+    aggregates with them. Returns a list
+    of ((league, user ID), stored aggregate, recomputed aggregate) tuples for
+    every player whose stored aggregate was wrong or missing. With DRY_RUN,
+    this verifies the summaries that `pick` and `record` rely on against the
+    raw picks. Rewritten summaries get a new version, so picks made during a
+    rebuild are retried against them.
+    """
+    standings_table = get_table(standings_table_name)
 
-    if attachment_text:
-        body['attachments'] = [{'text': attachment_text, 'mrkdwn_in': ['text']}]
+    computed = compute_standings(league)
 
-    if response_url is not None:
-        requests.post(
-            response_url, json=body,
-            headers={'Content-Type': 'application/json'}
-        )
+    # Every attribute is compared, so stored aggregates are read whole. They
+    # are checked as they stream in, and only mismatches are kept.
+    if league is None:
+        stored = scan_items(standings_table, scan_segments)
     else:
-        to_return = {
-            'statusCode': '400' if is_error else '200',
-            'body': response_text if is_error else json.dumps(body)
-        }
+        stored = query_items(
+            standings_table, KeyConditionExpression=Key('leagueId').eq(league),
+            ConsistentRead=True
+        )
 
-        if not is_error:
-            to_return['headers'] = {
-                'Content-Type': 'application/json',
-            }
+    mismatches = []
+    seen = set()
+    for current in stored:
+        user_id = (current['leagueId'], current['userId'])
+        seen.add(user_id)
+        expected = computed.get(user_id)
+        if expected is None or (
+            current.get('userName') != expected['name'] or
+            int(current.get('wins', 0)) != expected['wins'] or
+            int(current.get('losses', 0)) != expected['losses'] or
+            current.get('lastWeek') != expected['lastWeek'] or
+            any(
+                current.get(field) != expected[field]
+                for field in ('usedTeams', 'pickHistory', 'wonWeeks')
+            )
+        ):
+            mismatches.append((user_id, current, expected))
+
+    for user_id, expected in computed.items():
+        if user_id not in seen:
+            mismatches.append((user_id, None, expected))
+
+    if not dry_run:
+        with standings_table.batch_writer() as batch:
+            for user_id, current, expected in mismatches:
+                if expected is None:
+                    batch.delete_item(Key=standings_key(*user_id))
+                    continue
+
+                item = standings_key(*user_id)
+                item.update({
+                    'userName': expected['name'],
+                    'wins': expected['wins'],
+                    'losses': expected['losses'],
+                    'usedTeams': expected['usedTeams'],
+                    'pickHistory': expected['pickHistory'],
+                    'wonWeeks': expected['wonWeeks'],
+                    'summaryVersion': (
+                        int((current or {}).get('summaryVersion', 0)) + 1
+                    )
+                })
+                if expected['lastWeek'] is not None:
+                    item['lastWeek'] = expected['lastWeek']
+                batch.put_item(Item=item)
+        item_cache.clear()
 
-        return to_return
+    return mismatches
 
 
-def pickem_handler(event, context):
+def odds_games(games, now):
     """
-    Handles the requests from the `/pickem` command to the lambda function
-    that is responsible for handling API requests.
+    Return the week's GAMES as `odds.season_odds` takes them: (home, away,
+    result, pickable) tuples with the teams' places in `team_order`, the
+    result (1 for a home win, 0 for an away win, 0.5 for a tie) if the game
+    is closed, and whether it is still to kick off at NOW. Games with a team
+    that isn't in `team_order` (e.g. one renamed since) are left out.
     """
-    ## Uncomment this when I trigger from SNS
-    params = parse_qs(event['body'])
+    converted = []
+    for game in games:
+        home = team_positions.get(schedule_team(game, 'home'))
+        away = team_positions.get(schedule_team(game, 'away'))
+        if home is None or away is None:
+            logger.warning("Leaving game %s out of the odds, a team is "
+                           "unknown", game.get('id'))
+            continue
+
+        result = None
+        scoring = game.get('scoring') or {}
+        home_points = scoring.get('home_points')
+        away_points = scoring.get('away_points')
+        if (
+            game.get('status') == 'closed' and
+            home_points is not None and away_points is not None
+        ):
+            if home_points > away_points:
+                result = 1
+            elif away_points > home_points:
+                result = 0
+            else:
+                result = 0.5
 
-    token = params['token'][0]
-    if token != slack_token:
-        logger.error("Request token (%s) does not match expected", token)
-        return respond('Invalid request token', is_error=True)
+        converted.append((home, away, result, kickoff_time(game) > now))
 
-    user_name = params['user_name'][0]
-    user_id = params['user_id'][0]
-    command = params['command'][0]
-    channel = params['channel_name'][0]
-    command_text = params['text'][0]
-    response_url = params['response_url'][0]
+    return converted
 
-    subcommand = parse_subcommand(command_text)
-    options = parse_options(command_text)
 
-    week_num = get_current_week()
+@metrics.timed('odds')
+def get_season_odds(league, week_num, count=None, seed=None):
+    """
+    Return each player's chance of finishing the season first in LEAGUE,
+    playing out the season from week WEEK_NUM, as a list of (name, chance)
+    tuples, best chance first, and the number of seasons simulated. See
+    `odds.season_odds` for the simulation and COUNT and SEED. The players'
+    wins, used teams and picks this week come from their standings items in
+    one query. Team records and the remaining games come from the season
+    snapshot kept by `schedule_warmer_handler`, and this week's games from
+    the schedule cache. Raises ScheduleUnavailable if the snapshot is missing
+    a week, rather than fetching the season from SportRadar.
+    """
+    players = list(query_rows(
+        get_table(standings_table_name), ContenderRow,
+        KeyConditionExpression=Key('leagueId').eq(league)
+    ))
+
+    now = time.time()
+    past = []
+    remaining = []
+    for week in range(1, season_weeks + 1):
+        if week == week_num:
+            schedule = get_schedule(week)
+        else:
+            entry = _snapshot_entry(week, now)
+            if entry is None:
+                raise ScheduleUnavailable(week)
+            schedule = entry['games']
+
+        games = odds_games(schedule, now)
+        if week < week_num:
+            past.extend(
+                (home, away, result)
+                for home, away, result, pickable in games
+                if result is not None
+            )
+        else:
+            remaining.append(games)
+
+    first_picks = []
+    for player in players:
+        history = (player.pickHistory or '').ljust(season_weeks, '.')
+        digit = history[week_num - 1]
+        if player.lastWeek is not None and player.lastWeek >= week_num:
+            first_picks.append(len(team_order))
+        elif digit != '.':
+            first_picks.append(team_digits.index(digit))
+        else:
+            first_picks.append(-1)
 
-    if subcommand == 'help':
-        """Return a help message."""
-        return respond(help_text, help_attachment_text)
+    chances, simulated = odds.season_odds(
+        [int(player.wins or 0) for player in players],
+        [int(player.usedTeams or 0) for player in players],
+        first_picks, past, remaining, len(team_order),
+        count=count, seed=seed
+    )
 
-    elif subcommand == 'standings':
-        """Returns standings in channel for everyone to see."""
-        standings = get_standings()
+    return sorted(
+        zip([player.userName for player in players], chances),
+        key=lambda x: x[1], reverse=True
+    ), simulated
 
-        standings_string = '`{:<10} {:>5}`\n'.format('Name', 'Wins')
-        standings_string += '`' + "-"*16 + '`'
-        for row in standings:
-            standings_string += '\n`{:<10} {:>5}`'.format(
-                row['name'], row['wins']
-            )
 
-        return respond(
-            'Standings as of week {:}'.format(week_num),
-            standings_string,
-            in_channel=True
-        )
+def get_players(league):
+    """
+    Return every player in LEAGUE, as PlayerRows, from the standings table.
+    """
+    return list(query_rows(
+        get_table(standings_table_name), PlayerRow,
+        KeyConditionExpression=Key('leagueId').eq(league)
+    ))
 
-    elif subcommand == 'record':
-        record = get_user_record(user_id, week_num)
 
-        wins = sum(r['teamWon'] for r in record if 'teamWon' in r)
-        # We occassionally gift wins, which are added at negative week number
-        actual_wins = sum(
-            r['teamWon'] for r in record
-            if 'teamWon' in r and r['weekNumber'] > 0
+@metrics.timed('who_read')
+def get_who_picked(league, week_num, consistent=False):
+    """
+    Returns a list of user names that have made picks in LEAGUE for the
+    current week. The list is kept in `item_cache`. The index it is read
+    from can't be read strongly consistently, so CONSISTENT only skips the
+    cache.
+    """
+    def load():
+        all_picks = query_rows(
+            get_table(picks_table_name), PickerRow,
+            IndexName='leagueWeek-index',
+            KeyConditionExpression=(
+                Key('leagueWeek').eq(league_week(league, week_num))
+            )
         )
-        losses = week_num - 1 - actual_wins
+        return sorted([pick.userName for pick in all_picks])
 
-        record_string = "`{:<10} {:<16} {:<10}`\n".format(
-            'Week', 'Team', 'Result'
-            )
-        record_string += "`" + "-"*38 + "`"
-        for r in record:
-            record_string += "\n`{:<10} {:<16} {:<10}`".format(
-                r['weekNumber'], r['selectedTeam'].capitalize(),
-                'Win' if 'teamWon' in r and r['teamWon'] > 0 else 'Loss'
-            )
+    return list(item_cache.get(
+        ('who', league, week_num), load, consistent=consistent
+    ))
 
-        return respond(
-            "Your record: {:} wins, {:} losses".format(wins, losses),
-            record_string
+
+def get_picked_ids(league, week_num):
+    """
+    Return the set of user IDs that have made picks in LEAGUE for week
+    WEEK_NUM, read past `item_cache`.
+    """
+    return set(
+        pick.userId for pick in query_rows(
+            get_table(picks_table_name), PickerIdRow,
+            IndexName='leagueWeek-index',
+            KeyConditionExpression=(
+                Key('leagueWeek').eq(league_week(league, week_num))
+            )
         )
+    )
 
-    elif subcommand == 'pick':
 
-        if week_num > 17:
-            return respond(
-                "The 2017 season has ended. Thanks for playing!"
-            )
+def get_open_picks(week_num=None):
+    """
+    Yield picks where a result has not been recorded, as OpenPicks, one page
+    at a time. If WEEK_NUM is given, only that week's open picks are read, from
+    the sparse `openWeek-index`. Only unsettled picks carry the `openWeek`
+    attribute, so the index holds nothing else. Without WEEK_NUM, the whole
+    table is read with a parallel scan. Picks from every league are
+    returned, so one run settles them all.
+    """
+    pick_table = get_table(picks_table_name)
 
-        # In case the user has already made a pick this week
-        standing_team = get_current_pick(user_id, week_num)
+    if week_num is None:
+        return scan_rows(
+            pick_table, OpenPick, scan_segments,
+            FilterExpression=Attr('teamWon').not_exists()
+        )
 
-        try:
-            team = get_team(options)
-        except UnknownTeam:
-            return respond(
-                ":confused: Sorry, I don't know that team. Try again."
-            )
-        except NoTeamGiven:
-            # Just report the current pick if there is one
-            if standing_team is None:
-                return respond(
-                    ":persevere: You haven't picked a team this week. " +
-                    "Try `/pickem pick [team name]`."
-                )
-            else:
-                return respond(
-                    "You've picked {:} for this week. Good luck!".format(
-                        standing_team.capitalize()
-                    )
-                )
+    return query_rows(
+        pick_table, OpenPick,
+        IndexName='openWeek-index',
+        KeyConditionExpression=Key('openWeek').eq(week_num)
+    )
 
-        record = get_user_record(user_id, week_num)
-        team_previously_chosen = False
-        previous_week = None
-        for r in record:
-            if team == r['selectedTeam']:
-                team_previously_chosen = True
-                previous_week = r['weekNumber']
-                break
 
-        if team_previously_chosen:
-            return respond(
-                ":no_good: You already picked {:} in week {:}. " +
-                "Try again.".format(team.capitalize(), previous_week)
-            )
-        else:
-            games = get_schedule(week_num)
-
-            team_playing = False
-            standing_team_game_started = False
-            game_started = False
-            current_time = datetime.utcnow()
-            sr_game_id = None
-            for game in games:
-                away_team = game['away']['name'].split()[-1].lower()
-                home_team = game['home']['name'].split()[-1].lower()
-                game_time = datetime.strptime(
-                    game['scheduled'],
-                    '%Y-%m-%dT%H:%M:%S+00:00'
-                )
+def migrate_to_league(league):
+    """
+    Copy every pick from the legacy picks table into LEAGUE, adding the
+    league keys, then build the league's standings from the copied picks
+    (the legacy deployment kept no standings). Unsettled picks get
+    `openWeek` so they are settled from the open picks index. Returns the
+    number of `picks` copied and of `standings` written.
+    """
+    copied = 0
+    with get_table(picks_table_name).batch_writer() as batch:
+        for item in scan_items(
+            get_table(legacy_picks_table_name), scan_segments
+        ):
+            item.update(pick_key(league, item['userId'], item['weekNumber']))
+            item['leagueId'] = league
+            item['leagueWeek'] = league_week(league, item['weekNumber'])
+            if 'teamWon' not in item:
+                item['openWeek'] = item['weekNumber']
+            batch.put_item(Item=item)
+            copied += 1
 
-                if away_team == team or home_team == team:
-                    team_playing = True
-                    if current_time >= game_time:
-                        game_started = True
-                    sr_game_id = game['id']
-
-                if (
-                    standing_team is not None and
-                    (
-                        away_team == standing_team or
-                        home_team == standing_team
-                    ) and
-                    current_time >= game_time
-                ):
-                    standing_team_game_started = True
-
-            if standing_team_game_started:
-                return respond(
-                    ":thumbsdown: The {:} game has started. " +
-                    "You can't change your pick now, cheater!".format(
-                        standing_team.capitalize()
-                    )
-                )
-            elif not team_playing:
-                return respond(
-                    ":no_good: The {:} aren't playing this week. " +
-                    "Try again.".format(team.capitalize())
-                )
-            elif game_started:
-                return respond(
-                    ":thumbsdown: The {:} game has started. " +
-                    "You can't pick them now, cheater!".format(
-                        team.capitalize()
-                    )
-                )
-            else:
-                submit_pick(user_id, week_num, team, user_name, sr_game_id)
-                return respond(
-                    ":ok_hand: {:} has picked the {:} for week {:}".format(
-                        user_name, team.capitalize(), week_num
-                    )
-                )
+    written = rebuild_standings(league=league)
 
-    elif subcommand == 'who':
-        users = get_who_picked(week_num)
+    return {'picks': copied, 'standings': len(written)}
 
-        return respond(
+
+def summarize_picks(rows, summary=None):
+    """
+    Summarize a player's picks, given as ROWS with `weekNumber`,
+    `selectedTeam` and `teamWon`, into the attributes kept on their standings
+    item for `pick` and `record`:
+        usedTeams: A bitmask of the picked teams, by their place in
+            `team_order`,
+        pickHistory: One character per week of the season, the picked
+            team's place in `team_order` as a `team_digits` digit, or `.`
+            if there was no pick,
+        wonWeeks: A bitmask of the weeks won, week 1 in the lowest bit.
+    Only picks in weeks 1 to `season_weeks` are summarized. Pass the SUMMARY
+    of a player's earlier picks to add ROWS to it, so picks can be
+    summarized as they are read.
+    """
+    if summary is None:
+        history = ['.'] * season_weeks
+        used = 0
+        won = 0
+    else:
+        # Histories written for a shorter season are padded out
+        history = list(summary['pickHistory'].ljust(season_weeks, '.'))
+        used = summary['usedTeams']
+        won = summary['wonWeeks']
+
+    for row in rows:
+        if not 1 <= row.weekNumber <= season_weeks:
+            continue
+        week = int(row.weekNumber)
+        position = team_positions[row.selectedTeam]
+        history[week - 1] = team_digits[position]
+        used |= 1 << position
+        if row.teamWon is not None and row.teamWon > 0:
+            won |= 1 << (week - 1)
+
+    return {
+        'usedTeams': used,
+        'pickHistory': ''.join(history),
+        'wonWeeks': won
+    }
+
+
+def history_picks(history):
+    """
+    Return the picks in a summary's pick HISTORY as a dictionary of week
+    number to team.
+    """
+    return dict(
+        (week + 1, team_order[team_digits.index(digit)])
+        for week, digit in enumerate(history)
+        if digit != '.'
+    )
+
+
+@metrics.timed('summary_read')
+def read_summary(league, user_id, consistent=False):
+    """
+    Read the summary of USER_ID's picks in LEAGUE from their standings item
+    with one small GetItem, or from `item_cache`. With CONSISTENT, the read
+    is strongly consistent and skips the cache. Returns a Summary. Items
+    written before summaries existed are summarized from the user's raw
+    picks; a player with no standings item gets an empty summary with a
+    `summaryVersion` of None.
+    """
+    def load():
+        summary = get_row(
+            get_table(standings_table_name), Summary,
+            standings_key(league, user_id),
+            ConsistentRead=consistent
+        )
+        if summary is None:
+            return Summary(0, 0, '.' * season_weeks, 0, None)
+        if summary.pickHistory is None:
+            record = get_user_record(
+                league, user_id, season_weeks + 1, consistent=consistent
+            )
+            summary = summary._replace(**summarize_picks(record))
+        return summary
+
+    return item_cache.get(
+        ('summary', league, user_id), load, consistent=consistent
+    )
+
+
+def summary_record(summary, week_num):
+    """
+    Return the RecordRows for the weeks before WEEK_NUM in SUMMARY, in the
+    form returned by `get_user_record`. Unsettled picks count as losses.
+    """
+    won = int(summary.wonWeeks or 0)
+    return [
+        RecordRow(week, team, 1 if won & (1 << (week - 1)) else 0)
+        for week, team in sorted(history_picks(summary.pickHistory).items())
+        if week < week_num
+    ]
+
+
+def check_used_team(summary, week_num, team):
+    """
+    Raise TeamAlreadyPicked if SUMMARY shows TEAM picked in a week other
+    than WEEK_NUM. Only a set bit in `usedTeams` needs the history looked at.
+    """
+    if not int(summary.usedTeams or 0) & (1 << team_positions[team]):
+        return
+
+    for week, picked in history_picks(summary.pickHistory).items():
+        if picked == team and week != week_num:
+            raise TeamAlreadyPicked(team, week)
+
+
+def _pick_condition(league, user_id, week_num, kickoffs, now):
+    """
+    Read the user's current pick for WEEK_NUM and return the condition
+    (expression and values) under which it can be replaced at NOW. Raises
+    PickLocked if its game has kicked off according to its `lockTime`, or
+    the KICKOFFS index for picks written before `lockTime` existed.
+    """
+    pick = get_row(
+        get_table(picks_table_name), PickLock,
+        pick_key(league, user_id, week_num),
+        ConsistentRead=True
+    )
+    if pick is None:
+        return 'attribute_not_exists(playerId)', {}
+
+    if pick.lockTime is not None:
+        if now >= pick.lockTime:
+            raise PickLocked(pick.selectedTeam)
+        return 'lockTime = :lock', {':lock': pick.lockTime}
+
+    game = kickoffs.get(pick.selectedTeam)
+    if game is not None and now >= game['kickoff']:
+        raise PickLocked(pick.selectedTeam)
+    return (
+        'selectedTeam = :standing AND attribute_not_exists(lockTime)',
+        {':standing': pick.selectedTeam}
+    )
+
+
+@metrics.timed('pick_write')
+def submit_pick(league, user_id, week_num, team, user_name, kickoffs,
+                summary=None):
+    """
+    Log a pick to the database for the given
+        LEAGUE: The league key from `league_key`,
+        USER_ID: Slack user ID,
+        WEEK_NUM: The week number for the pick,
+        TEAM: The normalized team name from `get_team`,
+        USER_NAME: The Slack user name,
+        KICKOFFS: The week's kickoff index from `get_kickoff_index`, which
+            must include TEAM,
+        SUMMARY: The user's summary from a strongly consistent
+            `read_summary`, read here if not given
+
+    TEAM is checked against the used teams in the user's summary, and
+    TeamAlreadyPicked raised if they picked it in another week. The pick and
+    the updated summary are then written in one transaction, which only
+    succeeds if the user's current pick for the week hasn't kicked off and
+    the summary is still at the version read, so concurrent picks can't get
+    around either rule. If a condition fails, it is re-checked by reading the
+    current state: PickLocked is raised if the pick really is locked,
+    otherwise the write is retried. These reads skip
+    `item_cache`; once the pick is written, it replaces the cached pick and
+    the entries it changes are dropped.
+    """
+    now = int(time.time())
+    game = kickoffs[team]
+
+    pick_item = pick_key(league, user_id, week_num)
+    pick_item.update({
+        'leagueId': league,
+        'leagueWeek': league_week(league, week_num),
+        'userId': user_id,
+        'selectedTeam': team,
+        'userName': user_name,
+        'selectionTime': str(datetime.now()),
+        'sportRadarGameID': game['game'],
+        # The pick can't be changed after this time (seconds since epoch)
+        'lockTime': game['kickoff'],
+        # Puts the pick in the sparse open picks index until settled
+        'openWeek': week_num
+    })
+    pick_condition = (
+        'attribute_not_exists(playerId) OR lockTime > :now', {':now': now}
+    )
+    if summary is None:
+        summary = read_summary(league, user_id, consistent=True)
+
+    client = dynamo.meta.client
+    for attempt in range(pick_attempts):
+        check_used_team(summary, week_num, team)
+        picks = history_picks(summary.pickHistory)
+        picks[week_num] = team
+        won = int(summary.wonWeeks or 0)
+        summarized = summarize_picks(
+            RecordRow(week, picked, (won >> (week - 1)) & 1)
+            for week, picked in picks.items()
+        )
+
+        put = {
+            'TableName': picks_table_name,
+            'Item': pick_item,
+            'ConditionExpression': pick_condition[0]
+        }
+        if pick_condition[1]:
+            put['ExpressionAttributeValues'] = pick_condition[1]
+
+        values = {
+            ':name': user_name,
+            ':used': summarized['usedTeams'],
+            ':history': summarized['pickHistory'],
+            ':next': int(summary.summaryVersion or 0) + 1,
+            ':zero': 0
+        }
+        if summary.summaryVersion is None:
+            version_condition = 'attribute_not_exists(summaryVersion)'
+        else:
+            version_condition = 'summaryVersion = :version'
+            values[':version'] = summary.summaryVersion
+        update = {
+            'TableName': standings_table_name,
+            'Key': standings_key(league, user_id),
+            'UpdateExpression': (
+                'SET userName = :name, usedTeams = :used, '
+                'pickHistory = :history, summaryVersion = :next '
+                'ADD wins :zero, losses :zero, wonWeeks :zero'
+            ),
+            'ConditionExpression': version_condition,
+            'ExpressionAttributeValues': values
+        }
+
+        try:
+            client.transact_write_items(
+                TransactItems=[{'Put': put}, {'Update': update}]
+            )
+        except client.exceptions.TransactionCanceledException as e:
+            if attempt == pick_attempts - 1:
+                raise
+
+            codes = [
+                reason.get('Code')
+                for reason in e.response.get('CancellationReasons', [])
+            ]
+            if not codes:
+                # Not told which condition failed, so re-check both
+                codes = ['ConditionalCheckFailed'] * 2
+
+            checks = {}
+            if codes[0] == 'ConditionalCheckFailed':
+                checks['pick'] = lambda: _pick_condition(
+                    league, user_id, week_num, kickoffs, now
+                )
+            if codes[1] == 'ConditionalCheckFailed':
+                checks['summary'] = lambda: read_summary(
+                    league, user_id, consistent=True
+                )
+
+            try:
+                conditions = run_concurrently(checks)
+            except ConcurrentCallFailed as failure:
+                # Let the caller see why the pick was refused
+                if isinstance(failure.reason, PickLocked):
+                    raise failure.reason
+                raise
+
+            pick_condition = conditions.get('pick', pick_condition)
+            summary = conditions.get('summary', summary)
+            continue
+
+        # Written through to this container's cached reads
+        item_cache.put(('pick', league, user_id, week_num), team)
+        item_cache.invalidate(
+            ('record', league, user_id), ('summary', league, user_id),
+            ('who', league, week_num)
+        )
+        return
+
+
+@metrics.timed('sportradar')
+def fetch_schedule(week_num):
+    """
+    Fetch the scheduled games for the given WEEK_NUM from SportRadar,
+    bypassing the schedule cache. See `get_schedule` for the format.
+    """
+    ws, etag = sportradar.get(
+        'nfl-ot2/games/{:}/REG/{:}/schedule.json'.format(season_year, week_num)
+    )
+
+    return ws['week']['games']
+
+
+@metrics.timed('sportradar')
+def fetch_game(game_id, etag=None):
+    """
+    Fetch the boxscore of the game GAME_ID from SportRadar, conditional on
+    its ETAG if given. Returns the game in the schedule's format (`id`,
+    `status` and, once scored, `scoring`) and its ETag, or (None, ETAG) if
+    the game hasn't changed.
+    """
+    boxscore, etag = sportradar.get(
+        'nfl-ot2/games/{:}/boxscore.json'.format(game_id), etag
+    )
+    if boxscore is None:
+        return None, etag
+
+    game = {'id': boxscore['id'], 'status': boxscore['status']}
+    summary = boxscore.get('summary', {})
+    if 'home' in summary and 'away' in summary:
+        game['scoring'] = {
+            'home_points': summary['home'].get('points', 0),
+            'away_points': summary['away'].get('points', 0)
+        }
+
+    return game, etag
+
+
+def kickoff_time(game):
+    """
+    Return the scheduled kickoff of GAME as seconds since the epoch.
+    """
+    return calendar.timegm(
+        datetime.strptime(
+            game['scheduled'], '%Y-%m-%dT%H:%M:%S+00:00'
+        ).timetuple()
+    )
+
+
+def schedule_team(game, side):
+    """
+    Return the normalized name of the team on SIDE ('home' or 'away') of
+    GAME, e.g. 'patriots' for 'New England Patriots'.
+    """
+    return game[side]['name'].split()[-1].lower()
+
+
+def build_kickoff_index(games):
+    """
+    Index the week's GAMES by team. Returns a dictionary mapping each
+    normalized team name that plays this week to a dictionary with the
+    SportRadar `game` ID, the `kickoff` time in seconds since the epoch, and
+    the `side` ('home' or 'away') the team plays on.
+    """
+    kickoffs = {}
+    for game in games:
+        kickoff = kickoff_time(game)
+        for side in ('home', 'away'):
+            kickoffs[schedule_team(game, side)] = {
+                'game': game['id'],
+                'kickoff': kickoff,
+                'side': side
+            }
+
+    return kickoffs
+
+
+def schedule_ttl(games, kickoffs, now):
+    """
+    Return how long (in seconds) a schedule with the given GAMES and their
+    KICKOFFS index, fetched at NOW, can be served before it must be
+    refreshed. Completed weeks barely change, while weeks with games on the
+    day need fresh statuses and scores.
+    """
+    if all(game.get('status') == 'closed' for game in games):
+        return schedule_ttl_final
+
+    open_games = set(
+        game['id'] for game in games if game.get('status') != 'closed'
+    )
+    for team in kickoffs:
+        kickoff = kickoffs[team]['kickoff']
+        if (
+            kickoffs[team]['game'] in open_games and
+            kickoff - 12 * 3600 <= now <= kickoff + 6 * 3600
+        ):
+            return schedule_ttl_game_day
+
+    return schedule_ttl_default
+
+
+def _schedule_key(week_num):
+    return '{:}-REG-{:}'.format(season_year, week_num)
+
+
+def _load_shared_schedule(week_num):
+    """
+    Return the cache entry for WEEK_NUM from the shared schedule table, or
+    None if there is no shared tier or no entry.
+    """
+    if schedule_cache_table is None:
+        return None
+
+    try:
+        response = get_table(schedule_cache_table).get_item(
+            Key={'scheduleKey': _schedule_key(week_num)}
+        )
+    except Exception:
+        logger.exception("Unable to read shared schedule for week %s",
+                         week_num)
+        return None
+
+    if 'Item' not in response:
+        return None
+
+    item = response['Item']
+    games = json.loads(item['games'])
+    if 'kickoffs' in item:
+        kickoffs = json.loads(item['kickoffs'])
+    else:
+        kickoffs = build_kickoff_index(games)
+
+    return {
+        'games': games,
+        'kickoffs': kickoffs,
+        'fetched': int(item['fetchedAt']),
+        'expires': int(item['expiresAt'])
+    }
+
+
+def _store_shared_schedule(week_num, entry):
+    if schedule_cache_table is None:
+        return
+
+    try:
+        get_table(schedule_cache_table).put_item(
+            Item={
+                'scheduleKey': _schedule_key(week_num),
+                'games': json.dumps(entry['games'], separators=(',', ':')),
+                'kickoffs': json.dumps(
+                    entry['kickoffs'], separators=(',', ':')
+                ),
+                'fetchedAt': int(entry['fetched']),
+                'expiresAt': int(entry['expires'])
+            }
+        )
+    except Exception:
+        logger.exception("Unable to write shared schedule for week %s",
+                         week_num)
+
+
+def compact_game(game):
+    """
+    Return a copy of the SportRadar GAME with only the fields the bot reads:
+    `id`, `status`, `scheduled`, the `name` of the `home` and `away` teams
+    and, once the game has one, the `scoring`.
+    """
+    compact = {
+        'id': game['id'],
+        'status': game.get('status'),
+        'scheduled': game['scheduled'],
+        'home': {'name': game['home']['name']},
+        'away': {'name': game['away']['name']}
+    }
+    if 'scoring' in game:
+        compact['scoring'] = {
+            'home_points': game['scoring'].get('home_points'),
+            'away_points': game['scoring'].get('away_points')
+        }
+
+    return compact
+
+
+def schedule_digest(games):
+    """
+    Return a short fingerprint of the compact GAMES of a week, which changes
+    whenever anything the bot reads from them does.
+    """
+    encoded = json.dumps(games, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+def _snapshot_key():
+    return '{:}-REG'.format(season_year)
+
+
+def load_schedule_snapshot():
+    """
+    Return the season snapshot written by `warm_schedule_snapshot`, or None
+    if there is none. The snapshot is a dictionary with the `season`, the
+    time it was `fetched` and the `weeks`, keyed by week number as a
+    string, each with the week's compact `games`, their `kickoffs` index and
+    their `digest`.
+    """
+    try:
+        if schedule_snapshot_file is not None:
+            if not os.path.exists(schedule_snapshot_file):
+                return None
+            with open(schedule_snapshot_file, 'rb') as f:
+                blob = f.read()
+        elif schedule_cache_table is not None:
+            response = get_table(schedule_cache_table).get_item(
+                Key={'scheduleKey': _snapshot_key()}
+            )
+            if 'Item' not in response:
+                return None
+            blob = response['Item']['snapshot'].value
+        else:
+            return None
+
+        return json.loads(zlib.decompress(blob).decode('utf-8'))
+    except Exception:
+        logger.exception("Unable to read the schedule snapshot")
+        return None
+
+
+def store_schedule_snapshot(snapshot):
+    """
+    Write SNAPSHOT (see `load_schedule_snapshot`) as compressed JSON to the
+    snapshot file or the shared schedule table. Returns the size written in
+    bytes, or None if there is nowhere to write it.
+    """
+    blob = zlib.compress(
+        json.dumps(snapshot, separators=(',', ':')).encode('utf-8')
+    )
+
+    if schedule_snapshot_file is not None:
+        # Readers never see a half written file
+        partial = schedule_snapshot_file + '.partial'
+        with open(partial, 'wb') as f:
+            f.write(blob)
+        os.rename(partial, schedule_snapshot_file)
+    elif schedule_cache_table is not None:
+        get_table(schedule_cache_table).put_item(
+            Item={
+                'scheduleKey': _snapshot_key(),
+                'snapshot': Binary(blob),
+                'fetchedAt': int(snapshot['fetched'])
+            }
+        )
+    else:
+        return None
+
+    return len(blob)
+
+
+@metrics.timed('warm')
+def warm_schedule_snapshot(full=False):
+    """
+    Bring the season snapshot up to date with SportRadar. Weeks whose games
+    were all closed in the last snapshot can't change, so they are kept
+    without fetching them unless FULL is set. The snapshot is only rewritten
+    if the content of a week changed. Returns a report of the weeks
+    `fetched` and `changed`, those that `failed` to fetch (and were kept as
+    they were), and the `bytes` written (None if nothing was written).
+    """
+    previous = load_schedule_snapshot()
+    if previous is None or previous.get('season') != season_year:
+        previous = {'weeks': {}}
+
+    weeks = dict(previous['weeks'])
+    report = {
+        'season': season_year, 'fetched': [], 'changed': [], 'failed': [],
+        'bytes': None
+    }
+    for week_num in range(1, season_weeks + 1):
+        week = weeks.get(str(week_num))
+        if (
+            not full and week is not None and
+            all(game['status'] == 'closed' for game in week['games'])
+        ):
+            continue
+
+        try:
+            games = [compact_game(game) for game in fetch_schedule(week_num)]
+        except Exception:
+            logger.exception("Unable to fetch the schedule for week %s",
+                             week_num)
+            report['failed'].append(week_num)
+            continue
+        report['fetched'].append(week_num)
+
+        digest = schedule_digest(games)
+        if week is not None and week['digest'] == digest:
+            continue
+
+        weeks[str(week_num)] = {
+            'games': games,
+            'kickoffs': build_kickoff_index(games),
+            'digest': digest
+        }
+        report['changed'].append(week_num)
+
+    if report['changed']:
+        report['bytes'] = store_schedule_snapshot({
+            'season': season_year,
+            'fetched': time.time(),
+            'weeks': weeks
+        })
+
+    return report
+
+
+def _snapshot_entry(week_num, now):
+    """
+    Return a cache entry for WEEK_NUM from the season snapshot, or None if
+    the snapshot doesn't have the week. This container's copy of the
+    snapshot is re-read once it is `schedule_snapshot_ttl` seconds old, and
+    entries from it are cached locally until then.
+    """
+    if now - _schedule_snapshot.get('read', 0) > schedule_snapshot_ttl:
+        snapshot = load_schedule_snapshot()
+        with _schedule_lock:
+            _schedule_snapshot['snapshot'] = snapshot
+            _schedule_snapshot['read'] = now
+
+    snapshot = _schedule_snapshot['snapshot']
+    if snapshot is None or snapshot.get('season') != season_year:
+        return None
+
+    week = snapshot['weeks'].get(str(week_num))
+    if week is None:
+        return None
+
+    return {
+        'games': week['games'],
+        'kickoffs': week['kickoffs'],
+        'fetched': snapshot['fetched'],
+        'expires': _schedule_snapshot['read'] + schedule_snapshot_ttl
+    }
+
+
+def refresh_schedule(week_num):
+    """
+    Fetch the schedule for WEEK_NUM from SportRadar, build its kickoff index
+    and store both in both cache tiers. Returns the new cache entry.
+    """
+    games = fetch_schedule(week_num)
+    kickoffs = build_kickoff_index(games)
+    now = time.time()
+    entry = {
+        'games': games,
+        'kickoffs': kickoffs,
+        'fetched': now,
+        'expires': now + schedule_ttl(games, kickoffs, now)
+    }
+
+    with _schedule_lock:
+        _schedule_cache[week_num] = entry
+    _store_shared_schedule(week_num, entry)
+
+    return entry
+
+
+def _refresh_schedule_in_background(week_num):
+    with _schedule_lock:
+        if week_num in _schedule_refreshing:
+            return
+        _schedule_refreshing.add(week_num)
+
+    def target():
+        try:
+            refresh_schedule(week_num)
+        except Exception:
+            schedule_cache_stats['errors'] += 1
+            logger.exception("Background schedule refresh failed for week %s",
+                             week_num)
+        finally:
+            with _schedule_lock:
+                _schedule_refreshing.discard(week_num)
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+
+
+@metrics.timed('schedule')
+def get_schedule_entry(week_num, max_age=None):
+    """
+    Return the schedule cache entry for WEEK_NUM, a dictionary with the
+    `games` (see `get_schedule`), their `kickoffs` index (see
+    `build_kickoff_index`) and the `fetched` and `expires` times.
+
+    Entries are cached in this container and in the shared schedule table
+    (if configured) until their TTL runs out. After that, the week is taken
+    from the season snapshot kept by `schedule_warmer_handler`, if there is
+    one, so user requests don't wait on SportRadar. Otherwise entries up to
+    `schedule_stale_grace` seconds past their TTL are served while a
+    background refresh runs. Pass MAX_AGE (in seconds) to refuse entries
+    fetched longer ago than that.
+    """
+    now = time.time()
+
+    entry = _schedule_cache.get(week_num)
+    source = 'hits'
+    if entry is None:
+        entry = _load_shared_schedule(week_num)
+        source = 'shared_hits'
+        if entry is not None:
+            with _schedule_lock:
+                _schedule_cache[week_num] = entry
+
+    if entry is not None and max_age is not None:
+        if now - entry['fetched'] > max_age:
+            entry = None
+
+    if entry is not None and now < entry['expires']:
+        schedule_cache_stats[source] += 1
+        return entry
+
+    snapshot = _snapshot_entry(week_num, now)
+    if snapshot is not None and (
+        max_age is None or now - snapshot['fetched'] <= max_age
+    ):
+        schedule_cache_stats['snapshot_hits'] += 1
+        with _schedule_lock:
+            _schedule_cache[week_num] = snapshot
+        return snapshot
+
+    if entry is not None and now < entry['expires'] + schedule_stale_grace:
+        schedule_cache_stats['stale'] += 1
+        _refresh_schedule_in_background(week_num)
+        return entry
+
+    schedule_cache_stats['misses'] += 1
+    logger.info("Schedule cache miss for week %s (%s)", week_num,
+                schedule_cache_stats)
+    try:
+        entry = refresh_schedule(week_num)
+    except Exception:
+        schedule_cache_stats['errors'] += 1
+        stale = _schedule_cache.get(week_num)
+        if stale is None:
+            # However old the season snapshot's copy is, it beats nothing
+            stale = _snapshot_entry(week_num, now)
+        if stale is None:
+            raise
+        logger.exception("Serving stale schedule for week %s", week_num)
+        return stale
+
+    return entry
+
+
+def get_schedule(week_num, max_age=None):
+    """
+    Get the scheduled games for the given WEEK_NUM. Returns a list of
+    games as dicts, each having a key `scheduled` indicating when the game
+    is scheduled to start as a datetime string of format
+    '%Y-%m-%dT%H:%M:%S+00:00', and a 'home' and 'away' team listing,
+    each dicts with a key 'name' that gives the names of the home and away
+    teams. Schedules are cached, see `get_schedule_entry` for MAX_AGE.
+    """
+    return get_schedule_entry(week_num, max_age)['games']
+
+
+def get_kickoff_index(week_num, max_age=None):
+    """
+    Get the kickoff index (see `build_kickoff_index`) for WEEK_NUM. It is
+    built when the schedule is fetched and cached along with it, see
+    `get_schedule_entry` for MAX_AGE.
+    """
+    return get_schedule_entry(week_num, max_age)['kickoffs']
+
+
+def pick_problem(team, kickoffs, now):
+    """
+    Check whether TEAM can be picked at NOW (seconds since the epoch), given
+    the week's KICKOFFS index. Returns the `respond` arguments explaining why
+    not, or None if the pick is allowed. Whether the user's current pick can
+    still be changed, and whether they have used TEAM before, are checked by
+    `submit_pick`.
+    """
+    if team not in kickoffs:
+        return {
+            'response_text': (
+                ":no_good: The {:} aren't playing this week. "
+                "Try again.".format(team.capitalize())
+            )
+        }
+
+    if now >= kickoffs[team]['kickoff']:
+        return {
+            'response_text': (
+                ":thumbsdown: The {:} game has started. "
+                "You can't pick them now, cheater!".format(team.capitalize())
+            )
+        }
+
+    return None
+
+
+def locked_pick_message(standing_team):
+    """
+    Return the `respond` arguments for a pick that can't be changed because
+    the STANDING_TEAM game has kicked off.
+    """
+    return {
+        'response_text': (
+            ":thumbsdown: The {:} game has started. "
+            "You can't change your pick now, cheater!".format(
+                standing_team.capitalize()
+            )
+        )
+    }
+
+
+def team_used_message(team, week):
+    """
+    Return the `respond` arguments for a TEAM already picked in WEEK.
+    """
+    return {
+        'response_text': (
+            ":no_good: You already picked {:} in week {:}. "
+            "Try again.".format(team.capitalize(), week)
+        )
+    }
+
+
+def update_result(row, outcome):
+    """
+    For a given OpenPick ROW, set the `teamWon` field based on the boolean
+    OUTCOME, which is True if the selected team won, and add the result to
+    the user's standings aggregate. Both are written in one transaction, so
+    a result is never recorded on the pick without being counted. Picks that
+    already have a result are left alone, so settling twice is harmless.
+    Returns True if the result was recorded.
+    """
+    # Each pick is settled once, so adding its bit sets it
+    won_week = 0
+    if outcome and 1 <= row.weekNumber <= season_weeks:
+        won_week = 1 << int(row.weekNumber - 1)
+
+    settle = {
+        'TableName': picks_table_name,
+        'Key': pick_key(row.leagueId, row.userId, row.weekNumber),
+        'UpdateExpression': 'SET teamWon = :won REMOVE openWeek',
+        'ConditionExpression': (
+            'attribute_exists(playerId) AND attribute_not_exists(teamWon)'
+        ),
+        'ExpressionAttributeValues': {':won': 1 if outcome else 0}
+    }
+    count = {
+        'TableName': standings_table_name,
+        'Key': standings_key(row.leagueId, row.userId),
+        'UpdateExpression': (
+            'ADD wins :won, losses :lost, wonWeeks :bit SET lastWeek = :week'
+        ),
+        'ExpressionAttributeValues': {
+            ':won': 1 if outcome else 0,
+            ':lost': 0 if outcome else 1,
+            ':bit': won_week,
+            ':week': row.weekNumber
+        }
+    }
+
+    client = dynamo.meta.client
+    try:
+        client.transact_write_items(
+            TransactItems=[{'Update': settle}, {'Update': count}]
+        )
+    except client.exceptions.TransactionCanceledException as e:
+        codes = [
+            reason.get('Code')
+            for reason in e.response.get('CancellationReasons', [])
+        ]
+        if codes and codes[0] != 'ConditionalCheckFailed':
+            raise
+        logger.info("Pick for %s in %s in week %s was already settled",
+                    row.userId, row.leagueId, row.weekNumber)
+        return False
+
+    item_cache.invalidate(
+        ('record', row.leagueId, row.userId),
+        ('summary', row.leagueId, row.userId)
+    )
+
+    return True
+
+
+def index_games(games):
+    """
+    Index GAMES by SportRadar game ID. Games that are not closed map to None.
+    Closed games map to a dictionary with booleans `home` and `away`, True
+    if that side won (both False for a tie).
+    """
+    index = {}
+    for game in games:
+        if game['status'] != 'closed':
+            index[game['id']] = None
+            continue
+
+        home_points = game['scoring']['home_points']
+        away_points = game['scoring']['away_points']
+        index[game['id']] = {
+            'home': home_points > away_points,
+            'away': away_points > home_points
+        }
+
+    return index
+
+
+def pick_outcome(pick, game_index, kickoffs):
+    """
+    Return True or False if the OpenPick PICK can be settled as a win or a
+    loss from the GAME_INDEX built by `index_games` and the week's KICKOFFS
+    index, or None if its game has not finished. Raises KeyError if the
+    pick's game is not in the index.
+    """
+    result = game_index[pick.sportRadarGameID]
+    if result is None:
+        return None
+
+    side = kickoffs.get(pick.selectedTeam, {}).get('side', 'away')
+    return result[side]
+
+
+@metrics.timed('settle')
+def settle_picks(picks, game_index, kickoffs, pool):
+    """
+    Settle the stream of open PICKS against GAME_INDEX and the KICKOFFS
+    index, writing results in
+    batches of `settlement_batch_size` concurrent conditional updates on the
+    thread POOL. Returns a report with the number of picks settled, skipped
+    (not from this week's games, or already settled) and left pending, and
+    the seconds spent reading, matching and writing.
+    """
+    report = {
+        'settled': 0, 'skipped': 0, 'pending': 0,
+        'read_seconds': 0.0, 'match_seconds': 0.0, 'write_seconds': 0.0
+    }
+
+    def write(batch):
+        start = time.time()
+        recorded = pool.map(lambda args: update_result(*args), batch)
+        report['settled'] += sum(1 for r in recorded if r)
+        report['skipped'] += sum(1 for r in recorded if not r)
+        report['write_seconds'] += time.time() - start
+
+    batch = []
+    picks = iter(picks)
+    while True:
+        start = time.time()
+        pick = next(picks, None)
+        report['read_seconds'] += time.time() - start
+        if pick is None:
+            break
+
+        start = time.time()
+        try:
+            outcome = pick_outcome(pick, game_index, kickoffs)
+        except KeyError:
+            report['skipped'] += 1
+        else:
+            if outcome is None:
+                report['pending'] += 1
+            else:
+                batch.append((pick, outcome))
+        report['match_seconds'] += time.time() - start
+
+        if len(batch) >= settlement_batch_size:
+            write(batch)
+            batch = []
+
+    if batch:
+        write(batch)
+
+    return report
+
+
+def post_to_slack(url, body, token=None):
+    """
+    POST the JSON BODY to the Slack URL, a webhook or, with the bot TOKEN, a
+    Web API method. A 429 pauses every sender until its Retry-After has
+    passed, and the post is retried up to `reminder_attempts` times. Returns
+    True if Slack accepted the post.
+    """
+    headers = {'Content-Type': 'application/json; charset=utf-8'}
+    if token is not None:
+        headers['Authorization'] = 'Bearer ' + token
+
+    for attempt in range(reminder_attempts):
+        wait = _slack_pause['until'] - time.time()
+        if wait > 0:
+            time.sleep(wait)
+
+        try:
+            response = get_http_session().post(
+                url, json=body, headers=headers, timeout=http_timeout
+            )
+        except Exception:
+            logger.exception("Post to Slack failed")
+            return False
+
+        if response.status_code == 429:
+            try:
+                delay = float(response.headers['Retry-After'])
+            except (KeyError, ValueError):
+                delay = reminder_backoff * 2 ** attempt
+            with _slack_pause_lock:
+                _slack_pause['until'] = max(
+                    _slack_pause['until'], time.time() + delay
+                )
+            logger.warning("Rate limited by Slack, pausing for %.1fs", delay)
+            continue
+
+        if response.status_code >= 400:
+            logger.error("Slack refused a post (%s): %s",
+                         response.status_code, response.text)
+            return False
+        if token is not None and not response.json().get('ok'):
+            # The Web API reports errors in the body
+            logger.error("Slack refused a post: %s", response.text)
+            return False
+        return True
+
+    logger.error("Gave up on a post to Slack after %s attempts",
+                 reminder_attempts)
+    return False
+
+
+def status_rank(status):
+    """
+    Return the place of the game STATUS in `game_statuses`.
+    """
+    if status in game_statuses:
+        return game_statuses.index(status)
+    return 0
+
+
+def read_game_marks(game_ids):
+    """
+    Read the live settlement high-water marks of GAME_IDS. Returns a
+    dictionary of game ID to mark, for the games that have one.
+    """
+    marks = {}
+    request = {
+        live_games_table_name: {
+            'Keys': [{'gameId': game_id} for game_id in game_ids],
+            'ConsistentRead': True
+        }
+    }
+    while request:
+        response = dynamo.batch_get_item(RequestItems=request)
+        for item in response['Responses'].get(live_games_table_name, []):
+            marks[item['gameId']] = item
+        request = response.get('UnprocessedKeys')
+
+    return marks
+
+
+def store_game_mark(game_id, week_num, status, etag, settled):
+    """
+    Raise the high-water mark of GAME_ID in WEEK_NUM to STATUS, with the
+    feed's ETAG, and mark its picks SETTLED once they are. A mark never moves
+    back, so a slow run can't undo a later one.
+    """
+    values = {
+        ':week': week_num,
+        ':status': status,
+        ':rank': status_rank(status),
+        ':settled': settled
+    }
+    update = (
+        'SET weekNumber = :week, gameStatus = :status, '
+        'statusRank = :rank, settled = :settled'
+    )
+    if etag is not None:
+        update += ', etag = :etag'
+        values[':etag'] = etag
+
+    table = get_table(live_games_table_name)
+    try:
+        table.update_item(
+            Key={'gameId': game_id},
+            UpdateExpression=update,
+            ConditionExpression=(
+                'attribute_not_exists(gameId) OR '
+                '(statusRank <= :rank AND settled = :false)'
+            ),
+            ExpressionAttributeValues=dict(values, **{':false': False})
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info("Mark for game %s is already past %s", game_id, status)
+
+
+@metrics.timed('live')
+def settle_live_games(week_num, pool):
+    """
+    Settle the picks on WEEK_NUM's games that have closed since the last
+    run. Only games that have kicked off and aren't settled yet are polled,
+    with conditional requests on the thread POOL, so a run costs one small
+    request per live game, and nothing for games whose feed hasn't changed.
+    Picks are settled as soon as their game is `closed`, then the game's
+    mark is raised so it is never polled again. Returns a report of the
+    games polled, unchanged, failed and closed, and of the picks settled,
+    skipped and left pending.
+    """
+    report = {
+        'polled': 0, 'unchanged': 0, 'failed': 0, 'closed': 0,
+        'settled': 0, 'skipped': 0, 'pending': 0
+    }
+
+    schedule = get_schedule_entry(week_num)
+    now = time.time()
+    started = set(
+        entry['game'] for entry in schedule['kickoffs'].values()
+        if entry['kickoff'] <= now
+    )
+    if not started:
+        return report
+
+    marks = read_game_marks(started)
+    live = [
+        game_id for game_id in sorted(started)
+        if not marks.get(game_id, {}).get('settled')
+    ]
+
+    # Statuses only move forward, so a game closed in the cached schedule
+    # doesn't need polling
+    closed = [
+        game for game in schedule['games']
+        if game['id'] in live and game.get('status') == 'closed'
+    ]
+    closed_ids = set(game['id'] for game in closed)
+    to_poll = [game_id for game_id in live if game_id not in closed_ids]
+
+    def poll(game_id):
+        etag = marks.get(game_id, {}).get('etag')
+        try:
+            return fetch_game(game_id, etag)
+        except Exception:
+            logger.exception("Polling game %s failed", game_id)
+            return False, etag
+
+    polled = {}
+    for game_id, (game, etag) in zip(to_poll, pool.map(poll, to_poll)):
+        report['polled'] += 1
+        if game is None:
+            report['unchanged'] += 1
+        elif game is False:
+            report['failed'] += 1
+        else:
+            polled[game_id] = (game['status'], etag)
+            if game['status'] == 'closed':
+                closed.append(game)
+
+    if closed:
+        game_index = index_games(closed)
+        picks = (
+            pick for pick in get_open_picks(week_num)
+            if pick.sportRadarGameID in game_index
+        )
+        settled = settle_picks(picks, game_index, schedule['kickoffs'], pool)
+        for key in ('settled', 'skipped', 'pending'):
+            report[key] += settled[key]
+        report['closed'] = len(closed)
+
+    # Marks are only raised once the picks are settled, so a failed run
+    # leaves its games to be polled and settled again
+    for game in closed:
+        status, etag = polled.get(game['id'], ('closed', None))
+        store_game_mark(game['id'], week_num, status, etag, True)
+    for game_id, (status, etag) in polled.items():
+        if status != 'closed':
+            store_game_mark(game_id, week_num, status, etag, False)
+
+    return report
+
+
+def standings_message(league, week_num, max_age=None):
+    """
+    Return the `respond` arguments for the `standings` subcommand in LEAGUE
+    in week WEEK_NUM. MAX_AGE is passed through to `get_standings`.
+    """
+    standings = get_standings(league, max_age=max_age)
+
+    standings_string = '`{:<10} {:>5}`\n'.format('Name', 'Wins')
+    standings_string += '`' + "-"*16 + '`'
+    for row in standings:
+        standings_string += '\n`{:<10} {:>5}`'.format(
+            row['name'], row['wins']
+        )
+
+    return {
+        'response_text': 'Standings as of week {:}'.format(week_num),
+        'attachment_text': standings_string,
+        'in_channel': True
+    }
+
+
+def record_message(league, user_id, week_num, consistent=False):
+    """
+    Return the `respond` arguments for the `record` subcommand for user
+    USER_ID in LEAGUE in week WEEK_NUM. The record comes from the user's
+    summary, unless they have gifted wins, which it doesn't hold. CONSISTENT
+    is passed through to the reads.
+    """
+    summary = read_summary(league, user_id, consistent=consistent)
+    if int(summary.wins or 0) == bin(int(summary.wonWeeks or 0)).count('1'):
+        record = summary_record(summary, week_num)
+    else:
+        record = get_user_record(
+            league, user_id, week_num, consistent=consistent
+        )
+
+    wins = sum(r.teamWon for r in record if r.teamWon is not None)
+    # We occassionally gift wins, which are added at negative week number
+    actual_wins = sum(
+        r.teamWon for r in record
+        if r.teamWon is not None and r.weekNumber > 0
+    )
+    losses = week_num - 1 - actual_wins
+
+    record_string = "`{:<10} {:<16} {:<10}`\n".format(
+        'Week', 'Team', 'Result'
+        )
+    record_string += "`" + "-"*38 + "`"
+    for r in record:
+        record_string += "\n`{:<10} {:<16} {:<10}`".format(
+            r.weekNumber, r.selectedTeam.capitalize(),
+            'Win' if r.teamWon is not None and r.teamWon > 0 else 'Loss'
+        )
+
+    return {
+        'response_text': "Your record: {:} wins, {:} losses".format(
+            wins, losses
+        ),
+        'attachment_text': record_string
+    }
+
+
+def who_message(league, week_num, consistent=False):
+    """
+    Return the `respond` arguments for the `who` subcommand in LEAGUE in week
+    WEEK_NUM. CONSISTENT is passed through to `get_who_picked`.
+    """
+    users = get_who_picked(league, week_num, consistent=consistent)
+
+    return {
+        'response_text':
             'Here are the people that have picked so far this week.',
-            attachment_text="\n".join(users)
+        'attachment_text': "\n".join(users)
+    }
+
+
+def odds_message(league, week_num):
+    """
+    Return the `respond` arguments for the `odds` subcommand in LEAGUE in
+    week WEEK_NUM.
+    """
+    if week_num > season_weeks:
+        return season_over_message()
+
+    try:
+        chances, simulated = get_season_odds(league, week_num)
+    except ImportError:
+        logger.exception("Odds need NumPy")
+        return {
+            'response_text':
+                ":crystal_ball: Sorry, odds aren't available right now."
+        }
+    except ScheduleUnavailable as e:
+        logger.error("No snapshot of week %s's schedule for the odds", e.week)
+        return {
+            'response_text': (
+                ":crystal_ball: Sorry, the season's schedule isn't loaded "
+                "yet. Try again later."
+            )
+        }
+
+    odds_string = '`{:<10} {:>7}`\n'.format('Name', 'Odds')
+    odds_string += '`' + "-"*18 + '`'
+    for name, chance in chances:
+        odds_string += '\n`{:<10} {:>7.1%}`'.format(name, chance)
+
+    return {
+        'response_text': (
+            'Chances of finishing first, from {:,} simulations of weeks {:} '
+            'to {:}'.format(simulated, week_num, season_weeks)
+        ),
+        'attachment_text': odds_string,
+        'in_channel': True
+    }
+
+
+def current_pick_message(standing_team):
+    """
+    Return the `respond` arguments for reporting the user's STANDING_TEAM
+    (None if they haven't picked) for `pick` without a team.
+    """
+    if standing_team is None:
+        return {
+            'response_text':
+                ":persevere: You haven't picked a team this week. " +
+                "Try `/pickem pick [team name]`."
+        }
+
+    return {
+        'response_text': "You've picked {:} for this week. Good luck!".format(
+            standing_team.capitalize()
+        )
+    }
+
+
+def season_over_message():
+    """
+    Return the `respond` arguments for a pick made after the season.
+    """
+    return {
+        'response_text': (
+            "The {:} season has ended. Thanks for playing!".format(season_year)
         )
+    }
+
+
+def reminder_message(week_num, players):
+    """
+    Return the webhook body reminding PLAYERS, as PlayerRows, to pick for
+    WEEK_NUM.
+    """
+    return {
+        'text': (
+            "It's that time! " +
+            "Don't forget to make your pick for week {:}! :football:".format(
+                week_num
+            )
+        ),
+        'attachments': [{
+            'text': 'Still to pick: ' + ', '.join(
+                '<@{:}>'.format(player.userId) for player in players
+            ),
+            'mrkdwn_in': ['text']
+        }]
+    }
+
+
+def reminder_dm(week_num, player, kickoffs, now):
+    """
+    Return the `chat.postMessage` body reminding PLAYER, a PlayerRow, to
+    pick for WEEK_NUM, listing the teams they haven't used that are playing
+    in KICKOFFS and haven't kicked off at NOW.
+    """
+    used = int(player.usedTeams or 0)
+    teams = sorted(
+        team.capitalize() for team, game in kickoffs.items()
+        if team in team_positions and
+        not used & (1 << team_positions[team]) and
+        now < game['kickoff']
+    )
 
+    text = "You haven't picked for week {:} yet. ".format(week_num)
+    if teams:
+        text += "Teams you can still pick: " + ', '.join(teams) + '.'
     else:
-        return respond(
-            ":persevere: Invalid command! " +
-            help_text, help_attachment_text
+        text += "None of your unused teams are left to play this week."
+    text += " Try `/pickem pick [team name]`."
+
+    return {'channel': player.userId, 'text': text}
+
+
+def pick_message(league, user_id, user_name, week_num, options):
+    """
+    Make the pick given in OPTIONS for USER_ID (USER_NAME) in LEAGUE in week
+    WEEK_NUM, or report their current pick if OPTIONS is blank. Returns the
+    `respond` arguments.
+    """
+    if week_num > season_weeks:
+        return season_over_message()
+
+    try:
+        team = get_team(options)
+    except UnknownTeam:
+        return {
+            'response_text':
+                ":confused: Sorry, I don't know that team. Try again."
+        }
+    except NoTeamGiven:
+        # Just report the current pick if there is one
+        return current_pick_message(
+            get_current_pick(league, user_id, week_num)
         )
 
+    # Neither read needs the other, so they are made at the same time. A
+    # failed read raises ConcurrentCallFailed, which names it.
+    reads = run_concurrently({
+        'kickoffs': lambda: get_kickoff_index(week_num),
+        'summary': lambda: read_summary(league, user_id, consistent=True)
+    })
+
+    kickoffs = reads['kickoffs']
+    problem = pick_problem(team, kickoffs, time.time())
+    if problem is not None:
+        return problem
+
+    try:
+        submit_pick(
+            league, user_id, week_num, team, user_name, kickoffs,
+            summary=reads['summary']
+        )
+    except PickLocked as e:
+        return locked_pick_message(e.team)
+    except TeamAlreadyPicked as e:
+        return team_used_message(e.team, e.week)
+
+    return {
+        'response_text': (
+            ":ok_hand: {:} has picked the {:} for week {:}".format(
+                user_name, team.capitalize(), week_num
+            )
+        ),
+    }
 
-def worker_handler(event, context):
+
+def inline_message(subcommand, options, league, user_id):
+    """
+    Return the `respond` arguments for read-only subcommands that the
+    receptionist can answer for USER_ID in LEAGUE without handing off to the
+    worker, or None if SUBCOMMAND (with OPTIONS) has to go through the
+    worker. Each of these costs at most one small DynamoDB read. Picks are
+    written by the worker, whose writes never reach this container's
+    `item_cache`, so everything but the standings (which allow
+    `standings_cache_ttl` seconds) is read past it.
+    """
+    week_num = get_current_week()
+
+    if subcommand == 'standings':
+        return standings_message(
+            league, week_num, max_age=standings_cache_ttl
+        )
+    elif subcommand == 'record':
+        return record_message(league, user_id, week_num, consistent=True)
+    elif subcommand == 'who':
+        return who_message(league, week_num, consistent=True)
+    elif subcommand == 'pick' and week_num > season_weeks:
+        return season_over_message()
+    elif subcommand == 'pick' and len(options) == 0:
+        return current_pick_message(
+            get_current_pick(league, user_id, week_num, consistent=True)
+        )
+
+    return None
+
+
+@metrics.handler('pickem')
+def pickem_handler(event, context):
     """
     Handles the requests from the `/pickem` command to the lambda function
     that is responsible for handling API requests.
     """
     ## Uncomment this when I trigger from SNS
-    params = json.loads(event['Records'][0]['Sns']['Message'])
+    params = parse_qs(event['body'])
 
     token = params['token'][0]
     if token != slack_token:
         logger.error("Request token (%s) does not match expected", token)
-        raise Exception('Invalid request token!')
+        return respond('Invalid request token', is_error=True)
 
     user_name = params['user_name'][0]
     user_id = params['user_id'][0]
@@ -658,179 +2637,191 @@ def worker_handler(event, context):
     channel = params['channel_name'][0]
     command_text = params['text'][0]
     response_url = params['response_url'][0]
+    league = league_key(params['team_id'][0], params['channel_id'][0])
 
     subcommand = parse_subcommand(command_text)
     options = parse_options(command_text)
+    metrics.tag('subcommand', subcommand_tag(subcommand))
 
     week_num = get_current_week()
 
     if subcommand == 'help':
         """Return a help message."""
-        return respond(help_text, help_attachment_text,
-                       response_url=response_url)
+        return respond(help_text, help_attachment_text)
 
     elif subcommand == 'standings':
         """Returns standings in channel for everyone to see."""
-        standings = get_standings()
+        return respond(**standings_message(league, week_num))
 
-        standings_string = '`{:<10} {:>5}`\n'.format('Name', 'Wins')
-        standings_string += '`' + "-"*16 + '`'
-        for row in standings:
-            standings_string += '\n`{:<10} {:>5}`'.format(
-                row['name'], row['wins']
-            )
+    elif subcommand == 'record':
+        return respond(**record_message(league, user_id, week_num))
 
+    elif subcommand == 'pick':
         return respond(
-            'Standings as of week {:}'.format(week_num),
-            standings_string,
-            in_channel=True, response_url=response_url
+            **pick_message(league, user_id, user_name, week_num, options)
         )
 
-    elif subcommand == 'record':
-        record = get_user_record(user_id, week_num)
-
-        wins = sum(r['teamWon'] for r in record if 'teamWon' in r)
-        # We occassionally gift wins, which are added at negative week number
-        actual_wins = sum(
-            r['teamWon'] for r in record
-            if 'teamWon' in r and r['weekNumber'] > 0
-        )
-        losses = week_num - 1 - actual_wins
+    elif subcommand == 'who':
+        return respond(**who_message(league, week_num))
 
-        record_string = "`{:<10} {:<16} {:<10}`\n".format(
-            'Week', 'Team', 'Result'
-            )
-        record_string += "`" + "-"*38 + "`"
-        for r in record:
-            record_string += "\n`{:<10} {:<16} {:<10}`".format(
-                r['weekNumber'], r['selectedTeam'].capitalize(),
-                'Win' if 'teamWon' in r and r['teamWon'] > 0 else 'Loss'
-            )
+    elif subcommand == 'odds':
+        return respond(**odds_message(league, week_num))
 
+    else:
         return respond(
-            "Your record: {:} wins, {:} losses".format(wins, losses),
-            record_string, response_url=response_url
+            ":persevere: Invalid command! " +
+            help_text, help_attachment_text
         )
 
-    elif subcommand == 'pick':
 
-        if week_num > 17:
-            return respond(
-                "The 2017 season has ended. Thanks for playing!",
-                response_url=response_url
-            )
+def record_body(record):
+    """
+    Return the worker message (see `receptionist.decode_message`) carried by
+    the batch RECORD, which is either an SNS notification or an SQS message.
+    SQS messages hold the message itself, or the SNS envelope when the queue
+    is subscribed to the topic without raw message delivery.
+    """
+    if 'Sns' in record:
+        return record['Sns']['Message']
 
-        # In case the user has already made a pick this week
-        standing_team = get_current_pick(user_id, week_num)
+    body = record['body']
+    if body.startswith('{'):
+        envelope = json.loads(body)
+        if envelope.get('Type') == 'Notification' and 'Message' in envelope:
+            return envelope['Message']
+    return body
 
-        try:
-            team = get_team(options)
-        except UnknownTeam:
-            return respond(
-                ":confused: Sorry, I don't know that team. Try again.",
-                response_url=response_url
-            )
-        except NoTeamGiven:
-            # Just report the current pick if there is one
-            if standing_team is None:
-                return respond(
-                    ":persevere: You haven't picked a team this week. " +
-                    "Try `/pickem pick [team name]`.",
-                    response_url=response_url
-                )
-            else:
-                return respond(
-                    "You've picked {:} for this week. Good luck!".format(
-                        standing_team.capitalize()
-                    ),
-                    response_url=response_url
-                )
 
-        record = get_user_record(user_id, week_num)
-        team_previously_chosen = False
-        previous_week = None
-        for r in record:
-            if team == r['selectedTeam']:
-                team_previously_chosen = True
-                previous_week = r['weekNumber']
+def request_fingerprint(request):
+    """
+    Return the fingerprint of the slash command REQUEST. Redeliveries of a
+    request share it, while separate commands never do, since Slack gives
+    each its own `response_url`.
+    """
+    return hashlib.sha1(
+        json.dumps(request, sort_keys=True, separators=(',', ':'))
+        .encode('utf-8')
+    ).hexdigest()
+
+
+def claim_request(fingerprint):
+    """
+    Claim the request FINGERPRINT for this invocation. Returns False if it
+    was claimed less than `dedupe_ttl` seconds ago, in this container or
+    (with a dedupe table) any other. If the table can't be reached the
+    request is handled anyway.
+    """
+    now = time.time()
+
+    with _claimed_lock:
+        # Claims expire in the order they were made
+        while _claimed_requests:
+            oldest = next(iter(_claimed_requests))
+            if _claimed_requests[oldest] > now:
                 break
+            del _claimed_requests[oldest]
+
+        if fingerprint in _claimed_requests:
+            return False
+        _claimed_requests[fingerprint] = now + dedupe_ttl
+
+    if dedupe_table is None:
+        return True
+
+    table = get_table(dedupe_table)
+    try:
+        table.put_item(
+            Item={
+                'fingerprint': fingerprint,
+                'expiresAt': int(now + dedupe_ttl)
+            },
+            ConditionExpression=(
+                'attribute_not_exists(fingerprint) OR expiresAt < :now'
+            ),
+            ExpressionAttributeValues={':now': int(now)}
+        )
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    except Exception:
+        logger.exception("Unable to claim request %s", fingerprint)
 
-        if team_previously_chosen:
-            return respond(
-                ":no_good: You already picked {:} in week {:}. " +
-                "Try again.".format(team.capitalize(), previous_week),
-                response_url=response_url
-            )
-        else:
-            games = get_schedule(week_num)
-
-            team_playing = False
-            standing_team_game_started = False
-            game_started = False
-            current_time = datetime.utcnow()
-            sr_game_id = None
-            for game in games:
-                away_team = game['away']['name'].split()[-1].lower()
-                home_team = game['home']['name'].split()[-1].lower()
-                game_time = datetime.strptime(
-                    game['scheduled'],
-                    '%Y-%m-%dT%H:%M:%S+00:00'
-                )
+    return True
 
-                if away_team == team or home_team == team:
-                    team_playing = True
-                    if current_time >= game_time:
-                        game_started = True
-                    sr_game_id = game['id']
-
-                if (
-                    standing_team is not None and
-                    (
-                        away_team == standing_team or
-                        home_team == standing_team
-                    ) and
-                    current_time >= game_time
-                ):
-                    standing_team_game_started = True
-
-            if standing_team_game_started:
-                return respond(
-                    ":thumbsdown: The {:} game has started. " +
-                    "You can't change your pick now, cheater!".format(
-                        standing_team.capitalize()
-                    ),
-                    response_url=response_url
-                )
-            elif not team_playing:
-                return respond(
-                    ":no_good: The {:} aren't playing this week. " +
-                    "Try again.".format(team.capitalize()),
-                    response_url=response_url
-                )
-            elif game_started:
-                return respond(
-                    ":thumbsdown: The {:} game has started. " +
-                    "You can't pick them now, cheater!".format(
-                        team.capitalize()
-                    ),
-                    response_url=response_url
-                )
-            else:
-                submit_pick(user_id, week_num, team, user_name, sr_game_id)
-                return respond(
-                    ":ok_hand: {:} has picked the {:} for week {:}".format(
-                        user_name, team.capitalize(), week_num
-                    ),
-                    response_url=response_url
-                )
+
+def release_request(fingerprint):
+    """
+    Give up the claim on the request FINGERPRINT, so a redelivery of it is
+    handled.
+    """
+    with _claimed_lock:
+        _claimed_requests.pop(fingerprint, None)
+
+    if dedupe_table is None:
+        return
+
+    try:
+        get_table(dedupe_table).delete_item(Key={'fingerprint': fingerprint})
+    except Exception:
+        logger.exception("Unable to release request %s", fingerprint)
+
+
+def handle_command(request):
+    """
+    Handle the slash command REQUEST handed over by the receptionist (see
+    `receptionist.decode_message`), posting the reply to its `response_url`.
+    Version 1 requests carry Slack's token, which is checked again.
+    """
+    token = request.get('token', slack_token)
+    if token != slack_token:
+        logger.error("Request token (%s) does not match expected", token)
+        raise InvalidToken('Invalid request token!')
+
+    if 'received' in request:
+        metrics.add('queue_ms', 1000 * (time.time() - request['received']))
+
+    user_name = request['user_name']
+    user_id = request['user_id']
+    command_text = request['text']
+    response_url = request['response_url']
+    league = league_key(request['team_id'], request['channel_id'])
+
+    subcommand = parse_subcommand(command_text)
+    options = parse_options(command_text)
+    metrics.tag('subcommand', subcommand_tag(subcommand))
+
+    week_num = get_current_week()
+
+    if subcommand == 'help':
+        """Return a help message."""
+        return respond(help_text, help_attachment_text,
+                       response_url=response_url)
+
+    elif subcommand == 'standings':
+        """Returns standings in channel for everyone to see."""
+        return respond(
+            response_url=response_url, **standings_message(league, week_num)
+        )
+
+    elif subcommand == 'record':
+        return respond(
+            response_url=response_url,
+            **record_message(league, user_id, week_num)
+        )
+
+    elif subcommand == 'pick':
+        return respond(
+            response_url=response_url,
+            **pick_message(league, user_id, user_name, week_num, options)
+        )
 
     elif subcommand == 'who':
-        users = get_who_picked(week_num)
+        return respond(
+            response_url=response_url, **who_message(league, week_num)
+        )
 
+    elif subcommand == 'odds':
         return respond(
-            'Here are the people that have picked so far this week.',
-            attachment_text="\n".join(users),
-            response_url=response_url
+            response_url=response_url, **odds_message(league, week_num)
         )
 
     else:
@@ -840,56 +2831,311 @@ def worker_handler(event, context):
         )
 
 
+@metrics.handler('worker')
+def worker_handler(event, context):
+    """
+    Handles the requests the receptionist hands over, one per record of the
+    SNS or SQS batch EVENT, sharing this container's caches and connections.
+    Requests already handled within `dedupe_ttl` seconds are skipped.
+
+    Returns a report of the records handled, skipped as duplicates, rejected
+    (bad token) and failed. Failed SQS records are listed in
+    `batchItemFailures` for a function with partial batch responses turned
+    on, so only they are redelivered; for SNS, the invocation fails.
+    """
+    records = event['Records']
+    report = {
+        'records': len(records),
+        'handled': 0,
+        'duplicates': 0,
+        'rejected': 0,
+        'failed': 0,
+        'batchItemFailures': []
+    }
+
+    def handle(record):
+        try:
+            request = decode_message(record_body(record))
+        except Exception:
+            logger.exception("Unable to read record %s", record)
+            return 'failed'
+
+        fingerprint = request_fingerprint(request)
+        if not claim_request(fingerprint):
+            logger.info("Skipping duplicate request %s", fingerprint)
+            return 'duplicates'
+
+        try:
+            handle_command(request)
+        except InvalidToken:
+            return 'rejected'
+        except Exception:
+            logger.exception("Request %s failed", fingerprint)
+            release_request(fingerprint)
+            return 'failed'
+
+        return 'handled'
+
+    if len(records) == 1:
+        outcomes = [handle(records[0])]
+    else:
+        pool = ThreadPool(min(worker_pool_size, len(records)))
+        try:
+            outcomes = pool.map(handle, records)
+        finally:
+            pool.close()
+        metrics.tag('subcommand', 'batch')
+
+    for record, outcome in zip(records, outcomes):
+        report[outcome] += 1
+        if outcome == 'failed' and 'messageId' in record:
+            report['batchItemFailures'].append(
+                {'itemIdentifier': record['messageId']}
+            )
+    metrics.add('records', len(records))
+    metrics.add('duplicates', report['duplicates'])
+
+    logger.info("Worker report: %s", json.dumps(report))
+
+    if report['failed'] and 'Sns' in records[0]:
+        raise Exception('{:} of {:} requests failed'.format(
+            report['failed'], len(records)
+        ))
+
+    return report
+
+
+@metrics.handler('results_update')
 def results_update_handler(event, context):
     """
     Run on a schedule to update pick results based on scores from the previous
-    week.
+    week. Returns a report of how many picks were settled, skipped and left
+    pending, and how long each stage took.
     """
     week_num = get_current_week()
 
-    if week_num > 1:
-        games = get_schedule(week_num - 1)
+    if week_num <= 1:
+        return None
+
+    # Results are only as good as the game statuses, so never settle from
+    # a snapshot older than the game day TTL.
+    start = time.time()
+    schedule = get_schedule_entry(week_num - 1, max_age=schedule_ttl_game_day)
+    schedule_seconds = time.time() - start
+
+    game_index = index_games(schedule['games'])
 
-        picks = get_open_picks()
+    pool = ThreadPool(settlement_batch_size)
+    try:
+        report = settle_picks(
+            get_open_picks(week_num - 1), game_index, schedule['kickoffs'],
+            pool
+        )
+    finally:
+        pool.close()
 
-        for pick in picks:
-            team_won = None
+    report['week'] = week_num - 1
+    report['schedule_seconds'] = schedule_seconds
+    logger.info("Settlement report: %s", json.dumps(report))
 
-            if 'sportRadarGameID' not in pick:
-                continue
+    return report
+
+
+@metrics.handler('live_results')
+def live_results_handler(event, context):
+    """
+    Run every few minutes during game windows to settle this week's picks as
+    their games close, so standings update within minutes of the final
+    whistle. The weekly `results_update_handler` still settles anything this
+    misses. Returns the report from `settle_live_games`.
+    """
+    week_num = get_current_week()
+
+    if week_num > season_weeks:
+        return None
+
+    pool = ThreadPool(settlement_batch_size)
+    try:
+        report = settle_live_games(week_num, pool)
+    finally:
+        pool.close()
 
-            for game in games:
+    report['week'] = week_num
+    logger.info("Live settlement report: %s", json.dumps(report))
 
-                home_team = game['home']['name'].split()[-1].lower()
+    return report
 
-                if pick['sportRadarGameID'] == game['id']:
-                    if not game['status'] == 'closed':
-                        break
 
-                    team_side = 'away'
-                    other_side = 'home'
-                    if pick['selectedTeam'] == home_team:
-                        team_side = 'home'
-                        other_side = 'away'
+@metrics.handler('migrate_to_leagues')
+def migrate_to_leagues_handler(event, context):
+    """
+    One-shot job that copies the picks from the legacy single league table
+    into the league of the Slack workspace and channel given as `team_id`
+    and `channel_id` in the event, and builds that league's standings from
+    them. Safe to run more than once, but run it before that league starts
+    writing, as copies overwrite.
+
+    To move a deployment that only has the legacy `pickem-picks` table:
+        1. Create `pickem-league-picks` (with its `leagueWeek-index` and
+           `openWeek-index`), `pickem-league-standings` and
+           `pickem-live-games`,
+        2. Deploy, with the slash command still disabled,
+        3. Run this job once for the channel the league plays in,
+        4. Re-enable the slash command.
+    No other migration is needed: copied picks are marked open and get
+    their standings here.
+    """
+    league = league_key(event['team_id'], event['channel_id'])
+
+    copied = migrate_to_league(league)
+    logger.info("Copied %s picks into %s and wrote %s standings",
+                copied['picks'], league, copied['standings'])
+
+    return copied
+
+
+@metrics.handler('rebuild_standings')
+def rebuild_standings_handler(event, context):
+    """
+    One-shot job that rebuilds the standings aggregates of every league from
+    the raw picks. Pass `{"dry_run": true}` to only report mismatches. After
+    a rebuild, each league's aggregate standings are checked against the
+    scan-based ones.
+    """
+    dry_run = bool(event.get('dry_run', False)) if event else False
+
+    mismatches = rebuild_standings(dry_run=dry_run)
+    for user_id, current, expected in mismatches:
+        logger.warning("Standings mismatch for %s: stored %s, expected %s",
+                       user_id, current, expected)
+
+    verified = None
+    if not dry_run:
+        expected = {}
+        for (league, user_id), row in compute_standings().items():
+            expected.setdefault(league, []).append((row['name'], row['wins']))
+
+        verified = True
+        for league in expected:
+            actual = sorted(
+                (row['name'], row['wins']) for row in get_standings(league)
+            )
+            if sorted(expected[league]) != actual:
+                logger.error("Rebuilt standings for %s do not match the raw "
+                             "picks", league)
+                verified = False
+
+    return {
+        'dryRun': dry_run,
+        'mismatches': len(mismatches),
+        'verified': verified
+    }
+
+
+@metrics.handler('schedule_warmer')
+def schedule_warmer_handler(event, context):
+    """
+    Scheduled job that keeps the season schedule snapshot up to date, so
+    user requests read schedules from it instead of waiting on SportRadar.
+    Pass `{"full": true}` to also refetch weeks that are already final.
+    """
+    full = bool(event.get('full', False)) if event else False
+
+    report = warm_schedule_snapshot(full=full)
+    logger.info("Warmed the %s schedule snapshot: %s", season_year,
+                json.dumps(report))
+
+    return report
 
-                    if (
-                        game['scoring']['{:}_points'.format(team_side)] >
-                        game['scoring']['{:}_points'.format(other_side)]
-                    ):
-                        team_won = True
-                    else:
-                        team_won = False
 
-            if team_won is not None:
-                update_result(pick, team_won)
+def league_webhook(league, event):
+    """
+    Return the webhook URL of LEAGUE's channel: `webhook_url` in the
+    reminder's EVENT, else the league's entry in `league_webhook_urls`, else
+    `webhook_url` while no league has a webhook of its own. Returns None if
+    other leagues have webhooks but this one doesn't, rather than post to
+    another league's channel.
+    """
+    if event.get('webhook_url'):
+        return event['webhook_url']
+    if league in league_webhook_urls:
+        return league_webhook_urls[league]
+    if not league_webhook_urls:
+        return webhook_url
 
+    return None
 
+
+@metrics.handler('send_reminder')
 def send_reminder_handler(event, context):
     """
-    Reminds players to make a pick.
+    Run on a schedule to remind the players who haven't picked this week in
+    the league given by `team_id` and `channel_id` in the event. If
+    `slackBotToken` is set, they are reminded in that channel with
+    `chat.postMessage` and each by direct message with the unused teams they
+    can still pick. Otherwise they are reminded through the league's webhook
+    (see `league_webhook`). Messages go out `reminder_pool_size` at a time.
+    Returns a report of the players reminded and the messages sent and
+    failed.
     """
-    return respond(
-        "It's that time! " +
-        "Don't forget to make your pick for the week! :football:",
-        in_channel=True
-    )
+    week_num = get_current_week()
+    if week_num > season_weeks:
+        return None
+
+    league = league_key(event['team_id'], event['channel_id'])
+
+    reads = {
+        'picked': lambda: get_picked_ids(league, week_num),
+        'players': lambda: get_players(league)
+    }
+    if slack_bot_token is not None:
+        reads['kickoffs'] = lambda: get_kickoff_index(week_num)
+    reads = run_concurrently(reads)
+
+    missing = [
+        player for player in reads['players']
+        if player.userId not in reads['picked']
+    ]
+
+    posts = []
+    if missing and slack_bot_token is not None:
+        message = reminder_message(week_num, missing)
+        message['channel'] = event['channel_id']
+        posts.append(
+            (slack_api_url + 'chat.postMessage', message, slack_bot_token)
+        )
+    elif missing:
+        url = league_webhook(league, event)
+        if url is None:
+            logger.error("No webhook to remind league %s through", league)
+        else:
+            posts.append((url, reminder_message(week_num, missing), None))
+    if missing and slack_bot_token is not None:
+        now = time.time()
+        posts.extend(
+            (
+                slack_api_url + 'chat.postMessage',
+                reminder_dm(week_num, player, reads['kickoffs'], now),
+                slack_bot_token
+            )
+            for player in missing
+        )
+
+    start = time.time()
+    pool = ThreadPool(reminder_pool_size)
+    try:
+        sent = pool.map(lambda args: post_to_slack(*args), posts)
+    finally:
+        pool.close()
+
+    report = {
+        'week': week_num,
+        'players': len(reads['players']),
+        'reminded': len(missing),
+        'sent': sum(1 for ok in sent if ok),
+        'failed': sum(1 for ok in sent if not ok),
+        'send_seconds': time.time() - start
+    }
+    logger.info("Reminder report: %s", json.dumps(report))
+
+    return report